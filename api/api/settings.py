@@ -56,6 +56,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
 ]
 
 MIDDLEWARE = [
@@ -153,6 +154,10 @@ SIMPLE_JWT = {
 
 API_SECRET_KEY = os.getenv('API_SECRET_KEY')
 
+# Directory of the columnar snapshots written after each import (see
+# backend.snapshots); unset, no snapshot is written
+SNAPSHOT_DIR = os.getenv('SNAPSHOT_DIR')
+
 LANGUAGE_CODE = 'en-us'
 
 TIME_ZONE = 'Europe/Lisbon'
@@ -1,6 +1,6 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from backend.views import ProjetoLeiViewSet, LegislatureViewSet,PhaseViewSet, AuthorViewSet, VoteViewSet, PublicationViewSet, CommissionViewSet, DebateViewSet, DashboardStatisticsView, TypeListView, UniquePhaseNamesView
+from backend.views import ProjetoLeiViewSet, LegislatureViewSet,PhaseViewSet, AuthorViewSet, VoteViewSet, PublicationViewSet, CommissionViewSet, DebateViewSet, DashboardStatisticsView, TypeListView, UniquePhaseNamesView, SnapshotView, PartyAgreementView
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
 from rest_framework.documentation import include_docs_urls
 from django.urls import re_path
@@ -36,10 +36,13 @@ router.register(r'debates', DebateViewSet)
 urlpatterns = [
     path('', include(router.urls)),
     path('dashboard/', DashboardStatisticsView.as_view(), name='dashboard-statistics'),
+    path('analytics/party-agreement/', PartyAgreementView.as_view(), name='party-agreement'),
     path('types/', TypeListView.as_view(), name='initiative-types'),
     path('api/token/', TokenObtainPairView.as_view(), name='token_obtain_pair'),
     path('api/token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
     path('phases-unique/', UniquePhaseNamesView.as_view(), name='unique-phases'),
+    path('snapshots/', SnapshotView.as_view(), name='snapshot'),
+    path('snapshots/<str:table>/', SnapshotView.as_view(), name='snapshot-table'),
     path('swagger<format>/', schema_view.without_ui(cache_timeout=0), name='schema-json'),
    path('swagger/', schema_view.with_ui('swagger', cache_timeout=0), name='schema-swagger-ui'),
    path('redoc/', schema_view.with_ui('redoc', cache_timeout=0), name='schema-redoc'),
@@ -0,0 +1,126 @@
+import numpy as np
+from django.db.models import Exists, OuterRef
+from .caching import get_or_refresh
+from .models import ProjetoLei, Vote, VotePosition
+
+# Positions as matrix codes; 0 is a party not listed in a vote
+POSITION_CODES = {position: code for code, position in enumerate(VotePosition.POSITIONS, start=1)}
+
+# Votes only change with imports, which start a new cache generation
+AGREEMENT_FRESH_FOR = 24 * 60 * 60
+
+
+def filtered_votes(legislature=None, start_date=None, end_date=None):
+    """Votes on initiatives of legislature, between start_date and end_date"""
+    votes = Vote.objects.all()
+    if legislature:
+        links = ProjetoLei.votes.through.objects.filter(vote_id=OuterRef('pk'), projetolei__legislature__number=legislature)
+        votes = votes.filter(Exists(links))
+    if start_date:
+        votes = votes.filter(date__gte=start_date)
+    if end_date:
+        votes = votes.filter(date__lte=end_date)
+    return votes
+
+
+def position_matrix(rows, dates):
+    """
+    (parties, months, matrix) from (vote_id, party, position) rows and
+    {vote_id: date}: matrix[i, j] is the position code of parties[i]
+    (alphabetical) in the j-th vote, and months[j] the month of that vote
+    (NaT without a date).
+    """
+    # Indexed with dicts: np.unique on Python strings and dates is several times slower
+    votes = {}
+    parties = {}
+    vote_index = np.fromiter((votes.setdefault(vote_id, len(votes)) for vote_id, _, _ in rows), np.intp, len(rows))
+    party_index = np.fromiter((parties.setdefault(party, len(parties)) for _, party, _ in rows), np.intp, len(rows))
+    codes = np.fromiter((POSITION_CODES[position] for _, _, position in rows), np.int8, len(rows))
+
+    matrix = np.zeros((len(parties), len(votes)), dtype=np.int8)
+    matrix[party_index, vote_index] = codes
+    names = sorted(parties)
+    months = np.array([dates.get(vote_id) for vote_id in votes], dtype='datetime64[D]').astype('datetime64[M]')
+    return names, months, matrix[[parties[name] for name in names]]
+
+
+def agreement_matrix(matrix):
+    """
+    (agreement, shared): shared[i, j] is the number of votes in which
+    parties i and j both took a position, agreement[i, j] the share of
+    those in which it was the same one (NaN when they share none).
+    """
+    present = (matrix > 0).astype(np.float32)
+    shared = present @ present.T
+    same = np.zeros_like(shared)
+    for code in POSITION_CODES.values():
+        took = (matrix == code).astype(np.float32)
+        same += took @ took.T
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return same / shared, shared.astype(np.int64)
+
+
+def majority_positions(matrix):
+    """The position most parties took in each vote, 0 where two positions tie"""
+    counts = np.stack([(matrix == code).sum(axis=0) for code in POSITION_CODES.values()])
+    ordered = np.sort(counts, axis=0)
+    majority = counts.argmax(axis=0).astype(np.int8) + 1
+    majority[ordered[-1] == ordered[-2]] = 0
+    return majority
+
+
+def majority_alignment_by_month(matrix, months):
+    """
+    (periods, alignment): alignment[i, t] is the share of the votes of month
+    periods[t] in which party i took the majority position (see
+    majority_positions), NaN when it took no position in a vote with one.
+    """
+    dated = ~np.isnat(months)
+    periods, period_index = np.unique(months[dated], return_inverse=True)
+    matrix = matrix[:, dated]
+    majority = majority_positions(matrix)
+
+    counted = (matrix > 0) & (majority > 0)
+    with_majority = counted & (matrix == majority)
+    in_period = np.zeros((matrix.shape[1], len(periods)), dtype=np.float32)
+    in_period[np.arange(matrix.shape[1]), period_index] = 1
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return periods, (with_majority.astype(np.float32) @ in_period) / (counted.astype(np.float32) @ in_period)
+
+
+def as_list(values, digits=4):
+    """Rows of a float matrix as lists, rounded, with None for NaN"""
+    return [[None if np.isnan(value) else round(float(value), digits) for value in row] for row in values]
+
+
+def party_agreement(legislature=None, start_date=None, end_date=None):
+    """
+    Agreement between every pair of parties, and each party's alignment
+    with the majority of the parties by month, over the votes of
+    legislature between start_date and end_date.
+    """
+    votes = filtered_votes(legislature, start_date, end_date)
+    positions = VotePosition.objects.filter(vote__in=votes.values('pk')).order_by()
+    parties, months, matrix = position_matrix(
+        list(positions.values_list('vote_id', 'party', 'position')), dict(votes.values_list('id', 'date'))
+    )
+    agreement, shared = agreement_matrix(matrix)
+    periods, alignment = majority_alignment_by_month(matrix, months)
+    return {
+        'parties': parties,
+        'votes': matrix.shape[1],
+        'agreement': as_list(agreement),
+        'shared_votes': shared.tolist(),
+        'majority_alignment': {
+            'periods': [str(period) for period in periods],
+            'parties': dict(zip(parties, as_list(alignment))),
+        },
+    }
+
+
+def cached_party_agreement(legislature=None, start_date=None, end_date=None):
+    """party_agreement, cached per legislature and date range until the next import"""
+    name = f'party_agreement:{legislature or ""}:{start_date or ""}:{end_date or ""}'
+    return get_or_refresh(
+        name, lambda: party_agreement(legislature, start_date, end_date), fresh_for=AGREEMENT_FRESH_FOR
+    )
@@ -0,0 +1,1050 @@
+import logging
+import zlib
+from collections import Counter, defaultdict
+from django.db import connection, transaction
+from django.db.models import Q
+from .models import (
+    ProjetoLei, Legislature, Phase, Attachment, Author, Vote,
+    Publication, Commission, CommissionDocument, Rapporteur,
+    Opinion, OpinionRequest, Hearing, Audience, CommissionVote,
+    FinalDraftSubmission, Forwarding, Debate, VideoLink,
+    DeputyDebate, GovernmentMemberDebate, GuestDebate,
+    ApprovedText, DeputyAppeal, PartyAppeal, RelatedInitiative
+)
+from .import_cache import ImportCache, PhaseRef, phase_key, fetch_legislatures, fetch_authors, fetch_phases
+from .parsing import (
+    parse_date, truncate_text, parse_vote_details, content_fingerprint,
+    MAX_TEXT_LENGTH, MAX_URL_LENGTH, MAX_NAME_LENGTH, MAX_TITLE_LENGTH
+)
+
+logger = logging.getLogger(__name__)
+
+# Rows per INSERT / UPDATE statement
+BULK_BATCH_SIZE = 500
+
+# Fields refreshed when an initiative is re-imported (the others are only set on creation)
+PROJETO_UPDATE_FIELDS = ['title', 'type', 'legislature', 'date', 'link', 'observation', 'epigraph', 'text_link']
+PHASE_UPDATE_FIELDS = ['name', 'date', 'code', 'observation', 'oev_text_id', 'act_id', 'content_hash']
+VOTE_UPDATE_FIELDS = ['description', 'votes', 'meeting', 'meeting_type', 'unanimous', 'absences', 'vote_id']
+
+# Rows hanging off phases, commissions, debates and votes: the child model, the name
+# of its foreign key to the parent and its natural key. The natural key is the
+# one the importers use to skip duplicates, and is used to match the rows from
+# the dump with the existing ones when an existing phase or vote is re-imported.
+CHILD_MODELS = {
+    Phase: [
+        (Attachment, 'phase', ('name', 'file_url')),
+        (Publication, 'phase', ('date', 'url')),
+        (Commission, 'phase', ('name', 'id_commission')),
+        (Debate, 'phase_link', ('date', 'phase')),
+        (ApprovedText, 'phase', ('title', 'text_type')),
+        (DeputyAppeal, 'phase', ('deputy_name', 'date')),
+        (PartyAppeal, 'phase', ('party', 'date')),
+        (RelatedInitiative, 'phase', ('initiative_id', 'initiative_number')),
+    ],
+    Commission: [
+        (CommissionDocument, 'commission', ('title', 'url')),
+        (Rapporteur, 'commission', ('name', 'date')),
+        (Opinion, 'commission', ('entity', 'date')),
+        (OpinionRequest, 'commission', ('entity', 'date')),
+        (Hearing, 'commission', ('entity', 'date')),
+        (Audience, 'commission', ('entity', 'date')),
+        (CommissionVote, 'commission', ('date', 'result')),
+        (FinalDraftSubmission, 'commission', ('date',)),
+        (Forwarding, 'commission', ('entity', 'date')),
+    ],
+    Debate: [
+        (VideoLink, 'debate', ('url',)),
+        (DeputyDebate, 'debate', ('name',)),
+        (GovernmentMemberDebate, 'debate', ('name',)),
+        (GuestDebate, 'debate', ('name',)),
+    ],
+    Vote: [
+        (Publication, 'vote', ('date', 'url')),
+    ],
+}
+
+# Namespace (first key) of the advisory locks taken on shared rows
+SHARED_ROW_LOCK_NAMESPACE = 7413
+
+
+def lock_shared_rows(keys):
+    """
+    Take transaction-level advisory locks on the natural keys of rows that
+    several initiatives can share (phases, votes), so concurrent importers
+    don't both create the same row. Locks are taken in a fixed order so
+    they can't deadlock, and are released when the transaction ends.
+    """
+    lock_ids = sorted({zlib.crc32(repr(key).encode()) - 2 ** 31 for key in keys})
+    if not lock_ids:
+        return
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT pg_advisory_xact_lock(%s, lock_id) FROM unnest(%s::integer[]) AS lock_id",
+            [SHARED_ROW_LOCK_NAMESPACE, lock_ids]
+        )
+
+
+def vote_key(vote_data):
+    """Natural key used to find an existing plenary vote, or None if it has none"""
+    vote_id = truncate_text(vote_data.get('id', ''), 50)
+    date = parse_date(vote_data.get('data'))
+    result = truncate_text(vote_data.get('resultado', ''), 50)
+
+    if vote_id:
+        return ('id', vote_id)
+    if date and result:
+        return ('details', date, result, vote_data.get('detalhe'))
+    return None
+
+
+def shared_row_keys(data):
+    """Natural keys of the phases and votes of a raw initiative"""
+    keys = []
+    for phase_data in data.get('IniEventos') or []:
+        if not isinstance(phase_data, dict):
+            continue
+        keys.append(phase_key(phase_data.get('EvtId'), phase_data.get('OevId')))
+        for vote_data in phase_data.get('Votacao') or []:
+            if isinstance(vote_data, dict):
+                keys.append(vote_key(vote_data))
+    return [key for key in keys if key]
+
+
+class Node:
+    """
+    A row collected from the dump together with its child rows.
+
+    Children are grouped by model and keyed by their natural key (see
+    CHILD_MODELS), so the first occurrence of a duplicate wins.
+    """
+
+    def __init__(self, instance):
+        self.instance = instance
+        self.children = defaultdict(dict)
+        # Whether the row was already in the database, with children of its own
+        self.existed = False
+
+    def add(self, model, key, instance):
+        rows = self.children[model]
+        if key not in rows:
+            rows[key] = Node(instance)
+        return rows[key]
+
+
+class VoteNode:
+    """A plenary vote collected from the dump, possibly seen several times"""
+
+    def __init__(self):
+        self.occurrences = []
+        self.publications = None
+        self.instance = None
+        self.existed = False
+
+
+class BulkImporter:
+    """
+    Write path for import_parlamento_data.
+
+    Initiatives are collected in memory with ``add`` and written with
+    ``flush`` using one lookup query and one bulk INSERT / UPDATE per model,
+    instead of a ``.filter().first()`` + ``.save()`` round trip per row.
+    The rows written don't depend on how the initiatives are batched: with
+    --row-by-row, and to retry a failed batch, the command imports them one
+    per batch.
+
+    Initiatives and phases whose content fingerprint matches the one stored
+    by the previous import are skipped (unless ``force`` is set), and the
+    number of created / updated / unchanged rows is kept in ``changes``.
+    Existing legislatures, authors and phases are looked up through an
+    ImportCache, which can be shared with the rest of the import.
+
+    The children of re-imported phases and votes are reconciled with the existing
+    rows (see ``reconcile_children``) rather than deleted and recreated.
+
+    Example:
+        importer = BulkImporter()
+        importer.load_fingerprints(chunk)
+        for initiative_data in chunk:
+            importer.add(initiative_data)
+        importer.flush()
+    """
+
+    def __init__(self, skip_phases=False, parallel=False, force=False, cache=None):
+        self.skip_phases = skip_phases
+        # Other processes may be importing at the same time (--workers)
+        self.parallel = parallel
+        self.force = force
+        self.cache = cache or ImportCache()
+        self.changes = Counter()
+        self.reset()
+
+    def reset(self):
+        self.pending_changes = Counter()
+        self.known_projetos = {}
+        self.known_phases = {}
+        self.unchanged_phases = {}
+        self.projetos = {}
+        self.legislatures = {}
+        self.projeto_legislatures = {}
+        self.projeto_authors = {}
+        self.projeto_phases = {}
+        self.projeto_votes = defaultdict(list)
+        self.authors = {}
+        self.phases = {}
+        self.votes = {}
+        # Existing phases and votes this batch changed, which other initiatives may share
+        self.changed_phases = set()
+        self.changed_votes = set()
+
+    def __len__(self):
+        return len(self.projetos)
+
+    def import_batch(self, initiatives):
+        """Collect and write a chunk of initiatives in a single transaction"""
+        initiatives = list(initiatives)
+        self.load_fingerprints(initiatives)
+        for initiative_data in initiatives:
+            self.add(initiative_data)
+        self.flush()
+
+    def load_fingerprints(self, initiatives):
+        """
+        Fetch the fingerprints stored for these initiatives and their phases
+        (one query each), so ``add`` can skip the ones that haven't changed.
+        """
+        self.known_projetos.update(ProjetoLei.objects.filter(
+            external_id__in={data.get('IniId', '') for data in initiatives}
+        ).values_list('external_id', 'content_hash'))
+
+        if self.skip_phases:
+            return
+
+        keys = {
+            phase_key(phase_data.get('EvtId'), phase_data.get('OevId'))
+            for data in initiatives
+            for phase_data in data.get('IniEventos') or []
+            if isinstance(phase_data, dict)
+        }
+        keys.discard(None)
+        self.known_phases.update(self.cache.phases.get_many(keys, fetch_phases))
+
+    def create_shared_rows(self, initiatives):
+        """
+        Create the legislatures and authors referenced by these initiatives.
+
+        Used before handing initiatives to parallel workers, so that rows
+        shared between them exist up front and workers only look them up.
+        """
+        for data in initiatives:
+            self.projeto_legislatures[data.get('IniId', '')] = data.get('IniLeg')
+            self.process_authors(data)
+
+        with transaction.atomic():
+            self.save_legislatures()
+            self.save_authors()
+
+        self.reset()
+
+    # Collecting
+
+    def add(self, data):
+        """Collect a single initiative and its related data"""
+        external_id = data.get('IniId', '')
+        projeto_lei = self.projetos.get(external_id)
+
+        # The fingerprint only describes the full import, so --skip_phases doesn't store it
+        fingerprint = content_fingerprint(data)
+        if projeto_lei is None and not self.force and self.known_projetos.get(external_id) == fingerprint:
+            self.pending_changes['unchanged'] += 1
+            return
+
+        if projeto_lei is None:
+            self.pending_changes['updated' if external_id in self.known_projetos else 'created'] += 1
+            projeto_lei = ProjetoLei(
+                title=truncate_text(data.get('IniTitulo', ''), MAX_TEXT_LENGTH),
+                type=truncate_text(data.get('IniDescTipo', ''), MAX_NAME_LENGTH),
+                date=parse_date(data.get('DataInicioleg')),
+                link=truncate_text(data.get('IniLinkTexto', ''), MAX_URL_LENGTH),
+                external_id=external_id,
+                initiative_id=data.get('IniId'),
+                initiative_legislature=data.get('IniLeg'),
+                initiative_number=data.get('IniNr'),
+                initiative_type_code=data.get('IniTipo'),
+                initiative_selection=data.get('IniSel'),
+                substitute_text=data.get('IniTextoSubst'),
+                substitute_text_field=data.get('IniTextoSubstCampo'),
+                observation=data.get('IniObs'),
+                epigraph=data.get('IniEpigrafe'),
+                text_link=truncate_text(data.get('IniLinkTexto', ''), MAX_URL_LENGTH)
+            )
+            self.projetos[external_id] = projeto_lei
+        else:
+            # Same initiative twice in one batch: the later one updates the earlier
+            projeto_lei.title = truncate_text(data.get('IniTitulo', ''), MAX_TEXT_LENGTH)
+            projeto_lei.type = truncate_text(data.get('IniDescTipo', ''), MAX_NAME_LENGTH)
+            projeto_lei.date = parse_date(data.get('DataInicioleg'))
+            projeto_lei.link = truncate_text(data.get('IniLinkTexto', ''), MAX_URL_LENGTH)
+            projeto_lei.observation = data.get('IniObs')
+            projeto_lei.epigraph = data.get('IniEpigrafe')
+            projeto_lei.text_link = truncate_text(data.get('IniLinkTexto', ''), MAX_URL_LENGTH)
+
+        if not self.skip_phases:
+            projeto_lei.content_hash = fingerprint
+
+        self.projeto_legislatures[external_id] = data.get('IniLeg')
+        self.projeto_authors[external_id] = self.process_authors(data)
+
+        if not self.skip_phases:
+            self.projeto_phases[external_id] = self.process_phases(data, external_id)
+
+    def author_key(self, name, party, author_type, id_cadastro=None):
+        key = (name, party, author_type)
+        if key not in self.authors:
+            self.authors[key] = Author(name=name, party=party, author_type=author_type, id_cadastro=id_cadastro)
+        return key
+
+    def process_authors(self, data):
+        """Collect author data, returning the keys of this initiative's authors"""
+        keys = []
+
+        # Process deputy authors
+        for deputy in data.get('IniAutorDeputados') or []:
+            if not isinstance(deputy, dict):
+                logger.warning(f"Unexpected deputy author data type: {type(deputy)}")
+                continue
+
+            name = truncate_text(deputy.get('nome', ''), MAX_NAME_LENGTH)
+            party = truncate_text(deputy.get('GP', ''), MAX_NAME_LENGTH)
+
+            if not name:  # Skip if name is empty
+                logger.warning("Skipping deputy author with empty name")
+                continue
+
+            keys.append(self.author_key(name, party, 'Deputado', deputy.get('idCadastro')))
+
+        # Process party authors
+        for party_data in data.get('IniAutorGruposParlamentares') or []:
+            if not isinstance(party_data, dict):
+                logger.warning(f"Unexpected party author data type: {type(party_data)}")
+                continue
+
+            party_name = truncate_text(party_data.get('GP', ''), MAX_NAME_LENGTH)
+
+            if not party_name:  # Skip if party name is empty
+                logger.warning("Skipping party author with empty name")
+                continue
+
+            keys.append(self.author_key(party_name, party_name, 'Grupo'))
+
+        # Process other authors
+        other = data.get('IniAutorOutros')
+        if other and isinstance(other, dict):
+            name = truncate_text(other.get('nome', ''), MAX_NAME_LENGTH)
+            sigla = truncate_text(other.get('sigla', ''), MAX_NAME_LENGTH)
+
+            if name:  # Only proceed if name is not empty
+                keys.append(self.author_key(name, sigla, 'Outro'))
+
+        return list(dict.fromkeys(keys))
+
+    def process_phases(self, data, external_id):
+        """Collect phase data, returning the keys of this initiative's phases"""
+        keys = []
+
+        for phase_data in data.get('IniEventos') or []:
+            if not isinstance(phase_data, dict):
+                logger.warning(f"Unexpected phase data type: {type(phase_data)}")
+                continue
+
+            # Phases are identified by evt_id and oev_id; without both they are always new
+            evt_id = phase_data.get('EvtId') or None
+            oev_id = phase_data.get('OevId') or None
+            key = phase_key(evt_id, oev_id) or ('new', len(self.phases))
+            keys.append(key)
+
+            fingerprint = content_fingerprint(phase_data)
+            known = self.known_phases.get(key)
+            if known and known.content_hash == fingerprint and not self.force:
+                # Already imported with the same content: only link it
+                self.phases.pop(key, None)
+                self.unchanged_phases[key] = known.pk
+                continue
+            self.unchanged_phases.pop(key, None)
+
+            phase = Phase(
+                name=truncate_text(phase_data.get('Fase', ''), MAX_NAME_LENGTH),
+                date=parse_date(phase_data.get('DataFase')),
+                code=phase_data.get('CodigoFase'),
+                observation=phase_data.get('ObsFase'),
+                oev_id=oev_id,
+                oev_text_id=phase_data.get('OevTextId'),
+                evt_id=evt_id,
+                act_id=phase_data.get('ActId'),
+                content_hash=fingerprint
+            )
+            # A phase seen again in the same batch replaces the earlier one,
+            # as it would if the initiatives were imported one per batch
+            self.phases[key] = self.collect_phase_children(phase, phase_data)
+            self.process_votes(phase_data.get('Votacao', []), external_id)
+
+        return list(dict.fromkeys(keys))
+
+    def collect_phase_children(self, phase, phase_data):
+        """Collect the rows hanging off a phase (everything but its votes) into a Node"""
+        node = Node(phase)
+        self.process_attachments(phase_data.get('AnexosFase', []), node)
+        self.process_publications(phase_data.get('PublicacaoFase', []), node)
+        self.process_commissions(phase_data.get('Comissao', []), node)
+        self.process_debates(phase_data.get('Intervencoesdebates', []), node)
+        self.process_approved_texts(phase_data.get('TextosAprovados', []), node)
+        self.process_deputy_appeals(phase_data.get('RecursoDeputados', []), node)
+        self.process_party_appeals(phase_data.get('RecursoGP', []), node)
+        self.process_related_initiatives(phase_data.get('IniciativasConjuntas', []), node)
+        return node
+
+    def iter_dicts(self, items, label):
+        """Yield the dict entries of a list from the dump, warning about anything else"""
+        for item in items or []:
+            if not isinstance(item, dict):
+                logger.warning(f"Unexpected {label} data type: {type(item)}")
+                continue
+            yield item
+
+    def build_publication(self, pub_data, **parent):
+        return Publication(
+            date=parse_date(pub_data.get('pubdt')),
+            legislature_code=truncate_text(pub_data.get('pubLeg', ''), 50),
+            number=truncate_text(pub_data.get('pubNr', ''), 50),
+            session=truncate_text(pub_data.get('pubSL', ''), 50),
+            publication_type=truncate_text(pub_data.get('pubTipo', ''), 100),
+            publication_tp=truncate_text(pub_data.get('pubTp', ''), 50),
+            supplement=truncate_text(pub_data.get('supl', ''), 50),
+            pages=pub_data.get('pag'),
+            url=truncate_text(pub_data.get('URLDiario', ''), MAX_URL_LENGTH),
+            id_page=truncate_text(pub_data.get('idPag', ''), 50),
+            observation=pub_data.get('obs'),
+            id_debate=truncate_text(pub_data.get('idDeb', ''), 50),
+            id_intervention=truncate_text(pub_data.get('idInt', ''), 50),
+            id_act=truncate_text(pub_data.get('idAct', ''), 50),
+            final_diary_supplement=truncate_text(pub_data.get('pagFinalDiarioSupl', ''), 100),
+            **parent
+        )
+
+    def process_attachments(self, attachments_data, node):
+        """Collect attachments for a phase"""
+        phase = node.instance
+        for attachment_data in self.iter_dicts(attachments_data, 'attachment'):
+            name = truncate_text(attachment_data.get('anexoNome', '') or 'Untitled Attachment', MAX_NAME_LENGTH)
+            file_url = truncate_text(attachment_data.get('anexoFich', '') or '', MAX_URL_LENGTH)
+            node.add(Attachment, (name, file_url), Attachment(name=name, file_url=file_url, phase=phase))
+
+    def process_publications(self, publications_data, node):
+        """Collect publications for a phase"""
+        for pub_data in self.iter_dicts(publications_data, 'publication'):
+            publication = self.build_publication(pub_data, phase=node.instance)
+            node.add(Publication, (publication.date, publication.url), publication)
+
+    def process_commissions(self, commissions_data, node):
+        """Collect commissions for a phase"""
+        for comm_data in self.iter_dicts(commissions_data, 'commission'):
+            name = truncate_text(comm_data.get('Nome', ''), 500)
+            id_commission = truncate_text(comm_data.get('IdComissao', ''), 50)
+            key = (name, id_commission)
+
+            existing = node.children[Commission].get(key)
+            if existing:
+                # Repeated commission: refresh the main fields and rebuild its children
+                commission = existing.instance
+                commission.number = truncate_text(comm_data.get('Numero', ''), 50)
+                commission.acc_id = truncate_text(comm_data.get('AccId', ''), 50)
+                commission.competent = truncate_text(comm_data.get('Competente', ''), 10)
+                commission.observation = comm_data.get('Observacao')
+                commission.distribution_date = parse_date(comm_data.get('DataDistribuicao'))
+                existing.children.clear()
+                comm_node = existing
+            else:
+                commission = Commission(
+                    name=name,
+                    number=truncate_text(comm_data.get('Numero', ''), 50),
+                    id_commission=id_commission,
+                    acc_id=truncate_text(comm_data.get('AccId', ''), 50),
+                    competent=truncate_text(comm_data.get('Competente', ''), 10),
+                    observation=comm_data.get('Observacao'),
+                    distribution_date=parse_date(comm_data.get('DataDistribuicao')),
+                    subcommission_distribution=comm_data.get('DistribuicaoSubcomissao'),
+                    subcommission_distribution_date=parse_date(comm_data.get('DataDistruibuicaoSubcomissao')),
+                    entry_date=parse_date(comm_data.get('DataEntrada')),
+                    public_appreciation_start_date=parse_date(comm_data.get('DatainicioApreciacaoPublica')),
+                    public_appreciation_end_date=parse_date(comm_data.get('DatafimApreciacaoPublica')),
+                    no_opinion_reason_date=parse_date(comm_data.get('DataMotivoNaoParecer')),
+                    report_date=parse_date(comm_data.get('DataRelatorio')),
+                    forwarding_date=parse_date(comm_data.get('DataRemessa')),
+                    plenary_scheduling_request_date=parse_date(comm_data.get('DataReqAgendamentoPlenario')),
+                    awaits_plenary_scheduling=truncate_text(comm_data.get('AguardaAgendamentoPlenario', ''), 50),
+                    plenary_scheduling_date=parse_date(comm_data.get('DataAgendamentoPlenario')),
+                    discussion_scheduling_date=parse_date(comm_data.get('DataAgendamentoDiscussao')),
+                    plenary_scheduling_gp=truncate_text(comm_data.get('GpAgendamentoPlenario', ''), 50),
+                    no_opinion_reason=comm_data.get('MotivoNaoParecer'),
+                    extended=truncate_text(comm_data.get('Prorrogado', ''), 10),
+                    sigla=truncate_text(comm_data.get('Sigla', ''), 50),
+                    legislature_ref=truncate_text(comm_data.get('Legislatura', ''), 50),
+                    session_ref=truncate_text(comm_data.get('Sessao', ''), 50),
+                    phase=node.instance
+                )
+                comm_node = node.add(Commission, key, commission)
+
+            for doc_data in self.iter_dicts(comm_data.get('Documentos'), 'commission document'):
+                title = truncate_text(doc_data.get('TituloDocumento', ''), MAX_TITLE_LENGTH)
+                url = truncate_text(doc_data.get('URL', ''), MAX_URL_LENGTH)
+                comm_node.add(CommissionDocument, (title, url), CommissionDocument(
+                    title=title,
+                    document_type=truncate_text(doc_data.get('TipoDocumento', ''), 100),
+                    date=parse_date(doc_data.get('DataDocumento')),
+                    url=url,
+                    commission=commission
+                ))
+
+            for rel_data in self.iter_dicts(comm_data.get('Relatores'), 'rapporteur'):
+                name = truncate_text(rel_data.get('nome', ''), MAX_NAME_LENGTH)
+                date = parse_date(rel_data.get('data'))
+                comm_node.add(Rapporteur, (name, date), Rapporteur(
+                    name=name,
+                    party=truncate_text(rel_data.get('GP', ''), 100),
+                    date=date,
+                    commission=commission
+                ))
+
+            for op_data in self.iter_dicts(comm_data.get('PareceresRecebidos'), 'opinion'):
+                entity = truncate_text(op_data.get('entidade', ''), MAX_NAME_LENGTH)
+                date = parse_date(op_data.get('data'))
+                comm_node.add(Opinion, (entity, date), Opinion(
+                    entity=entity,
+                    date=date,
+                    url=truncate_text(op_data.get('url', ''), MAX_URL_LENGTH),
+                    document_type=truncate_text(op_data.get('tipoDocumento', ''), 100),
+                    commission=commission
+                ))
+
+            for model, field, label in (
+                (OpinionRequest, 'PedidosParecer', 'opinion request'),
+                (Hearing, 'Audicoes', 'hearing'),
+                (Audience, 'Audiencias', 'audience'),
+                (Forwarding, 'Remessas', 'forwarding'),
+            ):
+                for entity_data in self.iter_dicts(comm_data.get(field), label):
+                    entity = truncate_text(entity_data.get('entidade', ''), MAX_NAME_LENGTH)
+                    date = parse_date(entity_data.get('data'))
+                    comm_node.add(model, (entity, date), model(entity=entity, date=date, commission=commission))
+
+            for vote_data in self.iter_dicts(comm_data.get('Votacao'), 'commission vote'):
+                date = parse_date(vote_data.get('data'))
+                result = truncate_text(vote_data.get('resultado', ''), 100)
+                comm_node.add(CommissionVote, (date, result), CommissionVote(
+                    date=date,
+                    result=result,
+                    favor=vote_data.get('favor'),
+                    against=vote_data.get('contra'),
+                    abstention=vote_data.get('abstencao'),
+                    commission=commission
+                ))
+
+            for sub_data in self.iter_dicts(comm_data.get('RemessaRedaccaoFinal'), 'final draft submission'):
+                date = parse_date(sub_data.get('data'))
+                comm_node.add(FinalDraftSubmission, (date,), FinalDraftSubmission(
+                    date=date,
+                    text=sub_data.get('texto'),
+                    commission=commission
+                ))
+
+    def process_debates(self, debates_data, node):
+        """Collect debates for a phase"""
+        for deb_data in self.iter_dicts(debates_data, 'debate'):
+            date = parse_date(deb_data.get('dataReuniaoPlenaria'))
+            phase_name = truncate_text(deb_data.get('faseDebate', ''), 100)
+            key = (date, phase_name)
+
+            existing = node.children[Debate].get(key)
+            if existing:
+                # Repeated debate: refresh its fields and rebuild its children
+                debate = existing.instance
+                debate.session_phase = truncate_text(deb_data.get('faseSessao', ''), 10)
+                debate.start_time = truncate_text(deb_data.get('horaInicio', ''), 10)
+                debate.end_time = truncate_text(deb_data.get('horaTermo', ''), 10)
+                debate.summary = deb_data.get('sumario')
+                debate.content = deb_data.get('teor')
+                existing.children.clear()
+                deb_node = existing
+            else:
+                debate = Debate(
+                    date=date,
+                    phase=phase_name,
+                    session_phase=truncate_text(deb_data.get('faseSessao', ''), 10),
+                    start_time=truncate_text(deb_data.get('horaInicio', ''), 10),
+                    end_time=truncate_text(deb_data.get('horaTermo', ''), 10),
+                    summary=deb_data.get('sumario'),
+                    content=deb_data.get('teor'),
+                    phase_link=node.instance
+                )
+                deb_node = node.add(Debate, key, debate)
+
+            for link_data in self.iter_dicts(deb_data.get('linkVideo'), 'video link'):
+                url = truncate_text(link_data.get('link', ''), MAX_URL_LENGTH)
+                deb_node.add(VideoLink, (url,), VideoLink(url=url, debate=debate))
+
+            for dep_data in self.iter_dicts(deb_data.get('deputados'), 'deputy'):
+                name = truncate_text(dep_data.get('nome', ''), MAX_NAME_LENGTH)
+                deb_node.add(DeputyDebate, (name,), DeputyDebate(
+                    name=name,
+                    party=truncate_text(dep_data.get('GP', ''), 100),
+                    debate=debate
+                ))
+
+            gov_data = deb_data.get('membrosGoverno')
+            if gov_data and isinstance(gov_data, dict):
+                name = truncate_text(gov_data.get('nome', ''), MAX_NAME_LENGTH)
+                deb_node.add(GovernmentMemberDebate, (name,), GovernmentMemberDebate(
+                    name=name,
+                    position=truncate_text(gov_data.get('cargo', ''), MAX_NAME_LENGTH),
+                    government=truncate_text(gov_data.get('governo', ''), MAX_NAME_LENGTH),
+                    debate=debate
+                ))
+
+            guest_data = deb_data.get('convidados')
+            if guest_data and isinstance(guest_data, dict):
+                name = truncate_text(guest_data.get('nome', ''), MAX_NAME_LENGTH) if guest_data.get('nome') else "Unnamed Guest"
+                deb_node.add(GuestDebate, (name,), GuestDebate(
+                    name=name,
+                    position=truncate_text(guest_data.get('cargo', ''), MAX_NAME_LENGTH),
+                    honor=truncate_text(guest_data.get('honra', ''), MAX_NAME_LENGTH),
+                    country=truncate_text(guest_data.get('pais', ''), 100),
+                    debate=debate
+                ))
+
+    def process_approved_texts(self, texts_data, node):
+        """Collect approved texts for a phase"""
+        phase = node.instance
+        for text_data in texts_data or []:
+            if isinstance(text_data, dict):
+                title = truncate_text(text_data.get('titulo', ''), MAX_TITLE_LENGTH)
+                text_type = truncate_text(text_data.get('tipo', ''), 100)
+                node.add(ApprovedText, (title, text_type), ApprovedText(
+                    title=title,
+                    text_type=text_type,
+                    date=parse_date(text_data.get('data')),
+                    url=truncate_text(text_data.get('url', ''), MAX_URL_LENGTH),
+                    phase=phase
+                ))
+            elif isinstance(text_data, str):
+                logger.warning(f"Approved text is a string: {text_data[:30]}...")
+                title = truncate_text(text_data, MAX_TITLE_LENGTH)
+                if any(key[0] == title for key in node.children[ApprovedText]):
+                    continue
+                node.add(ApprovedText, (title, "Unknown"), ApprovedText(title=title, text_type="Unknown", phase=phase))
+            else:
+                logger.warning(f"Unexpected approved text data type: {type(text_data)}")
+
+    def process_deputy_appeals(self, appeals_data, node):
+        """Collect deputy appeals for a phase"""
+        for appeal_data in self.iter_dicts(appeals_data, 'deputy appeal'):
+            deputy_name = truncate_text(appeal_data.get('nome', ''), MAX_NAME_LENGTH)
+            date = parse_date(appeal_data.get('data'))
+            node.add(DeputyAppeal, (deputy_name, date), DeputyAppeal(
+                deputy_name=deputy_name,
+                party=truncate_text(appeal_data.get('GP', ''), 100),
+                date=date,
+                phase=node.instance
+            ))
+
+    def process_party_appeals(self, appeals_data, node):
+        """Collect party appeals for a phase"""
+        for appeal_data in self.iter_dicts(appeals_data, 'party appeal'):
+            party = truncate_text(appeal_data.get('GP', ''), 100)
+            date = parse_date(appeal_data.get('data'))
+            node.add(PartyAppeal, (party, date), PartyAppeal(party=party, date=date, phase=node.instance))
+
+    def process_related_initiatives(self, initiatives_data, node):
+        """Collect related initiatives for a phase"""
+        for rel_data in self.iter_dicts(initiatives_data, 'related initiative'):
+            initiative_id = truncate_text(rel_data.get('id', ''), 50)
+            initiative_number = truncate_text(rel_data.get('nr', ''), 50)
+            node.add(RelatedInitiative, (initiative_id, initiative_number), RelatedInitiative(
+                initiative_id=initiative_id,
+                initiative_type=truncate_text(rel_data.get('descTipo', ''), 100),
+                initiative_number=initiative_number,
+                legislature=truncate_text(rel_data.get('leg', ''), 50),
+                title=rel_data.get('titulo'),
+                entry_date=parse_date(rel_data.get('dataEntrada')),
+                selection=truncate_text(rel_data.get('sel', ''), 10),
+                phase=node.instance
+            ))
+
+    def process_votes(self, votes_data, external_id):
+        """Collect plenary votes for a phase of the given initiative"""
+        for vote_data in self.iter_dicts(votes_data, 'vote'):
+            # Identifiers an existing vote is found by (see save_votes)
+            key = vote_key(vote_data) or ('new', len(self.votes))
+
+            node = self.votes.setdefault(key, VoteNode())
+            node.occurrences.append(vote_data)
+            if vote_data.get('publicacao'):
+                node.publications = vote_data.get('publicacao')
+
+            if key not in self.projeto_votes[external_id]:
+                self.projeto_votes[external_id].append(key)
+
+    # Writing
+
+    def flush(self):
+        """Write everything collected so far and start a new batch"""
+        if self.projetos:
+            with transaction.atomic():
+                if self.parallel:
+                    lock_shared_rows([key for key in list(self.phases) + list(self.votes) if key[0] != 'new'])
+
+                self.save_legislatures()
+                self.save_authors()
+                self.save_projetos()
+                if not self.skip_phases:
+                    self.save_phases()
+                    self.save_votes()
+                    self.touch_sharing_initiatives()
+
+        self.cache.commit()
+        self.changes.update(self.pending_changes)
+        self.reset()
+
+    def save_legislatures(self):
+        numbers = set(self.projeto_legislatures.values())
+        self.legislatures = self.cache.legislatures.get_many(numbers, fetch_legislatures)
+
+        missing = numbers - set(self.legislatures)
+        if missing:
+            Legislature.objects.bulk_create(
+                [Legislature(number=number) for number in missing],
+                ignore_conflicts=True
+            )
+            for number, legislature in fetch_legislatures(missing).items():
+                self.legislatures[number] = legislature
+                self.cache.legislatures.set(number, legislature)
+
+    def save_authors(self):
+        existing = self.cache.authors.get_many(self.authors, fetch_authors)
+
+        new_authors = {}
+        for key, author in self.authors.items():
+            if key in existing:
+                author.pk = existing[key].pk
+                author._state.adding = False
+            else:
+                new_authors[key] = author
+
+        if new_authors:
+            # Authors are unique on (name, party, author_type), so one created
+            # since the lookup is skipped and picked up by the query below
+            Author.objects.bulk_create(list(new_authors.values()), batch_size=BULK_BATCH_SIZE, ignore_conflicts=True)
+            created = fetch_authors(list(new_authors))
+            for key, author in new_authors.items():
+                author.pk = created[key].pk
+                author._state.adding = False
+                self.cache.authors.set(key, author)
+
+    def save_projetos(self):
+        for external_id, projeto_lei in self.projetos.items():
+            projeto_lei.legislature = self.legislatures[self.projeto_legislatures[external_id]]
+
+        # Only new and changed initiatives get here, so all of them get a new updated_at
+        update_fields = PROJETO_UPDATE_FIELDS + ['updated_at']
+        if not self.skip_phases:
+            update_fields.append('content_hash')
+        ProjetoLei.objects.bulk_create(
+            list(self.projetos.values()),
+            batch_size=BULK_BATCH_SIZE,
+            update_conflicts=True,
+            unique_fields=['external_id'],
+            update_fields=update_fields
+        )
+        ids = dict(ProjetoLei.objects.filter(external_id__in=self.projetos).values_list('external_id', 'id'))
+        for external_id, projeto_lei in self.projetos.items():
+            projeto_lei.pk = ids[external_id]
+            projeto_lei._state.adding = False
+        ProjetoLei.objects.filter(pk__in=ids.values()).update_search_vector()
+
+        self.sync_links(ProjetoLei.authors.through, 'author_id', {
+            self.projetos[external_id].pk: {self.authors[key].pk for key in keys}
+            for external_id, keys in self.projeto_authors.items()
+        })
+
+    def sync_links(self, through, target_field, links):
+        """
+        Make the many-to-many rows of these initiatives match ``links``
+        (projeto id -> target ids), deleting the stale rows and inserting the
+        missing ones, so links that didn't change aren't rewritten.
+        """
+        existing = set()
+        stale = []
+        rows = through.objects.filter(projetolei_id__in=links).values_list('id', 'projetolei_id', target_field)
+        for row_id, projeto_id, target_id in rows:
+            if target_id in links[projeto_id]:
+                existing.add((projeto_id, target_id))
+            else:
+                stale.append(row_id)
+
+        if stale:
+            through.objects.filter(id__in=stale).delete()
+        through.objects.bulk_create([
+            through(projetolei_id=projeto_id, **{target_field: target_id})
+            for projeto_id, target_ids in links.items()
+            for target_id in target_ids
+            if (projeto_id, target_id) not in existing
+        ], batch_size=BULK_BATCH_SIZE, ignore_conflicts=True)
+
+    def save_phases(self):
+        # Phases unknown when the batch was collected may have been created
+        # since by another process, so look them up again (inside the lock)
+        existing = {key: self.known_phases[key] for key in self.phases if key in self.known_phases}
+        unresolved = [
+            key for key in self.phases
+            if key[0] == 'evt' and key not in existing and not self.cache.phases.known_missing(key)
+        ]
+        if unresolved:
+            existing.update(fetch_phases(unresolved))
+
+        to_update = []
+        to_create = []
+        for key, node in self.phases.items():
+            phase = node.instance
+            if key in existing:
+                phase.pk = existing[key].pk
+                phase._state.adding = False
+                node.existed = True
+                to_update.append(phase)
+            else:
+                to_create.append(phase)
+
+        # Only phases with a new fingerprint get here, so all of them changed
+        self.changed_phases.update(phase.pk for phase in to_update)
+        Phase.objects.bulk_update(to_update, PHASE_UPDATE_FIELDS, batch_size=BULK_BATCH_SIZE)
+        Phase.objects.bulk_create(to_create, batch_size=BULK_BATCH_SIZE)
+        for key, node in self.phases.items():
+            if key[0] == 'evt':
+                self.cache.phases.set(key, PhaseRef(node.instance.pk, node.instance.content_hash))
+        self.pending_changes.update(
+            phases_created=len(to_create),
+            phases_updated=len(to_update),
+            phases_unchanged=len(self.unchanged_phases)
+        )
+
+        self.reconcile_children(Phase, list(self.phases.values()))
+
+        self.sync_links(ProjetoLei.phases.through, 'phase_id', {
+            self.projetos[external_id].pk: {self.phase_pk(key) for key in keys}
+            for external_id, keys in self.projeto_phases.items()
+        })
+        ProjetoLei.objects.filter(pk__in=[projeto_lei.pk for projeto_lei in self.projetos.values()]).update_phase_fields()
+
+    def phase_pk(self, key):
+        node = self.phases.get(key)
+        return node.instance.pk if node else self.unchanged_phases[key]
+
+    def reconcile_children(self, parent_model, nodes):
+        """
+        Write the child rows of already saved nodes, one model and level at a time.
+
+        The children of nodes that existed before are matched with the rows
+        already in the database by natural key: only rows with changed
+        fields are updated, rows that are new are inserted and rows no longer
+        in the dump are deleted, each with one bulk query per model.
+
+        Returns the ids of the existing nodes whose children (at any depth)
+        were written.
+        """
+        existing_parents = [node.instance.pk for node in nodes if node.existed]
+        changed_parents = set()
+
+        for model, fk, key_fields in CHILD_MODELS[parent_model]:
+            fk_attname = f'{fk}_id'
+            existing = defaultdict(dict)
+            stale = []
+            if existing_parents:
+                # Rows repeating a natural key are duplicates, the oldest one is kept
+                for row in model.objects.filter(**{f'{fk_attname}__in': existing_parents}).order_by('id'):
+                    rows = existing[getattr(row, fk_attname)]
+                    key = tuple(getattr(row, field) for field in key_fields)
+                    if key in rows:
+                        stale.append(row.pk)
+                        changed_parents.add(getattr(row, fk_attname))
+                    else:
+                        rows[key] = row
+
+            compared_fields = [
+                field.attname for field in model._meta.concrete_fields
+                if not field.primary_key and field.attname != fk_attname
+            ]
+            to_create = []
+            to_update = []
+            updated_fields = set()
+            child_nodes = []
+            child_parents = {}
+            for node in nodes:
+                rows = existing.pop(node.instance.pk, {}) if node.existed else {}
+                for key, child in node.children.get(model, {}).items():
+                    child_nodes.append(child)
+                    row = rows.pop(key, None)
+                    if row is None:
+                        to_create.append(child.instance)
+                        changed_parents.add(node.instance.pk)
+                        continue
+
+                    child.instance.pk = row.pk
+                    child.instance._state.adding = False
+                    child.existed = True
+                    child_parents[row.pk] = node.instance.pk
+                    changed = [field for field in compared_fields if getattr(row, field) != getattr(child.instance, field)]
+                    if changed:
+                        to_update.append(child.instance)
+                        updated_fields.update(changed)
+                        changed_parents.add(node.instance.pk)
+                if rows:
+                    stale.extend(row.pk for row in rows.values())
+                    changed_parents.add(node.instance.pk)
+
+            if stale:
+                model.objects.filter(pk__in=stale).delete()
+            if to_update:
+                model.objects.bulk_update(to_update, sorted(updated_fields), batch_size=BULK_BATCH_SIZE)
+            model.objects.bulk_create(to_create, batch_size=BULK_BATCH_SIZE)
+
+            if model in CHILD_MODELS:
+                changed_children = self.reconcile_children(model, child_nodes)
+                changed_parents.update(child_parents[pk] for pk in changed_children)
+
+        return changed_parents & set(existing_parents)
+
+    def touch_sharing_initiatives(self):
+        """
+        Mark as changed the initiatives outside this batch that share a phase
+        or vote this batch changed, for their ETag and Last-Modified
+        (the initiatives in the batch got a new updated_at when saved).
+        """
+        if not self.changed_phases and not self.changed_votes:
+            return
+        PhaseLink = ProjetoLei.phases.through
+        VoteLink = ProjetoLei.votes.through
+        sharing = set(PhaseLink.objects.filter(phase_id__in=self.changed_phases).values_list('projetolei_id', flat=True))
+        sharing.update(VoteLink.objects.filter(vote_id__in=self.changed_votes).values_list('projetolei_id', flat=True))
+        sharing.difference_update(projeto_lei.pk for projeto_lei in self.projetos.values())
+        if sharing:
+            ProjetoLei.objects.filter(pk__in=sharing).touch()
+
+    def save_votes(self):
+        if not self.votes:
+            return
+
+        # Find existing votes by vote_id, then by (date, result, details)
+        existing = {}
+        vote_ids = [key[1] for key in self.votes if key[0] == 'id']
+        # vote_id > '' repeats the condition of the unique index so the planner can use it for any number of ids
+        for vote in Vote.objects.filter(vote_id__in=vote_ids, vote_id__gt='').order_by('id'):
+            existing.setdefault(('id', vote.vote_id), vote)
+
+        lookups = {}
+        for key, node in self.votes.items():
+            if key in existing:
+                continue
+            first = node.occurrences[0]
+            date = parse_date(first.get('data'))
+            result = truncate_text(first.get('resultado', ''), 50)
+            if date and result:
+                lookups.setdefault((date, result, first.get('detalhe')), key)
+
+        if lookups:
+            condition = Q()
+            for date, result, details in lookups:
+                condition |= Q(date=date, result=result, details=details)
+            for vote in Vote.objects.filter(condition).order_by('id'):
+                key = lookups.get((vote.date, vote.result, vote.details))
+                if key and key not in existing:
+                    existing[key] = vote
+
+        to_update = []
+        to_create = []
+        for key, node in self.votes.items():
+            occurrences = node.occurrences
+            vote = existing.get(key)
+            if vote is None:
+                vote = self.build_vote(occurrences[0])
+                occurrences = occurrences[1:]
+                to_create.append(vote)
+            else:
+                node.existed = True
+                to_update.append(vote)
+            before = [getattr(vote, field) for field in VOTE_UPDATE_FIELDS]
+
+            for vote_data in occurrences:
+                self.update_vote(vote, vote_data)
+            node.instance = vote
+            if node.existed and [getattr(vote, field) for field in VOTE_UPDATE_FIELDS] != before:
+                self.changed_votes.add(vote.pk)
+
+        Vote.objects.bulk_update(to_update, VOTE_UPDATE_FIELDS, batch_size=BULK_BATCH_SIZE)
+        Vote.objects.bulk_create(to_create, batch_size=BULK_BATCH_SIZE)
+        # The party positions of the votes, as rows
+        Vote.objects.filter(pk__in=[node.instance.pk for node in self.votes.values()]).sync_positions()
+
+        # Existing votes that come with publications get theirs replaced
+        nodes = []
+        for node in self.votes.values():
+            if node.publications:
+                vote_node = self.collect_vote_publications(node.instance, node.publications)
+                vote_node.existed = node.existed
+                nodes.append(vote_node)
+        self.changed_votes.update(self.reconcile_children(Vote, nodes))
+
+        VoteLink = ProjetoLei.votes.through
+        VoteLink.objects.bulk_create([
+            VoteLink(projetolei_id=self.projetos[external_id].pk, vote_id=self.votes[key].instance.pk)
+            for external_id, keys in self.projeto_votes.items()
+            for key in keys
+        ], batch_size=BULK_BATCH_SIZE, ignore_conflicts=True)
+
+    def collect_vote_publications(self, vote, publications_data):
+        """Collect the publications of a plenary vote into a Node"""
+        node = Node(vote)
+        for pub_data in self.iter_dicts(publications_data, 'vote publication'):
+            publication = self.build_publication(pub_data, vote=vote)
+            node.add(Publication, (publication.date, publication.url), publication)
+        return node
+
+    def build_vote(self, vote_data):
+        details = vote_data.get('detalhe')
+        parsed_votes = parse_vote_details(details) if details else None
+        return Vote(
+            date=parse_date(vote_data.get('data')),
+            result=truncate_text(vote_data.get('resultado', ''), 50),
+            details=details,  # Keep original details for backward compatibility
+            description=vote_data.get('descricao'),
+            votes=parsed_votes or vote_data,  # Store parsed votes or original data
+            meeting=truncate_text(vote_data.get('reuniao', ''), 50),
+            meeting_type=truncate_text(vote_data.get('tipoReuniao', ''), 50),
+            unanimous=truncate_text(vote_data.get('unanime', ''), 50),
+            absences=vote_data.get('ausencias'),
+            vote_id=truncate_text(vote_data.get('id', ''), 50)
+        )
+
+    def update_vote(self, vote, vote_data):
+        """Merge a repeated vote into an existing one, keeping values the dump leaves empty"""
+        details = vote_data.get('detalhe')
+        parsed_votes = parse_vote_details(details) if details else None
+
+        vote.description = vote_data.get('descricao') or vote.description
+        if parsed_votes:
+            vote.votes = parsed_votes
+        elif vote_data and not vote.votes:
+            vote.votes = vote_data
+        vote.meeting = truncate_text(vote_data.get('reuniao', ''), 50) or vote.meeting
+        vote.meeting_type = truncate_text(vote_data.get('tipoReuniao', ''), 50) or vote.meeting_type
+        vote.unanimous = truncate_text(vote_data.get('unanime', ''), 50) or vote.unanimous
+        vote.absences = vote_data.get('ausencias') or vote.absences
+        vote.vote_id = truncate_text(vote_data.get('id', ''), 50) or vote.vote_id
@@ -0,0 +1,127 @@
+import logging
+import threading
+import time
+from django.core.cache import cache
+from django.db import connections, transaction
+from .models import ImportGeneration
+
+logger = logging.getLogger(__name__)
+
+GENERATION_KEY = 'import_state'
+
+# The generation is stored in a single row
+GENERATION_ID = 1
+
+# How long each process trusts its cached generation: a bump by the
+# importer (another process) is picked up after at most this many seconds
+GENERATION_TTL = 5
+
+# How long a refresh may hold its lock before another request may start one
+LOCK_TIMEOUT = 60
+
+# How long a request with nothing to serve waits for another one computing the value
+WAIT_TIMEOUT = 10
+WAIT_INTERVAL = 0.05
+
+
+def import_state():
+    """(generation, updated_at) of the current import generation; (0, None) before the first import"""
+    state = cache.get(GENERATION_KEY)
+    if state is None:
+        state = ImportGeneration.objects.filter(id=GENERATION_ID).values_list('generation', 'updated_at').first()
+        state = state or (0, None)
+        cache.set(GENERATION_KEY, state, GENERATION_TTL)
+    return state
+
+
+def import_generation():
+    """The current import generation"""
+    return import_state()[0]
+
+
+def bump_import_generation():
+    """Start a new import generation, so data cached for the previous one is recomputed"""
+    with transaction.atomic():
+        state, _ = ImportGeneration.objects.select_for_update().get_or_create(id=GENERATION_ID)
+        state.generation += 1
+        state.save()
+    cache.delete(GENERATION_KEY)
+    return state.generation
+
+
+def get_or_refresh(name, compute, fresh_for, timeout=7 * 24 * 60 * 60):
+    """
+    Return compute() cached under name, for the current import generation.
+
+    Only one request at a time computes a value (single flight, per cache
+    key lock) and the others never wait for it when there is a value to
+    serve:
+
+    - an entry older than fresh_for seconds is still returned, while it is
+      recomputed in a background thread (stale-while-revalidate);
+    - when a new generation has no entry yet, the value of the previous one
+      is returned while the first request computes the new one.
+
+    Only when nothing was ever cached do requests wait for the one
+    computing it. The lock is shared by all the processes using the cache
+    backend (with the default local-memory cache, by one process' threads).
+
+    Example:
+        stats = get_or_refresh('dashboard_statistics', get_statistics, fresh_for=6 * 60 * 60)
+    """
+    key = f'{name}:{import_generation()}'
+    entry = cache.get(key)
+    if entry is not None:
+        value, refresh_at = entry
+        if time.time() >= refresh_at and acquire(key):
+            refresh_in_background(name, key, compute, fresh_for, timeout)
+        return value
+
+    if acquire(key):
+        try:
+            return store(name, key, compute, fresh_for, timeout)
+        finally:
+            release(key)
+
+    latest = cache.get(f'{name}:latest')
+    if latest is not None:
+        return latest[0]
+
+    deadline = time.monotonic() + WAIT_TIMEOUT
+    while time.monotonic() < deadline:
+        time.sleep(WAIT_INTERVAL)
+        entry = cache.get(key)
+        if entry is not None:
+            return entry[0]
+    return compute()
+
+
+def store(name, key, compute, fresh_for, timeout):
+    value = compute()
+    cache.set(key, (value, time.time() + fresh_for), timeout)
+    # Served while the entry of a new generation is being computed
+    cache.set(f'{name}:latest', (value,), timeout)
+    return value
+
+
+def refresh_in_background(name, key, compute, fresh_for, timeout):
+    def run():
+        try:
+            store(name, key, compute, fresh_for, timeout)
+        except Exception:
+            logger.exception(f"Error refreshing cached {name}")
+        finally:
+            release(key)
+            # Connections are per thread: close those compute() opened here,
+            # even when it failed, or they stay open until the server closes them
+            connections.close_all()
+
+    threading.Thread(target=run, daemon=True).start()
+
+
+def acquire(key):
+    return cache.add(f'{key}:lock', True, LOCK_TIMEOUT)
+
+
+def release(key):
+    cache.delete(f'{key}:lock')
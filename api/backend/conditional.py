@@ -0,0 +1,69 @@
+import hashlib
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+from .caching import import_state
+
+
+class NotModified(Exception):
+    """Raised from APIView.initial to answer with the 304 response it carries"""
+
+    def __init__(self, response):
+        super().__init__()
+        self.response = response
+
+
+class ConditionalGetMixin:
+    """
+    Conditional GET for the read-only views.
+
+    Responses carry an ETag and a Last-Modified built from get_validators(),
+    the import generation unless the view says otherwise. A request whose
+    If-None-Match or If-Modified-Since still matches gets 304 Not Modified
+    right after authentication and permission checks, before the handler
+    runs any query or serializer.
+    """
+
+    def get_validators(self, request):
+        """
+        (version, last_modified) of the data this request reads, or None
+        for no validators (e.g. the object doesn't exist).
+        """
+        generation, updated_at = import_state()
+        return f'generation-{generation}', updated_at
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        self.etag = self.last_modified = None
+        if request.method not in ('GET', 'HEAD'):
+            return
+
+        validators = self.get_validators(request)
+        if validators is None:
+            return
+        version, self.last_modified = validators
+
+        # The same data has a representation per page, filter and renderer
+        representation = f'{version}:{request.get_full_path()}:{request.accepted_media_type}'
+        self.etag = quote_etag(hashlib.sha1(representation.encode()).hexdigest())
+        response = get_conditional_response(
+            request._request,
+            etag=self.etag,
+            last_modified=int(self.last_modified.timestamp()) if self.last_modified else None,
+        )
+        if response is not None:
+            raise NotModified(response)
+
+    def handle_exception(self, exc):
+        if isinstance(exc, NotModified):
+            return exc.response
+        return super().handle_exception(exc)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        if getattr(self, 'etag', None) and response.status_code in (200, 304):
+            response['ETag'] = self.etag
+            if self.last_modified:
+                response['Last-Modified'] = http_date(self.last_modified.timestamp())
+            # Browsers revalidate every time instead of guessing a freshness lifetime
+            patch_cache_control(response, private=True, no_cache=True)
+        return response
@@ -0,0 +1,71 @@
+import json
+from datetime import timedelta
+from django.db.models import Count, Q
+from django.utils import timezone
+from .models import Author, DashboardStatistics, Phase, ProjetoLei, Vote
+
+# The statistics are stored in a single row
+STATISTICS_ID = 1
+
+
+def compute_statistics():
+    """
+    Compute the dashboard statistics with one grouped aggregate per
+    statistic. Periods ("this year", "last 30 days") are relative to the
+    day they are computed, an import, until the next one: that day is
+    returned as as_of.
+    """
+    today = timezone.now().date()
+    recent = today - timedelta(days=30)
+
+    proposals = ProjetoLei.objects.aggregate(
+        total=Count('id'),
+        this_year=Count('id', filter=Q(date__year=today.year)),
+        recent=Count('id', filter=Q(entry_date__gte=recent)),
+    )
+    votes = Vote.objects.aggregate(
+        total=Count('id'),
+        recent=Count('id', filter=Q(date__gte=recent)),
+    )
+
+    # Initiatives linked to an author named after each party
+    proposals_by_party = dict.fromkeys(
+        Author.objects.filter(author_type='Grupo').order_by('id').values_list('name', flat=True), 0
+    )
+    links = (
+        ProjetoLei.authors.through.objects
+        .filter(author__name__in=list(proposals_by_party))
+        .values('author__name')
+        .annotate(count=Count('id'))
+    )
+    for link in links:
+        proposals_by_party[link['author__name']] = link['count']
+
+    return {
+        'as_of': today.isoformat(),
+        'total_proposals': proposals['total'],
+        'total_votes': votes['total'],
+        'proposals_this_year': proposals['this_year'],
+        'proposals_by_party': proposals_by_party,
+        'recent_votes': votes['recent'],
+        'recent_proposals': proposals['recent'],
+        # Most active phases
+        'phases_count': dict(Phase.objects.values('name').annotate(
+            count=Count('id')).order_by('-count').values_list('name', 'count')[:10]),
+    }
+
+
+def refresh_statistics():
+    """Recompute and store the dashboard statistics, returning them"""
+    stats = compute_statistics()
+    DashboardStatistics.objects.update_or_create(id=STATISTICS_ID, defaults={'stats': json.dumps(stats)})
+    return stats
+
+
+def get_statistics():
+    """The stored dashboard statistics, computed first if there are none yet (or they predate as_of)"""
+    stats = DashboardStatistics.objects.filter(id=STATISTICS_ID).values_list('stats', flat=True).first()
+    stats = json.loads(stats) if stats is not None else None
+    if stats is None or 'as_of' not in stats:
+        return refresh_statistics()
+    return stats
@@ -0,0 +1,142 @@
+from functools import cached_property
+from django.db.models import Prefetch
+from rest_framework.serializers import BaseSerializer, ListSerializer
+
+
+def parse_paths(value):
+    """
+    "title,phases.name,phases.date" -> {'title': {}, 'phases': {'name': {}, 'date': {}}},
+    or None when the parameter wasn't given.
+    """
+    if value is None:
+        return None
+    tree = {}
+    for path in value.split(','):
+        node = tree
+        for name in path.strip().split('.'):
+            if name:
+                node = node.setdefault(name, {})
+    return tree
+
+
+class FieldSelection:
+    """
+    The fields a client asked for with ?fields= and ?expand=, both lists
+    of dotted paths (e.g. ?fields=title,phases.name&expand=phases).
+
+    - fields: only these fields are returned; a nested field named without
+      subfields is returned whole.
+    - expand: only these nested objects are returned (the others are left
+      out); without it, each serializer nests what it always did.
+
+    Without either parameter the response is unchanged.
+    """
+
+    def __init__(self, fields=None, expand=None):
+        self.fields = fields
+        self.expand = expand
+
+    @classmethod
+    def from_request(cls, request):
+        return cls(parse_paths(request.query_params.get('fields')), parse_paths(request.query_params.get('expand')))
+
+    def __bool__(self):
+        return self.fields is not None or self.expand is not None
+
+    def includes(self, name, nested=False):
+        if self.fields is not None:
+            return name in self.fields
+        if nested and self.expand is not None:
+            return name in self.expand
+        return True
+
+    def child(self, name):
+        """The selection within the nested field name"""
+        fields = (self.fields.get(name) or None) if self.fields is not None else None
+        expand = self.expand.get(name, {}) if self.expand is not None else None
+        return FieldSelection(fields, expand)
+
+
+def apply_selection(serializer, selection):
+    """
+    Remove the fields selection leaves out from serializer and the
+    serializers it nests. Nested objects built by SerializerMethodFields
+    are listed in Meta.expandable_fields; their methods read the selection
+    from the serializer's selection attribute.
+    """
+    if isinstance(serializer, ListSerializer):
+        serializer = serializer.child
+    serializer.selection = selection
+    if not selection:
+        return
+
+    expandable = getattr(getattr(serializer, 'Meta', None), 'expandable_fields', ())
+    for name, field in list(serializer.fields.items()):
+        nested = isinstance(field, BaseSerializer) or name in expandable
+        if not selection.includes(name, nested):
+            del serializer.fields[name]
+        elif isinstance(field, BaseSerializer):
+            apply_selection(field, selection.child(name))
+
+
+def selected_data(serializer, name, nested):
+    """
+    Data of nested, the serializer built for the expandable field name of
+    serializer, with what was selected for that field.
+    """
+    selection = getattr(serializer, 'selection', None)
+    if selection is not None:
+        apply_selection(nested, selection.child(name))
+    return nested.data
+
+
+def related_lookups(model, selection, relations, prefix=''):
+    """
+    prefetch_related() lookups for the relations selection includes, from
+    {field: {nested field: ...}}, with fields named like the relations of
+    model. Related rows come in primary key order, as backend.rows nests
+    them.
+    """
+    lookups = []
+    for name, nested in relations.items():
+        if selection.includes(name, nested=True):
+            related_model = model._meta.get_field(name).related_model
+            lookups.append(Prefetch(f'{prefix}{name}', queryset=related_model._default_manager.order_by('pk')))
+            lookups += related_lookups(related_model, selection.child(name), nested, f'{prefix}{name}__')
+    return lookups
+
+
+def only_selected(queryset, selection, always=()):
+    """Load only the selected columns (and always), when ?fields= was given"""
+    if selection.fields is None:
+        return queryset
+    columns = {field.name for field in queryset.model._meta.concrete_fields}
+    return queryset.only(*(name for name in selection.fields if name in columns), *always)
+
+
+class SparseFieldsetViewMixin:
+    """
+    ?fields= and ?expand= (see FieldSelection) for a viewset: the fields
+    left out are neither loaded (only()), prefetched nor serialized.
+
+    related_fields lists the nested relations of the serializer to
+    prefetch when selected, as {field: {nested field: ...}}.
+    """
+    related_fields = {}
+
+    @cached_property
+    def selection(self):
+        return FieldSelection.from_request(self.request)
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        lookups = related_lookups(queryset.model, self.selection, self.related_fields)
+        if lookups:
+            queryset = queryset.prefetch_related(*lookups)
+        cursor_fields = [field.lstrip('-') for field in getattr(self, 'cursor_ordering', ())]
+        return only_selected(queryset, self.selection, always=cursor_fields)
+
+    def get_serializer(self, *args, **kwargs):
+        serializer = super().get_serializer(*args, **kwargs)
+        apply_selection(serializer, self.selection)
+        return serializer
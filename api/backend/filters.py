@@ -1,9 +1,48 @@
 import django_filters
-from django.db.models import Q
+from django.contrib.postgres.search import SearchRank
+from django.db.models import F, Q
+from rest_framework import filters
 from .models import ProjetoLei, Phase, Author
+from .search import match_names, search_query
+
+
+class FullTextSearchFilter(filters.SearchFilter):
+    """
+    ?search= on ProjetoLei.search_vector (title, epigraph and description,
+    see backend.search), with the best matches first. The whole text also
+    matches an external_id or initiative_number exactly.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        text = ' '.join(self.get_search_terms(request))
+        query = search_query(text)
+        if query is None:
+            return queryset
+
+        return queryset.filter(
+            Q(search_vector=query) | Q(external_id=text) | Q(initiative_number=text)
+        ).annotate(
+            rank=SearchRank(F('search_vector'), query)
+        ).order_by('-rank', *queryset.query.order_by)
+
+
+class NameSearchFilter(filters.SearchFilter):
+    """
+    ?search= on the view's search_fields, accent-insensitive and, with
+    pg_trgm, tolerant of typos, with the closest names first (see
+    backend.search.match_names).
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        text = ' '.join(self.get_search_terms(request))
+        fields = self.get_search_fields(view, request)
+        if not text or not fields:
+            return queryset
+        return match_names(queryset, fields, text)
+
 
 class ProjetoLeiFilter(django_filters.FilterSet):
-    title_contains = django_filters.CharFilter(field_name='title', lookup_expr='icontains')
+    title_contains = django_filters.CharFilter(method='filter_by_text')
     author_name = django_filters.CharFilter(method='filter_by_author_name')
     author_party = django_filters.CharFilter(field_name='authors__party', lookup_expr='iexact')
     phase_name = django_filters.CharFilter(field_name='phases__name', lookup_expr='iexact')
@@ -19,8 +58,14 @@ class ProjetoLeiFilter(django_filters.FilterSet):
             'legislature__number', 'initiative_number', 'type'
         ]
     
+    def filter_by_text(self, queryset, name, value):
+        query = search_query(value)
+        return queryset.filter(search_vector=query) if query is not None else queryset
+    
     def filter_by_author_name(self, queryset, name, value):
-        return queryset.filter(authors__name__icontains=value)
+        authors = match_names(Author.objects.all(), ['name'], value)
+        authorships = ProjetoLei.authors.through.objects.filter(author__in=authors.values('pk'))
+        return queryset.filter(pk__in=authorships.values('projetolei_id'))
     
     def filter_by_multiple_types(self, queryset, name, value):
         types = value.split(',')
@@ -38,8 +83,11 @@ class PhaseFilter(django_filters.FilterSet):
 
 
 class AuthorFilter(django_filters.FilterSet):
-    name_contains = django_filters.CharFilter(field_name='name', lookup_expr='icontains')
+    name_contains = django_filters.CharFilter(method='filter_by_name')
     
     class Meta:
         model = Author
-        fields = ['name_contains', 'party', 'author_type']
\ No newline at end of file
+        fields = ['name_contains', 'party', 'author_type']
+
+    def filter_by_name(self, queryset, name, value):
+        return match_names(queryset, ['name'], value)
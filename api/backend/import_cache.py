@@ -0,0 +1,170 @@
+from collections import namedtuple
+from .models import Legislature, Author, Phase
+
+# What the importer needs to know about an existing phase
+PhaseRef = namedtuple('PhaseRef', ['pk', 'content_hash'])
+
+
+def phase_key(evt_id, oev_id):
+    """Natural key of a phase; phases without both ids are always created anew"""
+    return ('evt', evt_id, oev_id) if evt_id and oev_id else None
+
+
+def fetch_legislatures(numbers=None):
+    queryset = Legislature.objects.all()
+    if numbers is not None:
+        queryset = queryset.filter(number__in=numbers)
+    return {legislature.number: legislature for legislature in queryset}
+
+
+def fetch_authors(keys=None):
+    """Authors by (name, party, author_type), keeping the oldest match like .filter().first() does"""
+    queryset = Author.objects.order_by('id')
+    if keys is not None:
+        queryset = queryset.filter(name__in={key[0] for key in keys})
+
+    authors = {}
+    for author in queryset:
+        authors.setdefault((author.name, author.party, author.author_type), author)
+    if keys is not None:
+        authors = {key: authors[key] for key in keys if key in authors}
+    return authors
+
+
+def fetch_phases(keys=None):
+    """PhaseRefs by phase_key, keeping the oldest match like .filter().first() does"""
+    queryset = Phase.objects.filter(evt_id__isnull=False, oev_id__isnull=False).order_by('id')
+    if keys is not None:
+        queryset = queryset.filter(evt_id__in={key[1] for key in keys})
+
+    phases = {}
+    for phase_id, evt_id, oev_id, content_hash in queryset.values_list('id', 'evt_id', 'oev_id', 'content_hash'):
+        key = phase_key(evt_id, oev_id)
+        if key:
+            phases.setdefault(key, PhaseRef(phase_id, content_hash))
+    if keys is not None:
+        phases = {key: phases[key] for key in keys if key in phases}
+    return phases
+
+
+class IdentityMap:
+    """
+    Import-scoped cache of rows by natural key.
+
+    When ``complete`` is set, the map was preloaded with every row and this
+    process is the only one creating them, so a key that isn't cached is
+    known not to exist and needs no query. Keys used in a transaction that
+    gets rolled back are forgotten with ``rollback`` (their rows may not
+    exist, or may hold other values) and looked up again when next needed.
+    """
+
+    def __init__(self, complete=False):
+        self.complete = complete
+        self.rows = {}
+        self.stale = set()
+        self.touched = set()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.rows)
+
+    def get(self, key):
+        self.touched.add(key)
+        row = self.rows.get(key)
+        if row is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return row
+
+    def set(self, key, row):
+        self.touched.add(key)
+        self.stale.discard(key)
+        self.rows[key] = row
+
+    def known_missing(self, key):
+        """Whether a key that isn't cached is known not to exist in the database"""
+        return self.complete and key not in self.stale
+
+    def lookup(self, key, fetch):
+        """Return the row for key, calling fetch() on a miss, or None if there is none"""
+        row = self.get(key)
+        if row is None and not self.known_missing(key):
+            row = fetch()
+            self.stale.discard(key)
+            if row is not None:
+                self.rows[key] = row
+        return row
+
+    def get_many(self, keys, fetch):
+        """
+        Return {key: row} for the given keys that have a row, calling
+        fetch(keys) -> {key: row} once for all the misses.
+        """
+        found = {}
+        unresolved = []
+        for key in keys:
+            row = self.get(key)
+            if row is not None:
+                found[key] = row
+            elif not self.known_missing(key):
+                unresolved.append(key)
+
+        if unresolved:
+            fetched = fetch(unresolved)
+            for key in unresolved:
+                self.stale.discard(key)
+            self.rows.update(fetched)
+            found.update(fetched)
+        return found
+
+    def commit(self):
+        self.touched.clear()
+
+    def rollback(self):
+        for key in self.touched:
+            self.rows.pop(key, None)
+        self.stale.update(self.touched)
+        self.touched.clear()
+
+
+class ImportCache:
+    """
+    Identity maps for the rows import_parlamento_data looks up over and
+    over: legislatures by number, authors by (name, party, author_type) and
+    phases by (evt_id, oev_id).
+
+    Example:
+        cache = ImportCache(complete=True)
+        cache.preload()
+        author = cache.authors.lookup(key, lambda: Author.objects.filter(...).first())
+    """
+
+    def __init__(self, complete=False):
+        self.legislatures = IdentityMap(complete)
+        self.authors = IdentityMap(complete)
+        self.phases = IdentityMap(complete)
+
+    def maps(self):
+        return {'legislatures': self.legislatures, 'authors': self.authors, 'phases': self.phases}
+
+    def preload(self):
+        """Fill the maps with one query per model"""
+        self.legislatures.rows = fetch_legislatures()
+        self.authors.rows = fetch_authors()
+        self.phases.rows = fetch_phases()
+
+    def commit(self):
+        """The rows used since the last commit/rollback were committed"""
+        for identity_map in self.maps().values():
+            identity_map.commit()
+
+    def rollback(self):
+        """The transaction using the rows since the last commit/rollback was rolled back"""
+        for identity_map in self.maps().values():
+            identity_map.rollback()
+
+    def stats(self):
+        """{name: (hits, misses)} for each map"""
+        return {name: (identity_map.hits, identity_map.misses) for name, identity_map in self.maps().items()}
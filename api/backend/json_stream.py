@@ -0,0 +1,136 @@
+import codecs
+import json
+
+# Size of each read from the file / HTTP response
+CHUNK_SIZE = 64 * 1024
+
+_WHITESPACE = ' \t\n\r'
+
+
+def iter_file_chunks(file_path, chunk_size=CHUNK_SIZE):
+    """Yield text chunks from a local file"""
+    with open(file_path, 'r', encoding='utf-8') as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+
+
+def iter_response_chunks(response, chunk_size=CHUNK_SIZE):
+    """
+    Yield text chunks from a streamed requests response.
+
+    Uses the same encoding that ``response.json()`` would, decoding
+    incrementally so multi-byte characters split across reads are handled.
+    """
+    decoder = codecs.getincrementaldecoder(response.encoding or 'utf-8')(errors='replace')
+    for raw in response.iter_content(chunk_size=chunk_size):
+        text = decoder.decode(raw)
+        if text:
+            yield text
+    tail = decoder.decode(b'', final=True)
+    if tail:
+        yield tail
+
+
+def iter_json_array(chunks):
+    """
+    Incrementally parse a top-level JSON array, yielding each element as soon
+    as it has been completely read.
+
+    Only the element currently being decoded is kept in memory, so peak usage
+    is bounded by the largest single element rather than the whole document.
+
+    Malformed input (including a trailing comma or anything but whitespace
+    after the array) raises ValueError, with the position in the whole text.
+
+    Example:
+        for item in iter_json_array(iter_file_chunks('IniciativasXVI_json.txt')):
+            ...
+    """
+    decoder = json.JSONDecoder()
+    chunks = iter(chunks)
+    buffer = ''
+    pos = 0
+    # Characters dropped from the start of buffer, so offset + pos is the position in the text
+    offset = 0
+    exhausted = False
+
+    def read_more(min_length=0):
+        # Append chunks until the buffer grows past min_length (at least one
+        # chunk). Returns False if no more data could be read.
+        nonlocal buffer, pos, offset, exhausted
+        buffer = buffer[pos:]
+        offset += pos
+        pos = 0
+        start_length = len(buffer)
+        target = max(min_length, start_length + 1)
+        while len(buffer) < target:
+            chunk = next(chunks, None)
+            if chunk is None:
+                exhausted = True
+                break
+            buffer += chunk
+        return len(buffer) > start_length
+
+    def skip_whitespace():
+        nonlocal pos
+        while True:
+            while pos < len(buffer) and buffer[pos] in _WHITESPACE:
+                pos += 1
+            if pos < len(buffer) or not read_more():
+                return
+
+    # Opening bracket
+    skip_whitespace()
+    if pos < len(buffer) and buffer[pos] == '\ufeff':
+        pos += 1
+        skip_whitespace()
+    if pos >= len(buffer) or buffer[pos] != '[':
+        raise ValueError("Expected a JSON array at the top level")
+    pos += 1
+
+    expect_value = True
+    first = True
+    while True:
+        skip_whitespace()
+        if pos >= len(buffer):
+            raise ValueError(f"Unexpected end of JSON array at position {offset + pos}")
+
+        char = buffer[pos]
+        if char == ']' and (first or not expect_value):
+            pos += 1
+            skip_whitespace()
+            if pos < len(buffer):
+                raise ValueError(f"Unexpected data after the JSON array at position {offset + pos}")
+            return
+        if not expect_value:
+            if char != ',':
+                raise ValueError(f"Expected ',' or ']' at position {offset + pos}")
+            pos += 1
+            expect_value = True
+            continue
+
+        # Decode the next element, reading more data until it is complete.
+        # Each retry at least doubles the buffer so large elements stay linear.
+        while True:
+            try:
+                item, end = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError as e:
+                # read_more moves the buffer, so the position is taken first
+                position = offset + e.pos
+                if not read_more(2 * (len(buffer) - pos)):
+                    raise ValueError(f"{e.msg} at position {position}") from e
+                continue
+            # A scalar that ends exactly at the buffer edge may be truncated.
+            # read_more moves the buffer, so it is decoded again either way
+            if end == len(buffer) and not exhausted:
+                read_more(2 * (len(buffer) - pos))
+                continue
+            break
+
+        pos = end
+        expect_value = False
+        first = False
+        yield item
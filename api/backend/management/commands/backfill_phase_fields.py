@@ -0,0 +1,34 @@
+import logging
+from django.core.management.base import BaseCommand
+from backend.models import ProjetoLei
+
+# Set up logging
+logger = logging.getLogger(__name__)
+handler = logging.StreamHandler()
+formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+handler.setFormatter(formatter)
+logger.addHandler(handler)
+logger.setLevel(logging.INFO)
+
+class Command(BaseCommand):
+    help = 'Fill the fields derived from the phases of every initiative (current_phase*, entry_date)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=2000,
+            help='Number of initiatives to update in each statement'
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+
+        projeto_ids = list(ProjetoLei.objects.order_by('id').values_list('id', flat=True))
+        logger.info(f"Found {len(projeto_ids)} initiatives to update")
+
+        # One statement (and transaction) per batch, so rows aren't locked for the whole backfill
+        updated = 0
+        for i in range(0, len(projeto_ids), batch_size):
+            updated += ProjetoLei.objects.filter(id__in=projeto_ids[i:i + batch_size]).update_phase_fields()
+            logger.info(f"Updated {updated}/{len(projeto_ids)} initiatives")
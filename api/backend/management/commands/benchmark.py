@@ -0,0 +1,783 @@
+import gc
+import json
+import os
+import random
+import statistics
+import tempfile
+import time
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager
+from datetime import date, timedelta
+from django.contrib.auth import get_user_model
+from django.contrib.postgres.search import SearchRank
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Count, Exists, F, OuterRef, Q, Subquery
+from django.db.models.functions import TruncMonth
+import numpy as np
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIRequestFactory, force_authenticate
+from backend.analytics import agreement_matrix, filtered_votes, party_agreement, position_matrix
+from backend.bulk_import import CHILD_MODELS, BulkImporter
+from backend.fieldsets import FieldSelection, related_lookups
+from backend.models import (
+    Author, Commission, Debate, Legislature, Phase, ProjetoLei, Publication, RelatedInitiative, Vote, VotePosition,
+)
+from backend.pagination import PageNumberOrCursorPagination
+from backend.rows import RowSerializer
+from backend.search import search_query
+from backend.serializers import PhaseSerializer, ProjetoLeiListSerializer, VoteSerializer
+from backend.views import PHASE_RELATIONS, VOTE_RELATIONS, ProjetoLeiViewSet, with_list_relations
+from .import_parlamento_data import Command as ImportCommand
+
+PARTIES = ['PSD', 'PS', 'CH', 'IL', 'BE', 'PCP', 'L', 'PAN', 'CDS-PP']
+PHASE_NAMES = [
+    'Entrada', 'Admissão', 'Baixa comissão distribuição inicial generalidade',
+    'Anúncio', 'Discussão generalidade', 'Votação na generalidade',
+    'Nova apreciação comissão especialidade', 'Votação final global',
+    'Publicação', 'Envio à Comissão para fixação da Redação final',
+]
+INITIATIVE_TYPES = ['Projeto de Lei', 'Proposta de Lei', 'Projeto de Resolução', 'Proposta de Resolução']
+VOTE_RESULTS = ['Aprovado', 'Rejeitado']
+TITLE_ACTIONS = [
+    'Procede à alteração do', 'Aprova o', 'Revoga o', 'Cria o', 'Reforça o', 'Estabelece o',
+    'Recomenda ao Governo a revisão do', 'Regulamenta o', 'Prorroga o', 'Simplifica o',
+]
+TITLE_SUBJECTS = [
+    'regime jurídico', 'Código Penal', 'Código do Trabalho', 'estatuto', 'programa nacional',
+    'regime de acesso', 'apoio extraordinário', 'sistema de proteção', 'quadro legal', 'plano de ação',
+]
+TITLE_TOPICS = [
+    'da habitação', 'do Serviço Nacional de Saúde', 'do ensino superior', 'da violência doméstica',
+    'dos trabalhadores por turnos', 'da transição energética', 'das autarquias locais',
+    'da proteção de dados', 'do arrendamento urbano', 'dos cuidadores informais',
+    'da mobilidade elétrica', 'das pescas', 'da floresta', 'da cultura', 'do desporto',
+    'da imigração', 'das forças de segurança', 'da justiça administrativa', 'dos bombeiros',
+    'da pessoa com deficiência',
+]
+SEARCH_TERMS = ['habitação', 'violencia domestica', 'saúde', 'cuidadores informais', 'transição', 'bombeiros', 'pesca']
+
+
+def synthetic_initiative(index, rng):
+    """
+    Build one initiative dict with the same shape as the Parlamento
+    IniciativasXVI_json.txt dump, for benchmarking without network access.
+    """
+    start = date(2024, 3, 26) + timedelta(days=rng.randint(0, 600))
+    parties = rng.sample(PARTIES, rng.randint(1, 2))
+    phases = []
+    for phase_index in range(rng.randint(3, len(PHASE_NAMES))):
+        phase_date = start + timedelta(days=phase_index * rng.randint(1, 20))
+        evt_id = f"{index * 100 + phase_index}"
+        phase = {
+            'EvtId': evt_id,
+            'OevId': f"{200000 + index * 100 + phase_index}",
+            'Fase': PHASE_NAMES[phase_index],
+            'DataFase': phase_date.isoformat(),
+            'CodigoFase': str(100 + phase_index),
+            'ObsFase': None,
+            'AnexosFase': [
+                {'anexoNome': f"Anexo {n}", 'anexoFich': f"https://example.org/anexo/{evt_id}/{n}.pdf"}
+                for n in range(rng.randint(0, 2))
+            ],
+            'PublicacaoFase': [{
+                'pubdt': phase_date.isoformat(),
+                'pubLeg': 'XVI',
+                'pubNr': str(rng.randint(1, 200)),
+                'pubSL': '1',
+                'pubTipo': 'DAR II série A',
+                'pubTp': 'A',
+                'pag': [str(rng.randint(1, 90))],
+                'URLDiario': f"https://example.org/diario/{evt_id}",
+            }],
+        }
+        if phase_index == 2:
+            phase['Comissao'] = [{
+                'Nome': 'Comissão de Assuntos Constitucionais, Direitos, Liberdades e Garantias',
+                'IdComissao': str(rng.randint(1000, 1010)),
+                'Numero': '1',
+                'Competente': 'S',
+                'DataDistribuicao': phase_date.isoformat(),
+                'Documentos': [{
+                    'TituloDocumento': 'Nota de admissibilidade',
+                    'TipoDocumento': 'Nota',
+                    'DataDocumento': phase_date.isoformat(),
+                    'URL': f"https://example.org/comissao/{evt_id}/nota.pdf",
+                }],
+                'Relatores': [{'nome': f"Deputado {rng.randint(1, 230)}", 'GP': rng.choice(PARTIES), 'data': phase_date.isoformat()}],
+                'PedidosParecer': [{'entidade': 'Conselho Superior da Magistratura', 'data': phase_date.isoformat()}],
+            }]
+        if phase_index == 4:
+            phase['Intervencoesdebates'] = [{
+                'dataReuniaoPlenaria': phase_date.isoformat(),
+                'faseDebate': 'Generalidade',
+                'faseSessao': 'OD',
+                'sumario': 'Debate na generalidade',
+                'linkVideo': [{'link': f"https://example.org/video/{evt_id}"}],
+                'deputados': [{'nome': f"Deputado {rng.randint(1, 230)}", 'GP': party} for party in rng.sample(PARTIES, 3)],
+            }]
+        if PHASE_NAMES[phase_index].startswith('Votação'):
+            in_favour = rng.sample(PARTIES, rng.randint(1, len(PARTIES)))
+            against = [party for party in PARTIES if party not in in_favour]
+            details = f"A Favor: {', '.join(f'<I>{p}</I>' for p in in_favour)}"
+            if against:
+                details += f"<BR>Contra: {', '.join(f'<I>{p}</I>' for p in against)}"
+            phase['Votacao'] = [{
+                'id': f"{90000 + index * 10 + phase_index}",
+                'data': phase_date.isoformat(),
+                'resultado': rng.choice(VOTE_RESULTS),
+                'detalhe': details,
+                'reuniao': str(rng.randint(1, 150)),
+                'tipoReuniao': 'RP',
+                'unanime': 'unanime' if not against else None,
+                'publicacao': [{'pubdt': phase_date.isoformat(), 'pubNr': '12', 'URLDiario': f"https://example.org/dar/{evt_id}"}],
+            }]
+        phases.append(phase)
+
+    return {
+        'IniId': str(100000 + index),
+        'IniLeg': 'XVI',
+        'IniNr': str(index + 1),
+        'IniTipo': 'J',
+        'IniDescTipo': rng.choice(INITIATIVE_TYPES),
+        'IniTitulo': f"Iniciativa sintética {index} sobre {rng.choice(['habitação', 'saúde', 'educação', 'justiça', 'ambiente'])}",
+        'IniEpigrafe': None,
+        'IniSel': '1',
+        'DataInicioleg': '2024-03-26',
+        'IniLinkTexto': f"https://example.org/texto/{index}.pdf",
+        'IniAutorDeputados': [
+            {'nome': f"Deputado {rng.randint(1, 230)}", 'GP': parties[0], 'idCadastro': str(rng.randint(1, 9999))}
+            for _ in range(rng.randint(0, 4))
+        ],
+        'IniAutorGruposParlamentares': [{'GP': party} for party in parties],
+        'IniEventos': phases,
+    }
+
+
+class RecreatingImporter(BulkImporter):
+    """
+    BulkImporter as it was before reconcile_children, for comparison: the
+    children of re-imported phases and votes are deleted and inserted again.
+    """
+
+    def reconcile_children(self, parent_model, nodes):
+        existing = [node.instance.pk for node in nodes if node.existed]
+        if existing:
+            for model, fk, _ in CHILD_MODELS[parent_model]:
+                model.objects.filter(**{f'{fk}_id__in': existing}).delete()
+            for node in nodes:
+                node.existed = False
+        super().reconcile_children(parent_model, nodes)
+
+
+def last_phase_filter(queryset, name):
+    """The ?phase= filter as it was before current_phase was stored, for comparison"""
+    phase_ids = Phase.objects.filter(name=name).values_list('id', flat=True)
+    if not phase_ids:
+        return queryset.none()
+    last_phase_subquery = ProjetoLei.objects.annotate(
+        last_phase_id=Subquery(
+            Phase.objects.filter(projetos_lei=OuterRef('id'))
+            .order_by('-id')
+            .values('id')[:1]
+        )
+    ).filter(last_phase_id__in=phase_ids)
+    return queryset.filter(id__in=last_phase_subquery.values('id'))
+
+
+def ilike_search(queryset, text):
+    """?search= as it was before full-text search, with DRF's SearchFilter, for comparison"""
+    for term in text.split():
+        queryset = queryset.filter(
+            Q(title__icontains=term) | Q(external_id__icontains=term) | Q(initiative_number__icontains=term)
+        )
+    return queryset
+
+
+def full_text_search(queryset, text):
+    """?search= with FullTextSearchFilter"""
+    query = search_query(text)
+    return queryset.filter(
+        Q(search_vector=query) | Q(external_id=text) | Q(initiative_number=text)
+    ).annotate(rank=SearchRank(F('search_vector'), query)).order_by('-rank', '-external_id')
+
+
+def legislature_votes(number):
+    """Votes on initiatives of legislature number, each once"""
+    links = ProjetoLei.votes.through.objects.filter(vote_id=OuterRef('pk'), projetolei__legislature__number=number)
+    return Vote.objects.filter(Exists(links))
+
+
+def json_party_counts(number):
+    """(party, position) -> votes, decoding Vote.votes in Python"""
+    counts = Counter()
+    for votes in legislature_votes(number).values_list('votes', flat=True).iterator(chunk_size=2000):
+        for position in VotePosition.POSITIONS:
+            for party in set((votes or {}).get(position) or []):
+                counts[party, position] += 1
+    return dict(counts)
+
+
+def sql_party_counts(number):
+    """(party, position) -> votes, a GROUP BY on VotePosition"""
+    rows = VotePosition.objects.filter(vote__in=legislature_votes(number).values('pk')) \
+        .values_list('party', 'position').annotate(count=Count('pk')).order_by()
+    return {(party, position): count for party, position, count in rows}
+
+
+def json_party_months(number, party):
+    """(month, position) -> votes of party, decoding Vote.votes in Python"""
+    counts = Counter()
+    for date, votes in legislature_votes(number).values_list('date', 'votes').iterator(chunk_size=2000):
+        for position in VotePosition.POSITIONS:
+            if date and party in ((votes or {}).get(position) or []):
+                counts[date.replace(day=1), position] += 1
+                break
+    return dict(counts)
+
+
+def sql_party_months(number, party):
+    """(month, position) -> votes of party, a GROUP BY on VotePosition"""
+    rows = VotePosition.objects.filter(party=party, date__isnull=False, vote__in=legislature_votes(number).values('pk')) \
+        .annotate(month=TruncMonth('date')).values_list('month', 'position').annotate(count=Count('pk')).order_by()
+    return {(month, position): count for month, position, count in rows}
+
+
+def python_party_agreement(number):
+    """(party, party) -> (votes with the same position, votes both took a position in), pair by pair in Python"""
+    shared = Counter()
+    same = Counter()
+    for votes in legislature_votes(number).values_list('votes', flat=True).iterator(chunk_size=2000):
+        taken = {}
+        for position in VotePosition.POSITIONS:
+            for party in (votes or {}).get(position) or []:
+                taken.setdefault(party, position)
+        for party, position in taken.items():
+            for other, other_position in taken.items():
+                shared[party, other] += 1
+                same[party, other] += position == other_position
+    return {pair: (same[pair], count) for pair, count in shared.items()}
+
+
+def numpy_party_agreement(number):
+    """(party, party) -> (votes with the same position, votes both took a position in), from the position matrix"""
+    votes = filtered_votes(number)
+    positions = VotePosition.objects.filter(vote__in=votes.values('pk')).values_list('vote_id', 'party', 'position')
+    parties, _, matrix = position_matrix(list(positions), dict(votes.values_list('id', 'date')))
+    agreement, shared = agreement_matrix(matrix)
+    same = np.rint(np.nan_to_num(agreement) * shared).astype(np.int64)
+    return {
+        (party, other): (int(same[i, j]), int(shared[i, j]))
+        for i, party in enumerate(parties) for j, other in enumerate(parties) if shared[i, j]
+    }
+
+
+class QueryCounter:
+    """Count the SQL statements executed on the default connection, by kind"""
+
+    def __init__(self):
+        self.counts = {}
+
+    def __call__(self, execute, sql, params, many, context):
+        kind = sql.lstrip().split(' ', 1)[0].upper()
+        self.counts[kind] = self.counts.get(kind, 0) + 1
+        return execute(sql, params, many, context)
+
+    @property
+    def total(self):
+        return sum(self.counts.values())
+
+    @contextmanager
+    def capture(self):
+        with connection.execute_wrapper(self):
+            yield self
+
+
+class Command(BaseCommand):
+    help = 'Run performance benchmarks. Database changes made while benchmarking are rolled back.'
+
+    scenarios = ['streaming', 'bulk', 'reconcile', 'lookups', 'current_phase', 'search', 'pagination', 'serialization', 'positions', 'agreement']
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'scenario',
+            choices=self.scenarios,
+            help='Benchmark to run'
+        )
+        parser.add_argument(
+            '--file',
+            default=None,
+            help='Path to a local JSON dump to benchmark with'
+        )
+        parser.add_argument(
+            '--url',
+            default=None,
+            help='URL of a JSON dump to benchmark with'
+        )
+        parser.add_argument(
+            '--synthetic',
+            type=int,
+            default=500,
+            help='Number of synthetic initiatives to generate when no --file or --url is given'
+        )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=42,
+            help='Random seed for synthetic data'
+        )
+
+    def handle(self, *args, **options):
+        self.options = options
+        self.temp_files = []
+        try:
+            getattr(self, f"bench_{options['scenario']}")()
+        finally:
+            for path in self.temp_files:
+                os.remove(path)
+
+    @contextmanager
+    def rollback(self):
+        """Run the block in a transaction that is always rolled back"""
+        with transaction.atomic():
+            yield
+            transaction.set_rollback(True)
+
+    def dump_source(self):
+        """Return (url, file_path) for the dump to benchmark with"""
+        if self.options['url']:
+            return self.options['url'], None
+        if self.options['file']:
+            return None, self.options['file']
+
+        count = self.options['synthetic']
+        rng = random.Random(self.options['seed'])
+        fd, path = tempfile.mkstemp(suffix='.json')
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump([synthetic_initiative(i, rng) for i in range(count)], f, ensure_ascii=False)
+        self.temp_files.append(path)
+        self.stdout.write(f"Generated synthetic dump with {count} initiatives ({os.path.getsize(path) / 1e6:.1f} MB)")
+        return None, path
+
+    def rows_written(self):
+        """(inserted, updated, deleted) rows in the current transaction, cascades included"""
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT COALESCE(SUM(n_tup_ins), 0), COALESCE(SUM(n_tup_upd), 0), COALESCE(SUM(n_tup_del), 0) "
+                "FROM pg_stat_xact_user_tables"
+            )
+            return cursor.fetchone()
+
+    def seed_initiatives(self, count):
+        """Insert count initiatives, without relations, with searchable titles"""
+        rng = random.Random(self.options['seed'])
+        legislature, _ = Legislature.objects.get_or_create(number='XVI')
+        ProjetoLei.objects.bulk_create([
+            ProjetoLei(
+                title=f"{rng.choice(TITLE_ACTIONS)} {rng.choice(TITLE_SUBJECTS)} {rng.choice(TITLE_TOPICS)} "
+                      f"e {rng.choice(TITLE_SUBJECTS)} {rng.choice(TITLE_TOPICS)} (versão {index})",
+                type=rng.choice(INITIATIVE_TYPES),
+                legislature=legislature,
+                external_id=f"bench-{index}",
+                initiative_number=str(index),
+                epigraph=f"{rng.choice(TITLE_SUBJECTS)} {rng.choice(TITLE_TOPICS)}",
+            )
+            for index in range(count)
+        ], batch_size=5000)
+        ProjetoLei.objects.update_search_vector()
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        self.stdout.write(f"Seeded {count} initiatives")
+
+    def report(self, headers, rows):
+        widths = [max(len(str(value)) for value in column) for column in zip(headers, *rows)]
+        for row in [headers] + rows:
+            self.stdout.write("  ".join(str(value).ljust(width) for value, width in zip(row, widths)))
+
+    def bench_streaming(self):
+        """Peak memory and time-to-first-insert for json.load vs streaming parse"""
+        url, file_path = self.dump_source()
+        importer = ImportCommand()
+        rows = []
+
+        for mode in ('load', 'stream'):
+            gc.collect()
+            tracemalloc.start()
+            start = time.perf_counter()
+            first_insert = None
+            count = 0
+
+            with self.rollback():
+                if mode == 'stream':
+                    data = importer.stream_data(url, file_path)
+                else:
+                    data = importer.load_data(url, file_path)
+
+                for item in data:
+                    # Import only the first initiative; the rest is parsed so
+                    # peak memory reflects reading the whole dump
+                    if first_insert is None:
+                        importer.run_import([item])
+                        first_insert = time.perf_counter() - start
+                    count += 1
+                del data
+
+            total = time.perf_counter() - start
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            rows.append([
+                mode, count,
+                f"{peak / 1e6:.1f} MB",
+                f"{first_insert:.3f} s" if first_insert is not None else '-',
+                f"{total:.3f} s",
+            ])
+
+        self.report(['mode', 'initiatives', 'peak memory', 'first insert', 'total parse'], rows)
+
+    def bench_bulk(self):
+        """Full import time and query count, one initiative per transaction vs batches of 100"""
+        url, file_path = self.dump_source()
+        importer = ImportCommand()
+        data = importer.load_data(url, file_path)
+        rows = []
+
+        for mode, batch_size in (('row-by-row', 1), ('bulk', 100)):
+            with self.rollback():
+                with QueryCounter().capture() as queries:
+                    start = time.perf_counter()
+                    importer.import_initiatives(data, batch_size=batch_size)
+                    elapsed = time.perf_counter() - start
+            rows.append([
+                mode, len(data),
+                f"{elapsed:.2f} s",
+                f"{len(data) / elapsed:.1f}/s",
+                queries.total,
+                f"{queries.total / len(data):.1f}",
+            ])
+
+        self.report(['mode', 'initiatives', 'time', 'throughput', 'queries', 'queries/initiative'], rows)
+
+    def bench_reconcile(self):
+        """Rows written by a repeated import of the same dump, recreating vs reconciling phase children"""
+        url, file_path = self.dump_source()
+        data = ImportCommand().load_data(url, file_path)
+        rows = []
+
+        for mode, force, importer_class in (
+            ('delete and recreate (--force)', True, RecreatingImporter),
+            ('reconcile (--force)', True, BulkImporter),
+            ('reconcile (incremental)', False, BulkImporter),
+        ):
+            importer = ImportCommand()
+            importer.importer_class = importer_class
+            with self.rollback():
+                importer.import_initiatives(data, batch_size=100)
+                before = self.rows_written()
+
+                importer.force = force
+                start = time.perf_counter()
+                importer.import_initiatives(data, batch_size=100)
+                elapsed = time.perf_counter() - start
+
+                inserted, updated, deleted = (after - value for after, value in zip(self.rows_written(), before))
+            rows.append([mode, len(data), f"{elapsed:.2f} s", inserted, updated, deleted, inserted + updated + deleted])
+
+        self.report(['second import', 'initiatives', 'time', 'inserted', 'updated', 'deleted', 'rows written'], rows)
+
+    def bench_lookups(self):
+        """Query plans of the natural-key lookups made by the importers, on a seeded database"""
+        url, file_path = self.dump_source()
+        data = ImportCommand().load_data(url, file_path)
+
+        with self.rollback():
+            ImportCommand().import_initiatives(data, batch_size=100)
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE')
+
+            phase = Phase.objects.filter(commissions__isnull=False).order_by('-id').first()
+            commission = phase.commissions.first()
+            debate = Debate.objects.order_by('-id').first()
+            vote = Vote.objects.filter(publications__isnull=False).order_by('-id').first()
+            publication = vote.publications.first()
+            author = Author.objects.order_by('-id').first()
+            evt_ids = list(Phase.objects.filter(evt_id__isnull=False).order_by('-id').values_list('evt_id', flat=True)[:100])
+            votes = list(Vote.objects.order_by('-id')[:100])
+            related = RelatedInitiative.objects.order_by('-id').first()
+
+            lookups = [
+                ('phase by (evt_id, oev_id)', Phase.objects.filter(evt_id=phase.evt_id, oev_id=phase.oev_id)),
+                ('100 phases by key', Phase.objects.filter(evt_id__isnull=False, oev_id__isnull=False, evt_id__in=evt_ids)),
+                ('vote by vote_id', Vote.objects.filter(vote_id=vote.vote_id)),
+                ('100 votes by vote_id', Vote.objects.filter(vote_id__in=[v.vote_id for v in votes], vote_id__gt='')),
+                ('vote by (date, result, details)', Vote.objects.filter(date=vote.date, result=vote.result, details=vote.details)),
+                ('author by (name, party, type)', Author.objects.filter(name=author.name, party=author.party, author_type=author.author_type)),
+                ('commission of a phase', Commission.objects.filter(name=commission.name, id_commission=commission.id_commission, phase=phase)),
+                ('debate of a phase', Debate.objects.filter(date=debate.date, phase=debate.phase, phase_link_id=debate.phase_link_id)),
+                ('publication of a vote', Publication.objects.filter(date=publication.date, url=publication.url, vote=vote)),
+            ]
+            if related:
+                lookups.append(('related initiative of a phase', RelatedInitiative.objects.filter(
+                    initiative_id=related.initiative_id, initiative_number=related.initiative_number, phase_id=related.phase_id)))
+
+            for label, queryset in lookups:
+                self.stdout.write(f"-- {label}")
+                self.stdout.write(queryset.explain(analyze=True))
+
+    def bench_current_phase(self):
+        """
+        Latency of the ?phase= filter (count and first page), last-phase
+        subquery vs stored current_phase_name, with --synthetic initiatives
+        and with 10 times as many.
+        """
+        count = self.options['synthetic']
+        rng = random.Random(self.options['seed'])
+        importer = ImportCommand()
+        filters = [
+            ('last-phase subquery', last_phase_filter),
+            ('current_phase_name', lambda queryset, name: queryset.filter(current_phase_name=name)),
+        ]
+        rows = []
+
+        with self.rollback():
+            imported = 0
+            for scale in (1, 10):
+                importer.import_initiatives(
+                    [synthetic_initiative(index, rng) for index in range(imported, count * scale)],
+                    batch_size=100
+                )
+                imported = count * scale
+                with connection.cursor() as cursor:
+                    cursor.execute('ANALYZE')
+
+                for mode, phase_filter in filters:
+                    timings = []
+                    for name in PHASE_NAMES:
+                        for _ in range(5):
+                            start = time.perf_counter()
+                            queryset = phase_filter(ProjetoLei.objects.order_by('-external_id'), name)
+                            queryset.count()
+                            list(queryset[:10])
+                            timings.append(time.perf_counter() - start)
+                    rows.append([
+                        f"{scale}x", imported, mode,
+                        f"{statistics.median(timings) * 1000:.2f} ms",
+                        f"{max(timings) * 1000:.2f} ms",
+                    ])
+
+        self.report(['scale', 'initiatives', 'filter', 'median', 'max'], rows)
+
+    def bench_search(self):
+        """
+        Latency of ?search= (count and first page), ILIKE vs full-text
+        search, on --synthetic initiatives (only the initiatives, no phases).
+        """
+        count = self.options['synthetic']
+        rows = []
+
+        with self.rollback():
+            self.seed_initiatives(count)
+            for mode, search in (('ILIKE', ilike_search), ('full-text', full_text_search)):
+                timings = []
+                matches = []
+                for text in SEARCH_TERMS:
+                    for _ in range(5):
+                        start = time.perf_counter()
+                        queryset = search(ProjetoLei.objects.order_by('-external_id'), text)
+                        total = queryset.count()
+                        list(queryset[:10])
+                        timings.append(time.perf_counter() - start)
+                    matches.append(total)
+                rows.append([
+                    mode, count,
+                    f"{statistics.median(timings) * 1000:.2f} ms",
+                    f"{max(timings) * 1000:.2f} ms",
+                    " ".join(str(total) for total in matches),
+                ])
+
+        self.report(['search', 'initiatives', 'median', 'max', 'matches per term'], rows)
+
+    def bench_pagination(self):
+        """
+        Latency of /projetoslei/ pages at offsets 0, 10k and 100k, page
+        numbers vs cursors, on --synthetic initiatives (only the initiatives).
+        """
+        count = self.options['synthetic']
+        offsets = [offset for offset in (0, 10_000, 100_000) if offset < count]
+        page_size = PageNumberOrCursorPagination.page_size
+        factory = APIRequestFactory()
+        view = ProjetoLeiViewSet.as_view({'get': 'list'})
+        rows = []
+
+        with self.rollback():
+            self.seed_initiatives(count)
+            user = get_user_model().objects.create_user('benchmark')
+            external_ids = list(ProjetoLei.objects.order_by('-external_id').values_list('external_id', flat=True))
+
+            for offset in offsets:
+                cursor = PageNumberOrCursorPagination().encode_cursor((external_ids[offset - 1],), reverse=False)
+                modes = [
+                    ('page', f'/projetoslei/?page={offset // page_size + 1}'),
+                    ('cursor', f'/projetoslei/?cursor={cursor}' if offset else '/projetoslei/?paginate=cursor'),
+                ]
+                for mode, url in modes:
+                    timings = []
+                    for _ in range(10):
+                        request = factory.get(url, SERVER_NAME='localhost')
+                        force_authenticate(request, user)
+                        start = time.perf_counter()
+                        response = view(request)
+                        response.render()
+                        timings.append(time.perf_counter() - start)
+                    first = response.data['results'][0]['external_id']
+                    if first != external_ids[offset]:
+                        raise CommandError(f"{mode} page at offset {offset} starts at {first}, not {external_ids[offset]}")
+                    rows.append([
+                        offset, mode,
+                        f"{statistics.median(timings) * 1000:.2f} ms",
+                        f"{max(timings) * 1000:.2f} ms",
+                    ])
+
+        self.report(['offset', 'pagination', 'median', 'max'], rows)
+
+    def bench_serialization(self):
+        """
+        CPU and wall time to read and render list pages of 10, 100 and 1000
+        rows, model instances through the serializers vs values() rows
+        through backend.rows, for initiatives, votes and phases, on an
+        import of the dump.
+        """
+        url, file_path = self.dump_source()
+        data = ImportCommand().load_data(url, file_path)
+        renderer = JSONRenderer()
+        listings = [
+            ('initiatives', ProjetoLeiListSerializer, lambda: with_list_relations(
+                ProjetoLei.objects.defer('search_vector').order_by('-external_id'))),
+            ('votes', VoteSerializer, lambda: Vote.objects.order_by('-date', '-id').prefetch_related(
+                *related_lookups(Vote, FieldSelection(), VOTE_RELATIONS))),
+            ('phases', PhaseSerializer, lambda: Phase.objects.order_by('-date', '-id').prefetch_related(
+                *related_lookups(Phase, FieldSelection(), PHASE_RELATIONS))),
+        ]
+        rows = []
+
+        with self.rollback():
+            ImportCommand().import_initiatives(data, batch_size=100)
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE')
+
+            for name, serializer_class, queryset in listings:
+                total = queryset().count()
+                for size in (10, 100, 1000):
+                    def from_instances():
+                        return renderer.render(serializer_class(queryset()[:size], many=True).data)
+
+                    def from_values():
+                        row_serializer = RowSerializer(serializer_class(many=True))
+                        page = queryset().prefetch_related(None).values(*row_serializer.lookups())[:size]
+                        return renderer.render(row_serializer.serialize(list(page)))
+
+                    if from_instances() != from_values():
+                        raise CommandError(f"Serializer and values() output differ for {size} {name}")
+                    for mode, render in (('serializer', from_instances), ('values', from_values)):
+                        cpu, wall = [], []
+                        for _ in range(5):
+                            cpu_start, wall_start = time.process_time(), time.perf_counter()
+                            render()
+                            cpu.append(time.process_time() - cpu_start)
+                            wall.append(time.perf_counter() - wall_start)
+                        rows.append([
+                            name, min(size, total), mode,
+                            f"{statistics.median(cpu) * 1000:.2f} ms",
+                            f"{statistics.median(wall) * 1000:.2f} ms",
+                        ])
+
+        self.report(['list', 'rows', 'mode', 'CPU', 'wall'], rows)
+
+    def bench_positions(self):
+        """
+        Latency of vote counts by party and position, and of one party's
+        positions by month, decoding Vote.votes in Python vs GROUP BY on
+        VotePosition, with --synthetic initiatives and 10 times as many.
+        """
+        count = self.options['synthetic']
+        rng = random.Random(self.options['seed'])
+        importer = ImportCommand()
+        aggregations = [
+            ('by party and position', json_party_counts, sql_party_counts, ()),
+            ('PS by month', json_party_months, sql_party_months, ('PS',)),
+        ]
+        rows = []
+
+        with self.rollback():
+            imported = 0
+            for scale in (1, 10):
+                importer.import_initiatives(
+                    [synthetic_initiative(index, rng) for index in range(imported, count * scale)],
+                    batch_size=100
+                )
+                imported = count * scale
+                with connection.cursor() as cursor:
+                    cursor.execute('ANALYZE')
+                votes = Vote.objects.count()
+
+                for label, json_count, sql_count, args in aggregations:
+                    if json_count('XVI', *args) != sql_count('XVI', *args):
+                        raise CommandError(f"JSON and GROUP BY counts differ for {label}")
+                    for mode, aggregate in (('JSON in Python', json_count), ('GROUP BY', sql_count)):
+                        timings = []
+                        for _ in range(5):
+                            start = time.perf_counter()
+                            aggregate('XVI', *args)
+                            timings.append(time.perf_counter() - start)
+                        rows.append([
+                            f"{scale}x", votes, label, mode,
+                            f"{statistics.median(timings) * 1000:.2f} ms",
+                            f"{max(timings) * 1000:.2f} ms",
+                        ])
+
+        self.report(['scale', 'votes', 'aggregation', 'mode', 'median', 'max'], rows)
+
+    def bench_agreement(self):
+        """
+        Latency of the agreement between every pair of parties, pair by pair
+        in Python from Vote.votes vs one party x vote matrix in NumPy, and of
+        the whole party_agreement response (with majority alignment by month), with
+        --synthetic initiatives and 10 times as many.
+        """
+        count = self.options['synthetic']
+        rng = random.Random(self.options['seed'])
+        importer = ImportCommand()
+        modes = [
+            ('pairs in Python', python_party_agreement),
+            ('NumPy matrix', numpy_party_agreement),
+            ('party_agreement', party_agreement),
+        ]
+        rows = []
+
+        with self.rollback():
+            imported = 0
+            for scale in (1, 10):
+                importer.import_initiatives(
+                    [synthetic_initiative(index, rng) for index in range(imported, count * scale)],
+                    batch_size=100
+                )
+                imported = count * scale
+                with connection.cursor() as cursor:
+                    cursor.execute('ANALYZE')
+                votes = Vote.objects.count()
+
+                if python_party_agreement('XVI') != numpy_party_agreement('XVI'):
+                    raise CommandError("Python and numpy party agreement differ")
+                for mode, compute in modes:
+                    timings = []
+                    for _ in range(5):
+                        start = time.perf_counter()
+                        compute('XVI')
+                        timings.append(time.perf_counter() - start)
+                    rows.append([
+                        f"{scale}x", votes, mode,
+                        f"{statistics.median(timings) * 1000:.2f} ms",
+                        f"{max(timings) * 1000:.2f} ms",
+                    ])
+
+        self.report(['scale', 'votes', 'mode', 'median', 'max'], rows)
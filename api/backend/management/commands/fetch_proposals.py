@@ -1,6 +1,8 @@
 import requests
 from xml.etree import ElementTree
 from django.core.management.base import BaseCommand
+from backend.caching import bump_import_generation
+from backend.snapshots import snapshot_after_import
 from backend.models import ProjetoLei, Phase, Author, Attachment, Vote, Legislature
 from datetime import datetime
 import re
@@ -39,7 +41,9 @@ class Command(BaseCommand):
                     if description:
                         vote_obj.description = description
                     vote_obj.save()
-                    
+
+                # The party positions of the vote, as rows
+                Vote.objects.filter(pk=vote_obj.pk).sync_positions()
                 votes.append(vote_obj)
                 self.stdout.write(f"Vote {'created' if created else 'retrieved'}: {result}")
             except Exception as e:
@@ -73,7 +77,9 @@ class Command(BaseCommand):
                     if description:
                         vote_obj.description = description
                     vote_obj.save()
-                    
+
+                # The party positions of the vote, as rows
+                Vote.objects.filter(pk=vote_obj.pk).sync_positions()
                 votes.append(vote_obj)
                 self.stdout.write(f"Vote {'created' if created else 'retrieved'}: {result}")
             except Exception as e:
@@ -393,6 +399,8 @@ class Command(BaseCommand):
                     existing_proposal.attachments.set(attachments)  # Updated
                     existing_proposal.phases.set(phases)
                     existing_proposal.votes.set(votes)  # Updated
+                    ProjetoLei.objects.filter(pk=existing_proposal.pk).update_phase_fields()
+                    ProjetoLei.objects.filter(pk=existing_proposal.pk).update_search_vector()
                     
                     self.stdout.write(self.style.SUCCESS(f"Updated proposal: {data['title']}"))
                 else:
@@ -405,9 +413,16 @@ class Command(BaseCommand):
                     new_proposal.attachments.set(attachments)  # Updated
                     new_proposal.phases.set(phases)
                     new_proposal.votes.set(votes)  # Updated
+                    ProjetoLei.objects.filter(pk=new_proposal.pk).update_phase_fields()
+                    ProjetoLei.objects.filter(pk=new_proposal.pk).update_search_vector()
                     
                     self.stdout.write(self.style.SUCCESS(f"Created proposal: {data['title']}"))
             except Exception as e:
                 self.stdout.write(self.style.ERROR(f"Error saving proposal: {str(e)}"))
 
+        # Counts cached for the previous data are recomputed
+        generation = bump_import_generation()
+        self.stdout.write(f"Import generation is now {generation}")
+        snapshot_after_import()
+
         self.stdout.write(self.style.SUCCESS("\nImport process completed!"))
\ No newline at end of file
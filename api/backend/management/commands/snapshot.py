@@ -0,0 +1,43 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from backend.snapshots import FORMATS, KEEP, write_snapshot
+
+
+class Command(BaseCommand):
+    help = (
+        'Write a columnar snapshot (Arrow IPC or Parquet) of initiatives, their phases and votes, '
+        'and the vote positions of the parties, for the current import generation'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dir',
+            default=None,
+            help='Directory to write the snapshot to (default: the SNAPSHOT_DIR setting)'
+        )
+        parser.add_argument(
+            '--format',
+            choices=list(FORMATS),
+            default='arrow',
+            help='arrow (Arrow IPC files, can be memory-mapped) or parquet'
+        )
+        parser.add_argument(
+            '--keep',
+            type=int,
+            default=KEEP,
+            help='Number of snapshots to keep, the newest first'
+        )
+
+    def handle(self, *args, **options):
+        directory = options['dir'] or settings.SNAPSHOT_DIR
+        if not directory:
+            raise CommandError('Give --dir or set SNAPSHOT_DIR')
+        if options['keep'] < 1:
+            raise CommandError('--keep must be at least 1')
+
+        manifest = write_snapshot(directory, options['format'], options['keep'])
+        for name, table in manifest['tables'].items():
+            self.stdout.write(f"{name}: {table['rows']} rows in {table['file']}")
+        self.stdout.write(self.style.SUCCESS(
+            f"Wrote the snapshot of import generation {manifest['generation']} to {directory}"
+        ))
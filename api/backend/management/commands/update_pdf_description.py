@@ -1,5 +1,7 @@
 from django.core.management.base import BaseCommand
+from backend.caching import bump_import_generation
 from backend.models import ProjetoLei
+from backend.snapshots import snapshot_after_import
 from backend.utils import download_pdf, extract_text_from_pdf, generate_summary
 
 class Command(BaseCommand):
@@ -10,6 +12,7 @@ class Command(BaseCommand):
         iniciativas = ProjetoLei.objects.all()  # Atualizei para pegar todas as iniciativas
         
         total_iniciativas = len(iniciativas)
+        atualizadas = 0
         self.stdout.write(f"Iniciando o processamento de {total_iniciativas} iniciativas...")
         
         for idx, iniciativa in enumerate(iniciativas, start=1):
@@ -46,7 +49,14 @@ class Command(BaseCommand):
             # Atualizar o campo 'descricao' com o resumo gerado
             iniciativa.description = resumo
             iniciativa.save()
+            ProjetoLei.objects.filter(pk=iniciativa.pk).update_search_vector()
+            atualizadas += 1
             
             self.stdout.write(f"Projeto {iniciativa.id} atualizado com sucesso.")
         
+        # Descriptions show in lists too, cached for the current import
+        # generation; the snapshot records that generation and updated_at
+        if atualizadas:
+            bump_import_generation()
+            snapshot_after_import()
         self.stdout.write("Processamento concluído!")
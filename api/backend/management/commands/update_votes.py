@@ -3,7 +3,9 @@ import logging
 import re
 from django.core.management.base import BaseCommand
 from django.db import transaction
-from backend.models import Vote
+from backend.caching import bump_import_generation
+from backend.snapshots import snapshot_after_import
+from backend.models import ProjetoLei, Vote
 
 # Set up logging
 logger = logging.getLogger(__name__)
@@ -42,6 +44,7 @@ class Command(BaseCommand):
         for i in range(0, len(vote_ids), batch_size):
             batch_ids = vote_ids[i:i+batch_size]
             votes_batch = Vote.objects.filter(id__in=batch_ids)
+            updated_ids = []
             
             with transaction.atomic():
                 for vote in votes_batch:
@@ -51,10 +54,12 @@ class Command(BaseCommand):
                             # Parse vote details
                             parsed_votes = self.parse_vote_details(vote.details)
                             
-                            # Update votes field with parsed data
-                            vote.votes = parsed_votes
-                            vote.save(update_fields=['votes'])
-                            updated += 1
+                            # Update votes field with parsed data, if it changed
+                            if vote.votes != parsed_votes:
+                                vote.votes = parsed_votes
+                                vote.save(update_fields=['votes'])
+                                updated_ids.append(vote.id)
+                                updated += 1
                         
                         processed += 1
                         
@@ -65,8 +70,19 @@ class Command(BaseCommand):
                     except Exception as e:
                         errors += 1
                         logger.error(f"Error processing vote {vote.id}: {str(e)}")
+
+                # The party positions of the votes, as rows
+                Vote.objects.filter(id__in=batch_ids).sync_positions()
+                # The initiatives showing these votes changed, for their ETags
+                if updated_ids:
+                    ProjetoLei.objects.filter(votes__id__in=updated_ids).touch()
         
         logger.info(f"Completed. Processed: {processed}, Updated: {updated}, Errors: {errors}")
+        
+        # Everything cached for the current import generation, and the snapshot
+        if updated:
+            bump_import_generation()
+            snapshot_after_import()
     
     def parse_vote_details(self, details):
         """
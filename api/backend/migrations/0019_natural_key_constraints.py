@@ -0,0 +1,124 @@
+# Generated by Django 5.2.18 on 2026-10-17 19:17
+
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+def move_links(through, column, keep, duplicates):
+    """Move the rows of the many-to-many table through from duplicates to keep, unless keep has them already"""
+    other = next(
+        field.attname for field in through._meta.concrete_fields
+        if field.is_relation and field.attname != column
+    )
+    linked = set(through.objects.filter(**{column: keep}).values_list(other, flat=True))
+    for link in through.objects.filter(**{f'{column}__in': duplicates}).order_by('id'):
+        if getattr(link, other) in linked:
+            link.delete()
+        else:
+            setattr(link, column, keep)
+            link.save()
+            linked.add(getattr(link, other))
+
+
+def keep_oldest(model, key_fields, **condition):
+    """
+    Merge the rows repeating a natural key into the oldest one (the one
+    the importers have always matched): the rows referencing the others
+    (children and many-to-many links) are moved to it before they are
+    deleted, so the delete cascades to nothing. Keys with a NULL part are
+    never duplicates.
+
+    Children with a natural key of their own may now repeat it; they are
+    merged by the keep_oldest calls that follow for their model.
+    """
+    not_null = {f'{field}__isnull': False for field in key_fields}
+    groups = (
+        model.objects.filter(**not_null, **condition)
+        .values(*key_fields)
+        .annotate(first=Min('id'), count=Count('id'))
+        .filter(count__gt=1)
+    )
+    for group in groups:
+        keep = group['first']
+        duplicates = list(
+            model.objects.filter(**{field: group[field] for field in key_fields})
+            .exclude(id=keep)
+            .values_list('id', flat=True)
+        )
+        for relation in model._meta.related_objects:
+            if relation.many_to_many:
+                through = relation.through
+                column = next(
+                    field.attname for field in through._meta.concrete_fields
+                    if field.is_relation and field.related_model is model
+                )
+                move_links(through, column, keep, duplicates)
+            else:
+                relation.related_model.objects.filter(
+                    **{f'{relation.field.name}__in': duplicates}
+                ).update(**{relation.field.name: keep})
+        model.objects.filter(id__in=duplicates).delete()
+
+
+def merge_duplicates(apps, schema_editor):
+    Phase = apps.get_model('backend', 'Phase')
+
+    # Phases without both ids are never matched on them, store them as NULL
+    Phase.objects.filter(evt_id='').update(evt_id=None)
+    Phase.objects.filter(oev_id='').update(oev_id=None)
+
+    # Parents before their children: merging phases moves their commissions and
+    # debates to the kept phase, where they may repeat their own natural keys
+    keep_oldest(Phase, ['evt_id', 'oev_id'])
+    keep_oldest(apps.get_model('backend', 'Vote'), ['vote_id'], vote_id__gt='')
+    keep_oldest(apps.get_model('backend', 'Author'), ['name', 'party', 'author_type'])
+    keep_oldest(apps.get_model('backend', 'Commission'), ['phase', 'name', 'id_commission'])
+    keep_oldest(apps.get_model('backend', 'Debate'), ['phase_link', 'date', 'phase'])
+    keep_oldest(apps.get_model('backend', 'Publication'), ['vote', 'date', 'url'])
+    keep_oldest(apps.get_model('backend', 'RelatedInitiative'), ['phase', 'initiative_id', 'initiative_number'])
+
+    # Check the deferred foreign keys now: tables with pending trigger events can't be altered
+    schema_editor.execute('SET CONSTRAINTS ALL IMMEDIATE')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backend', '0018_content_hash'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicates, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='vote',
+            index=models.Index(fields=['date', 'result'], name='vote_date_result_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='author',
+            constraint=models.UniqueConstraint(fields=('name', 'party', 'author_type'), name='unique_author'),
+        ),
+        migrations.AddConstraint(
+            model_name='commission',
+            constraint=models.UniqueConstraint(fields=('phase', 'name', 'id_commission'), name='unique_phase_commission'),
+        ),
+        migrations.AddConstraint(
+            model_name='debate',
+            constraint=models.UniqueConstraint(fields=('phase_link', 'date', 'phase'), name='unique_phase_debate'),
+        ),
+        migrations.AddConstraint(
+            model_name='phase',
+            constraint=models.UniqueConstraint(fields=('evt_id', 'oev_id'), name='unique_phase_event'),
+        ),
+        migrations.AddConstraint(
+            model_name='publication',
+            constraint=models.UniqueConstraint(fields=('vote', 'date', 'url'), name='unique_vote_publication'),
+        ),
+        migrations.AddConstraint(
+            model_name='relatedinitiative',
+            constraint=models.UniqueConstraint(fields=('phase', 'initiative_id', 'initiative_number'), name='unique_related_initiative'),
+        ),
+        migrations.AddConstraint(
+            model_name='vote',
+            constraint=models.UniqueConstraint(condition=models.Q(('vote_id__gt', '')), fields=('vote_id',), name='unique_vote_id'),
+        ),
+    ]
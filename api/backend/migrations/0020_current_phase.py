@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-17 19:24
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backend', '0019_natural_key_constraints'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='projetolei',
+            name='current_phase',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='backend.phase'),
+        ),
+        migrations.AddField(
+            model_name='projetolei',
+            name='current_phase_date',
+            field=models.DateField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='projetolei',
+            name='current_phase_name',
+            field=models.CharField(blank=True, db_index=True, max_length=1000, null=True),
+        ),
+    ]
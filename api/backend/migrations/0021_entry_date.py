@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 19:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backend', '0020_current_phase'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='projetolei',
+            name='entry_date',
+            field=models.DateField(blank=True, db_index=True, null=True),
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 5.2.18 on 2026-10-17 19:34
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.contrib.postgres.search import SearchVector
+from django.db import migrations
+from django.db.models import F, Func, TextField, Value
+
+# The expression of backend.search.search_vector when this migration was
+# written, inlined so that later changes to it don't change this migration
+ACCENTED = 'áàâãäåçéèêëíìîïñóòôõöúùûüýÿÁÀÂÃÄÅÇÉÈÊËÍÌÎÏÑÓÒÔÕÖÚÙÛÜÝ'
+PLAIN = 'aaaaaaceeeeiiiinooooouuuuyyAAAAAACEEEEIIIINOOOOOUUUUY'
+
+
+def unaccent(field):
+    return Func(F(field), Value(ACCENTED), Value(PLAIN), function='translate', output_field=TextField())
+
+
+def fill_search_vector(apps, schema_editor):
+    apps.get_model('backend', 'ProjetoLei').objects.update(search_vector=(
+        SearchVector(unaccent('title'), weight='A', config='portuguese')
+        + SearchVector(unaccent('epigraph'), weight='B', config='portuguese')
+        + SearchVector(unaccent('description'), weight='C', config='portuguese')
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backend', '0023_import_generation'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='projetolei',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunPython(fill_search_vector, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='projetolei',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='projetolei_search_idx'),
+        ),
+    ]
@@ -0,0 +1,54 @@
+from django.contrib.postgres.indexes import GinIndex, OpClass
+from django.db import DatabaseError, migrations, transaction
+from django.db.models import F, Func, TextField, Value
+from django.db.models.functions import Lower
+
+TRIGRAM_INDEXES = [('name', 'author_name_trgm_idx'), ('party', 'author_party_trgm_idx')]
+
+# backend.search.trigram_index when this migration was written, inlined so
+# that later changes to it don't change this migration
+ACCENTED = 'áàâãäåçéèêëíìîïñóòôõöúùûüýÿÁÀÂÃÄÅÇÉÈÊËÍÌÎÏÑÓÒÔÕÖÚÙÛÜÝ'
+PLAIN = 'aaaaaaceeeeiiiinooooouuuuyyAAAAAACEEEEIIIINOOOOOUUUUY'
+
+
+def trigram_index(field, name):
+    plain = Lower(Func(F(field), Value(ACCENTED), Value(PLAIN), function='translate', output_field=TextField()))
+    return GinIndex(OpClass(plain, name='gin_trgm_ops'), name=name)
+
+
+def add_trigram_indexes(apps, schema_editor):
+    """
+    Install pg_trgm and index author names and parties with it, if the
+    server has the extension. Without it, name matching falls back to
+    substring search (see backend.search.match_names).
+    """
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm'")
+        if cursor.fetchone() is None:
+            return
+    try:
+        with transaction.atomic(using=schema_editor.connection.alias):
+            schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    except DatabaseError:
+        # Not allowed to install extensions
+        return
+
+    Author = apps.get_model('backend', 'Author')
+    for field, name in TRIGRAM_INDEXES:
+        schema_editor.add_index(Author, trigram_index(field, name))
+
+
+def remove_trigram_indexes(apps, schema_editor):
+    for _, name in TRIGRAM_INDEXES:
+        schema_editor.execute(f'DROP INDEX IF EXISTS {schema_editor.quote_name(name)}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backend', '0024_search_vector'),
+    ]
+
+    operations = [
+        migrations.RunPython(add_trigram_indexes, remove_trigram_indexes),
+    ]
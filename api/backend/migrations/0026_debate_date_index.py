@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 19:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backend', '0025_author_trigram_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='debate',
+            name='date',
+            field=models.DateField(blank=True, db_index=True, null=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 19:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backend', '0026_debate_date_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='projetolei',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 5.2.18 on 2026-10-17 20:06
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# The parties of Vote.votes as rows, as VoteQuerySet.sync_positions writes them:
+# a party listed under two positions keeps the first of a_favor, contra, abstencao
+FILL_POSITIONS = """
+INSERT INTO backend_voteposition (vote_id, party, position, date)
+SELECT DISTINCT ON (vote.id, party.name) vote.id, party.name, position.name, vote.date
+FROM backend_vote vote
+CROSS JOIN unnest(ARRAY['a_favor', 'contra', 'abstencao']) WITH ORDINALITY AS position (name, rank)
+CROSS JOIN LATERAL (
+    SELECT left(value, 255) AS name, ordinality
+    FROM jsonb_array_elements_text(
+        CASE WHEN jsonb_typeof(vote.votes -> position.name) = 'array' THEN vote.votes -> position.name ELSE '[]' END
+    ) WITH ORDINALITY
+) party
+WHERE jsonb_typeof(vote.votes) = 'object'
+ORDER BY vote.id, party.name, position.rank, party.ordinality
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backend', '0027_projetolei_updated_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VotePosition',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('party', models.CharField(max_length=255)),
+                ('position', models.CharField(choices=[('a_favor', 'A favor'), ('contra', 'Contra'), ('abstencao', 'Abstenção')], max_length=10)),
+                ('date', models.DateField(null=True)),
+                ('vote', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='positions', to='backend.vote')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['party', 'date', 'position'], name='voteposition_party_date_idx'), models.Index(fields=['date', 'party', 'position'], name='voteposition_date_party_idx')],
+                'constraints': [models.UniqueConstraint(fields=('vote', 'party'), name='unique_vote_position')],
+            },
+        ),
+        migrations.RunSQL(FILL_POSITIONS, migrations.RunSQL.noop),
+    ]
@@ -0,0 +1,52 @@
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+def merge_authors_without_party(apps, schema_editor):
+    """
+    Merge the authors repeating (name, author_type) without a party into
+    the oldest one, which the importers have always matched, moving their
+    initiative links to it.
+    """
+    Author = apps.get_model('backend', 'Author')
+    Authors = apps.get_model('backend', 'ProjetoLei').authors.through
+    groups = (
+        Author.objects.filter(party__isnull=True)
+        .values('name', 'author_type')
+        .annotate(first=Min('id'), count=Count('id'))
+        .filter(count__gt=1)
+    )
+    for group in groups:
+        keep = group['first']
+        duplicates = list(
+            Author.objects.filter(name=group['name'], author_type=group['author_type'], party__isnull=True)
+            .exclude(id=keep)
+            .values_list('id', flat=True)
+        )
+        linked = set(Authors.objects.filter(author_id=keep).values_list('projetolei_id', flat=True))
+        for link in Authors.objects.filter(author_id__in=duplicates).order_by('id'):
+            if link.projetolei_id in linked:
+                link.delete()
+            else:
+                link.author_id = keep
+                link.save()
+                linked.add(link.projetolei_id)
+        Author.objects.filter(id__in=duplicates).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backend', '0028_vote_positions'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_authors_without_party, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='author',
+            constraint=models.UniqueConstraint(
+                condition=models.Q(('party__isnull', True)), fields=('name', 'author_type'),
+                name='unique_author_without_party',
+            ),
+        ),
+    ]
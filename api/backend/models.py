@@ -1,4 +1,9 @@
+from itertools import islice
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
+from django.utils import timezone
+from .search import search_vector
 
 
 class Legislature(models.Model):
@@ -20,6 +25,15 @@ class Phase(models.Model):
     evt_id = models.CharField(max_length=50, null=True, blank=True)
     act_id = models.CharField(max_length=50, null=True, blank=True)
 
+    # Fingerprint of the source data, used to skip unchanged phases on re-import
+    content_hash = models.CharField(max_length=64, null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            # Phases from the dump are identified by their event ids
+            models.UniqueConstraint(fields=['evt_id', 'oev_id'], name='unique_phase_event'),
+        ]
+
     def __str__(self):
         return self.name
 
@@ -42,10 +56,57 @@ class Author(models.Model):
     )
     id_cadastro = models.CharField(max_length=50, null=True, blank=True)
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['name', 'party', 'author_type'], name='unique_author'),
+            # NULLs are distinct in unique_author, so authors without a party need their own
+            models.UniqueConstraint(
+                fields=['name', 'author_type'], condition=models.Q(party__isnull=True), name='unique_author_without_party'
+            ),
+        ]
+        # Trigram indexes on name and party are created by migration 0025
+        # when the database has pg_trgm, see backend.search.trigram_index
+
     def __str__(self):
         return self.name
 
 
+class VoteQuerySet(models.QuerySet):
+    def sync_positions(self, batch_size=2000):
+        """
+        Make the VotePosition rows of these votes match the parties listed
+        in their votes JSON, writing only the rows that changed.
+        """
+        votes = self.order_by().values_list('id', 'date', 'votes').iterator(chunk_size=batch_size)
+        while chunk := list(islice(votes, batch_size)):
+            wanted = {}
+            for vote_id, date, positions in chunk:
+                if not isinstance(positions, dict):
+                    continue
+                for position in VotePosition.POSITIONS:
+                    parties = positions.get(position)
+                    if not isinstance(parties, list):
+                        continue
+                    for party in parties:
+                        # A party listed twice keeps its first position
+                        wanted.setdefault((vote_id, str(party)[:255]), (position, date))
+
+            stale = []
+            existing = VotePosition.objects.filter(vote_id__in=[row[0] for row in chunk])
+            for pk, vote_id, party, position, date in existing.values_list('pk', 'vote_id', 'party', 'position', 'date'):
+                if wanted.get((vote_id, party)) == (position, date):
+                    del wanted[vote_id, party]
+                else:
+                    stale.append(pk)
+
+            if stale:
+                VotePosition.objects.filter(pk__in=stale).delete()
+            VotePosition.objects.bulk_create([
+                VotePosition(vote_id=vote_id, party=party, position=position, date=date)
+                for (vote_id, party), (position, date) in wanted.items()
+            ], batch_size=batch_size)
+
+
 class Vote(models.Model):
     date = models.DateField(null=True)
     result = models.CharField(max_length=50)
@@ -60,10 +121,56 @@ class Vote(models.Model):
     absences = models.JSONField(null=True, blank=True)
     vote_id = models.CharField(max_length=50, null=True, blank=True)
 
+    objects = VoteQuerySet.as_manager()
+
+    class Meta:
+        constraints = [
+            # Votes without an id in the dump are stored with an empty vote_id
+            models.UniqueConstraint(fields=['vote_id'], condition=models.Q(vote_id__gt=''), name='unique_vote_id'),
+        ]
+        indexes = [
+            # Votes without an id are matched on (date, result, details); details
+            # is unbounded text, too large for a btree key, and rarely needed to narrow it down
+            models.Index(fields=['date', 'result'], name='vote_date_result_idx'),
+        ]
+
     def __str__(self):
         return f"{self.date} - {self.result}"
 
 
+class VotePosition(models.Model):
+    """
+    How a party voted in a plenary vote: Vote.votes as rows, kept in sync
+    by the importers (see VoteQuerySet.sync_positions), so that counts by
+    party, position and date are plain GROUP BYs.
+    """
+    FAVOR = 'a_favor'
+    AGAINST = 'contra'
+    ABSTENTION = 'abstencao'
+    POSITIONS = [FAVOR, AGAINST, ABSTENTION]
+    POSITION_CHOICES = [(FAVOR, 'A favor'), (AGAINST, 'Contra'), (ABSTENTION, 'Abstenção')]
+
+    vote = models.ForeignKey(Vote, on_delete=models.CASCADE, related_name="positions")
+    party = models.CharField(max_length=255)
+    position = models.CharField(max_length=10, choices=POSITION_CHOICES)
+    # The date of the vote, so that counts by date don't join votes
+    date = models.DateField(null=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['vote', 'party'], name='unique_vote_position'),
+        ]
+        indexes = [
+            # A party's positions over time, counted from the index alone
+            models.Index(fields=['party', 'date', 'position'], name='voteposition_party_date_idx'),
+            # Every party's positions in a period
+            models.Index(fields=['date', 'party', 'position'], name='voteposition_date_party_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.party}: {self.position} ({self.vote_id})"
+
+
 class Publication(models.Model):
     date = models.DateField(null=True, blank=True)
     legislature_code = models.CharField(max_length=50, null=True, blank=True)
@@ -87,6 +194,11 @@ class Publication(models.Model):
     phase = models.ForeignKey(Phase, on_delete=models.CASCADE, null=True, blank=True, related_name="publications")
     vote = models.ForeignKey(Vote, on_delete=models.CASCADE, null=True, blank=True, related_name="publications")
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['vote', 'date', 'url'], name='unique_vote_publication'),
+        ]
+
     def __str__(self):
         return f"{self.date} - {self.publication_type} {self.number}"
 
@@ -123,6 +235,11 @@ class Commission(models.Model):
     # Link to phase
     phase = models.ForeignKey(Phase, on_delete=models.CASCADE, null=True, blank=True, related_name="commissions")
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['phase', 'name', 'id_commission'], name='unique_phase_commission'),
+        ]
+
     def __str__(self):
         return self.name
 
@@ -217,7 +334,7 @@ class Forwarding(models.Model):
 
 
 class Debate(models.Model):
-    date = models.DateField(null=True, blank=True)
+    date = models.DateField(null=True, blank=True, db_index=True)
     phase = models.CharField(max_length=100, null=True, blank=True)
     session_phase = models.CharField(max_length=10, null=True, blank=True)
     start_time = models.CharField(max_length=10, null=True, blank=True)
@@ -226,6 +343,11 @@ class Debate(models.Model):
     content = models.TextField(null=True, blank=True)
     phase_link = models.ForeignKey(Phase, on_delete=models.CASCADE, null=True, blank=True, related_name="debates")
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['phase_link', 'date', 'phase'], name='unique_phase_debate'),
+        ]
+
     def __str__(self):
         return f"Debate on {self.date}"
 
@@ -308,10 +430,41 @@ class RelatedInitiative(models.Model):
     selection = models.CharField(max_length=10, null=True, blank=True)
     phase = models.ForeignKey(Phase, on_delete=models.CASCADE, null=True, blank=True, related_name="related_initiatives")
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['phase', 'initiative_id', 'initiative_number'], name='unique_related_initiative'),
+        ]
+
     def __str__(self):
         return f"{self.initiative_type} {self.initiative_number}"
 
 
+class ProjetoLeiQuerySet(models.QuerySet):
+    def update_phase_fields(self):
+        """
+        Store the fields derived from the phases of each initiative: its
+        latest phase (by date, then the one imported last) in current_phase*,
+        and the date of its "Entrada" phase in entry_date.
+        """
+        phases = Phase.objects.filter(projetos_lei=models.OuterRef('pk'))
+        latest = phases.order_by(models.F('date').desc(nulls_last=True), '-id')
+        entry = phases.filter(name='Entrada').order_by('date')
+        return self.update(
+            current_phase_id=models.Subquery(latest.values('id')[:1]),
+            current_phase_name=models.Subquery(latest.values('name')[:1]),
+            current_phase_date=models.Subquery(latest.values('date')[:1]),
+            entry_date=models.Subquery(entry.values('date')[:1]),
+        )
+
+    def update_search_vector(self):
+        """Store the full-text search document of each initiative (see backend.search)"""
+        return self.update(search_vector=search_vector())
+
+    def touch(self):
+        """Mark the initiatives as changed, for changes to their related rows that don't save them"""
+        return self.update(updated_at=timezone.now())
+
+
 class ProjetoLei(models.Model):
     title = models.TextField(db_index=True)
     type = models.CharField(max_length=255, db_index=True)
@@ -349,5 +502,48 @@ class ProjetoLei(models.Model):
     # Special fields for originated initiatives
     originated_initiatives = models.JSONField(null=True, blank=True)
 
+    # Fingerprint of the source data, used to skip unchanged initiatives on re-import
+    content_hash = models.CharField(max_length=64, null=True, blank=True)
+
+    # Derived from the phases and kept up to date by the importers (see update_phase_fields):
+    # the latest phase, and the date of the earliest "Entrada" phase (NULL without one)
+    current_phase = models.ForeignKey(Phase, on_delete=models.SET_NULL, null=True, blank=True, related_name="+")
+    current_phase_name = models.CharField(max_length=1000, null=True, blank=True, db_index=True)
+    current_phase_date = models.DateField(null=True, blank=True)
+    entry_date = models.DateField(null=True, blank=True, db_index=True)
+
+    # Full-text search document, kept up to date by the importers (see update_search_vector)
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    # When the initiative, as the API shows it, last changed: saved by the
+    # importers, or set with touch(). Used as its Last-Modified and ETag
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = ProjetoLeiQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            GinIndex(fields=['search_vector'], name='projetolei_search_idx'),
+        ]
+
+    def __str__(self):
+        return self.title
+
+
+class DashboardStatistics(models.Model):
+    """Statistics shown on the dashboard, computed after each import (see backend.dashboard)"""
+    # JSON text rather than a JSONField: jsonb doesn't keep key order, and phases_count is ordered by count
+    stats = models.TextField()
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Dashboard statistics ({self.updated_at})"
+
+
+class ImportGeneration(models.Model):
+    """Counter bumped after every import, used to version cached API data (see backend.caching)"""
+    generation = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
     def __str__(self):
-        return self.title
\ No newline at end of file
+        return f"Import generation {self.generation}"
@@ -1,19 +1,364 @@
-from rest_framework.pagination import PageNumberPagination
+import base64
+import hashlib
+import json
+from collections import OrderedDict
+from django.core.cache import cache
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.core.paginator import EmptyPage, InvalidPage, Page, PageNotAnInteger, Paginator
+from django.db import connections
+from django.db.models import Q
+from django.utils.functional import cached_property
+from django.utils.translation import gettext_lazy as _
+from rest_framework import pagination
+from rest_framework.exceptions import NotFound, ValidationError
 from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+from .caching import import_generation
 import math
 
+COUNT_EXACT = 'exact'
+COUNT_ESTIMATE = 'estimate'
+COUNT_NONE = 'none'
+
+# Unfiltered lists of tables with fewer rows than this are counted exactly
+# by default; counting them costs less than an estimate is worth
+ESTIMATE_MIN_ROWS = 10000
+
+# How long an exact count is cached; a new import generation replaces it sooner
+COUNT_TIMEOUT = 24 * 60 * 60
+
+
+def is_unfiltered(queryset):
+    """Whether queryset has every row of its table (no WHERE and no DISTINCT)"""
+    return not queryset.query.where and not queryset.query.distinct
+
+
+def exact_count(queryset):
+    """COUNT(*) of queryset, cached by its SQL for the current import generation"""
+    sql, params = queryset.order_by().query.sql_with_params()
+    digest = hashlib.sha1(repr((sql, params)).encode()).hexdigest()
+    key = f'count:{import_generation()}:{digest}'
+    count = cache.get(key)
+    if count is None:
+        count = queryset.count()
+        cache.set(key, count, COUNT_TIMEOUT)
+    return count
+
+
+def table_estimate(queryset):
+    """
+    Rows in the table of queryset as the planner estimates them, from
+    pg_class.reltuples scaled to the table's current size, or None if the
+    table was never analyzed.
+    """
+    with connections[queryset.db].cursor() as cursor:
+        cursor.execute(
+            "SELECT CASE WHEN relpages > 0 AND reltuples >= 0 "
+            "THEN reltuples / relpages * (pg_relation_size(oid) / current_setting('block_size')::int) END "
+            "FROM pg_class WHERE oid = %s::regclass",
+            [queryset.model._meta.db_table],
+        )
+        row = cursor.fetchone()
+    return round(row[0]) if row and row[0] is not None else None
+
+
+def query_estimate(queryset):
+    """Rows of queryset as the planner estimates them (EXPLAIN, not run)"""
+    sql, params = queryset.order_by().query.sql_with_params()
+    with connections[queryset.db].cursor() as cursor:
+        cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return round(plan[0]['Plan']['Plan Rows'])
+
+
+def count_rows(queryset, strategy=None):
+    """
+    Total for a paginated response with the ?count= strategy:
+
+    - exact: COUNT(*), cached per import generation;
+    - estimate: the planner's estimate, from pg_class for a whole table and
+      from EXPLAIN otherwise;
+    - none: no count (None).
+
+    Without a strategy, whole tables of ESTIMATE_MIN_ROWS rows or more are
+    estimated and everything else is counted exactly.
+    """
+    if strategy == COUNT_NONE:
+        return None
+    if strategy == COUNT_EXACT:
+        return exact_count(queryset)
+
+    unfiltered = is_unfiltered(queryset)
+    if unfiltered:
+        estimate = table_estimate(queryset)
+        if estimate is not None and (strategy == COUNT_ESTIMATE or estimate >= ESTIMATE_MIN_ROWS):
+            return estimate
+    elif strategy == COUNT_ESTIMATE:
+        return query_estimate(queryset)
+    return exact_count(queryset)
+
+
+class CountlessPage(Page):
+    """Page that knows whether a next page exists without knowing the count"""
+
+    def __init__(self, object_list, number, paginator, has_next):
+        super().__init__(object_list, number, paginator)
+        self.next_exists = has_next
+
+    def has_next(self):
+        return self.next_exists
+
+    def next_page_number(self):
+        return self.number + 1
+
+    def previous_page_number(self):
+        return self.paginator.validate_number(self.number - 1)
+
+
+class CountStrategyPaginator(Paginator):
+    """
+    Paginator that reads one row past each page to know whether there is a
+    next one, so that moving between pages never depends on the count: the
+    count is only reported, and may be cached, estimated or None (see
+    count_rows).
+    """
+
+    def __init__(self, object_list, per_page, count_strategy=None):
+        super().__init__(object_list, per_page)
+        self.count_strategy = count_strategy
+
+    @cached_property
+    def count(self):
+        return count_rows(self.object_list, self.count_strategy)
+
+    @cached_property
+    def num_pages(self):
+        if self.count is None:
+            return None
+        return max(1, math.ceil(self.count / self.per_page))
+
+    def validate_number(self, number):
+        try:
+            if isinstance(number, float) and not number.is_integer():
+                raise ValueError
+            number = int(number)
+        except (TypeError, ValueError):
+            raise PageNotAnInteger(_('That page number is not an integer'))
+        if number < 1:
+            raise EmptyPage(_('That page number is less than 1'))
+        return number
+
+    def page(self, number):
+        number = self.validate_number(number)
+        bottom = (number - 1) * self.per_page
+        rows = list(self.object_list[bottom:bottom + self.per_page + 1])
+        if not rows and number > 1:
+            raise EmptyPage(_('That page contains no results'))
+        return CountlessPage(rows[:self.per_page], number, self, has_next=len(rows) > self.per_page)
+
+
+class PageNumberPagination(pagination.PageNumberPagination):
+    """
+    DRF's page numbers, with a count that costs less than COUNT(*) on
+    every page: clients choose it with ?count=exact|estimate|none, see
+    count_rows for the default.
+    """
+    django_paginator_class = CountStrategyPaginator
+    count_query_param = 'count'
+    count_strategies = (COUNT_EXACT, COUNT_ESTIMATE, COUNT_NONE)
+
+    def get_count_strategy(self, request):
+        strategy = request.query_params.get(self.count_query_param)
+        if strategy and strategy not in self.count_strategies:
+            raise ValidationError({self.count_query_param: (
+                f"Must be one of: {', '.join(self.count_strategies)}"
+            )})
+        return strategy or None
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        page_size = self.get_page_size(request)
+        if not page_size:
+            return None
+
+        paginator = self.django_paginator_class(queryset, page_size, self.get_count_strategy(request))
+        page_number = self.get_page_number(request, paginator)
+        try:
+            self.page = paginator.page(page_number)
+        except InvalidPage as exc:
+            msg = self.invalid_page_message.format(page_number=page_number, message=str(exc))
+            raise NotFound(msg)
+
+        if self.template is not None and (paginator.num_pages or 0) > 1:
+            self.display_page_controls = True
+        return list(self.page)
+
+
 class CustomPagination(PageNumberPagination):
     page_size = 10  # Adjust as needed
     page_size_query_param = 'size'  # Allows the client to set page size
     max_page_size = 100  # Prevent excessive results per page
 
     def get_paginated_response(self, data):
-        total_pages = math.ceil(self.page.paginator.count / self.page_size)
-        
+        # num_pages is counted with the page size this request asked for
         return Response({
-            "count": self.page.paginator.count,  # Total items
-            "totalPages": total_pages,  # Total number of pages
+            "count": self.page.paginator.count,  # Total items (None with ?count=none)
+            "totalPages": self.page.paginator.num_pages,  # Total number of pages
             "next": self.get_next_link(),
             "previous": self.get_previous_link(),
             "results": data
         })
+
+
+class PageNumberOrCursorPagination(PageNumberPagination):
+    """
+    Page numbers by default, with the usual count/next/previous/results.
+
+    Clients opt into keyset pagination with ?paginate=cursor, then follow
+    the opaque ?cursor= of the next/previous links. A cursor page costs no
+    COUNT(*) and no OFFSET, so it is as fast deep into the listing as on
+    the first page; its response has only next, previous and results.
+
+    The view sets cursor_ordering, its ordering with a unique field last,
+    e.g. ('-date', '-id'). Cursor pages are only available in that order.
+    """
+    cursor_query_param = 'cursor'
+    mode_query_param = 'paginate'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.cursor_mode = (
+            self.cursor_query_param in request.query_params
+            or request.query_params.get(self.mode_query_param) == 'cursor'
+        )
+        if not self.cursor_mode:
+            return super().paginate_queryset(queryset, request, view)
+        return self.paginate_cursor(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if not self.cursor_mode:
+            return super().get_paginated_response(data)
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ]))
+
+    def get_next_link(self):
+        if not self.cursor_mode:
+            return super().get_next_link()
+        return self.cursor_link(self.next_position, reverse=False)
+
+    def get_previous_link(self):
+        if not self.cursor_mode:
+            return super().get_previous_link()
+        return self.cursor_link(self.previous_position, reverse=True)
+
+    def paginate_cursor(self, queryset, request, view):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.ordering = tuple(getattr(view, 'cursor_ordering', ('-id',)))
+        fields = [field.lstrip('-') for field in self.ordering]
+
+        current = tuple(queryset.query.order_by)
+        if current != self.ordering[:len(current)]:
+            raise ValidationError({self.cursor_query_param: (
+                f"Cursor pagination is only available in the default order ({', '.join(self.ordering)})"
+            )})
+
+        position, reverse = self.decode_cursor(request, queryset.model, fields)
+        ordering = [self.reverse_field(field) for field in self.ordering] if reverse else self.ordering
+        queryset = queryset.order_by(*ordering)
+        if position is not None:
+            queryset = queryset.filter(self.after(queryset.model, ordering, position))
+
+        # One extra row tells whether there is a page beyond this one
+        rows = list(queryset[:self.page_size + 1])
+        has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        if reverse:
+            rows.reverse()
+
+        first = self.position(rows[0], fields) if rows else None
+        last = self.position(rows[-1], fields) if rows else None
+        if reverse:
+            # This page came from the one after it, so there is always a next page
+            self.next_position = last
+            self.previous_position = first if has_more else None
+        else:
+            self.next_position = last if has_more else None
+            self.previous_position = first if position is not None else None
+        return rows
+
+    def cursor_link(self, position, reverse):
+        if position is None:
+            return None
+        url = remove_query_param(self.request.build_absolute_uri(), self.page_query_param)
+        url = remove_query_param(url, self.mode_query_param)
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(position, reverse))
+
+    @staticmethod
+    def reverse_field(field):
+        return field[1:] if field.startswith('-') else f'-{field}'
+
+    @staticmethod
+    def position(row, fields):
+        # Rows are model instances, or dicts from values() (see backend.rows)
+        if isinstance(row, dict):
+            return tuple(row[field] for field in fields)
+        return tuple(getattr(row, field) for field in fields)
+
+    def encode_cursor(self, position, reverse):
+        payload = {'p': [value.isoformat() if hasattr(value, 'isoformat') else value for value in position]}
+        if reverse:
+            payload['r'] = 1
+        return base64.urlsafe_b64encode(json.dumps(payload, separators=(',', ':')).encode()).decode().rstrip('=')
+
+    def decode_cursor(self, request, model, fields):
+        """(position, reverse) of the ?cursor=, or (None, False) on the first page"""
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None, False
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(encoded + '=' * (-len(encoded) % 4)))
+            values = payload['p']
+            if len(values) != len(fields):
+                raise ValueError(encoded)
+            position = tuple(
+                None if value is None else model._meta.get_field(field).to_python(value)
+                for field, value in zip(fields, values)
+            )
+        except (TypeError, ValueError, KeyError, AttributeError, DjangoValidationError):
+            raise NotFound(self.invalid_cursor_message)
+        return position, bool(payload.get('r'))
+
+    @classmethod
+    def after(cls, model, ordering, position):
+        """
+        Q for the rows after position in ordering, with PostgreSQL's NULL
+        placement (first when descending, last when ascending).
+
+        Each field also gets a redundant bound (date <= d AND (...)) so that
+        an index on it is scanned from the cursor instead of from the start.
+        """
+        field, *rest = ordering
+        value, *rest_values = position
+        descending = field.startswith('-')
+        name = field.lstrip('-')
+        beyond = Q(**{f'{name}__lt' if descending else f'{name}__gt': value})
+
+        if not rest:
+            return beyond
+        tie = cls.after(model, rest, rest_values)
+        if value is None:
+            # In the NULLs: first when descending, so everything not null follows
+            nulls = Q(**{f'{name}__isnull': True}) & tie
+            return nulls | Q(**{f'{name}__isnull': False}) if descending else nulls
+
+        bound = Q(**{f'{name}__lte' if descending else f'{name}__gte': value})
+        following = bound & (Q(**{name: value}) & tie | beyond)
+        if not descending and model._meta.get_field(name).null:
+            following |= Q(**{f'{name}__isnull': True})
+        return following
@@ -0,0 +1,114 @@
+import hashlib
+import json
+import re
+from datetime import datetime
+
+# Maximum text lengths
+MAX_TEXT_LENGTH = 5000
+MAX_URL_LENGTH = 2000
+MAX_NAME_LENGTH = 250
+MAX_TITLE_LENGTH = 1000
+
+# Bump when the importer starts reading the dump differently, so that
+# every initiative is re-imported once instead of being skipped as unchanged
+FINGERPRINT_VERSION = 1
+
+
+def parse_date(date_str):
+    """Parse date string to datetime object"""
+    if not date_str:
+        return None
+
+    # Handle various date formats
+    formats = [
+        '%Y-%m-%d',
+        '%Y-%m-%dT%H:%M:%S',
+        '%d-%m-%Y',
+    ]
+
+    for fmt in formats:
+        try:
+            return datetime.strptime(date_str, fmt).date()
+        except (ValueError, TypeError):
+            continue
+
+    # Special case for "0001-01-01T00:00:00"
+    if date_str == "0001-01-01T00:00:00":
+        return None
+
+    return None
+
+
+def truncate_text(text, max_length):
+    """Truncate text to max_length if necessary"""
+    if not text:
+        return ""
+
+    if len(text) <= max_length:
+        return text
+
+    return text[:max_length]
+
+
+def parse_vote_details(details):
+    """
+    Parse HTML-like vote details into a structured format.
+
+    Example input:
+    "A Favor: <I>PSD</I>, <I> PS</I>, <I> CH</I><BR>Contra:<I>PCP</I>"
+
+    Example output:
+    {
+        "a_favor": ["PSD", "PS", "CH"],
+        "contra": ["PCP"],
+        "abstencao": []
+    }
+    """
+    if not details:
+        return {"a_favor": [], "contra": [], "abstencao": []}
+
+    result = {"a_favor": [], "contra": [], "abstencao": []}
+
+    # Split by <BR> to separate different vote types
+    vote_sections = details.split("<BR>")
+
+    for section in vote_sections:
+        # Skip empty sections
+        if not section.strip():
+            continue
+
+        # Extract vote type and parties
+        parts = section.split(":")
+        if len(parts) < 2:
+            continue
+
+        vote_type = parts[0].strip().lower()
+        parties_html = ":".join(parts[1:])  # Rejoin in case there were colons in the party names
+
+        # Map the vote type to our standardized keys
+        if "favor" in vote_type:
+            key = "a_favor"
+        elif "contra" in vote_type:
+            key = "contra"
+        elif "absten" in vote_type:
+            key = "abstencao"
+        else:
+            continue
+
+        # Extract parties from <I> tags
+        parties = re.findall(r'<I>(.*?)<\/I>', parties_html)
+
+        # Clean whitespace and add to result
+        result[key] = [party.strip() for party in parties]
+
+    return result
+
+
+def content_fingerprint(data):
+    """
+    Return a stable hash of a piece of the dump (an initiative or a phase),
+    independent of key order, used to detect whether it changed since the
+    last import.
+    """
+    payload = json.dumps(data, sort_keys=True, ensure_ascii=False, separators=(',', ':'), default=str)
+    return hashlib.sha256(f"{FINGERPRINT_VERSION}:{payload}".encode('utf-8')).hexdigest()
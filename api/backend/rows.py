@@ -0,0 +1,148 @@
+from collections import defaultdict
+from django.core.exceptions import ImproperlyConfigured
+from django.db.models import F
+from rest_framework import serializers
+from rest_framework.response import Response
+
+# Key of the parent's primary key in the rows of a nested relation
+PARENT_KEY = 'rows_parent'
+
+COLUMN = 'column'
+ONE = 'one'
+MANY = 'many'
+
+
+def column_converter(field):
+    """
+    Function turning a database value into what field.to_representation
+    returns, or None when that is the value itself.
+    """
+    if isinstance(field, serializers.PrimaryKeyRelatedField):
+        # values() gives the pk DRF reads from a PKOnlyObject
+        return field.pk_field.to_representation if field.pk_field is not None else None
+    if isinstance(field, (serializers.CharField, serializers.IntegerField, serializers.BooleanField)):
+        return None
+    if isinstance(field, serializers.JSONField) and not field.binary:
+        return None
+    return field.to_representation
+
+
+class RowSerializer:
+    """
+    The output of a ModelSerializer, built from .values() rows instead of
+    model instances: serialize(rows) is byte-for-byte what the serializer
+    renders for the same rows, at a fraction of the CPU cost.
+
+    Build it from the serializer with the fields the response has (e.g.
+    after backend.fieldsets.apply_selection). It supports model columns,
+    primary key relations and nested ModelSerializers:
+
+    - a nested object (a forward foreign key) is read with the row, through
+      a join;
+    - a nested list is read in one query per relation for all the rows,
+      in primary key order, like the prefetches of related_lookups.
+    """
+
+    def __init__(self, serializer):
+        if isinstance(serializer, serializers.ListSerializer):
+            serializer = serializer.child
+        self.model = serializer.Meta.model
+        self.fields = []
+        for name, field in serializer.fields.items():
+            if field.write_only:
+                continue
+            if field.source == '*' or '.' in field.source:
+                raise ImproperlyConfigured(f"{name}: RowSerializer only reads model fields")
+            if isinstance(field, serializers.ListSerializer):
+                self.fields.append((MANY, name, self.parent_query_name(field.source), RowSerializer(field)))
+            elif isinstance(field, serializers.ModelSerializer):
+                self.fields.append((ONE, name, field.source, RowSerializer(field)))
+            elif isinstance(field, (serializers.ManyRelatedField, serializers.SerializerMethodField)) or (
+                isinstance(field, serializers.RelatedField) and not isinstance(field, serializers.PrimaryKeyRelatedField)
+            ):
+                raise ImproperlyConfigured(f"{name}: RowSerializer can't serialize {type(field).__name__}")
+            else:
+                self.fields.append((COLUMN, name, field.source, column_converter(field)))
+
+    @property
+    def field_names(self):
+        return [name for kind, name, source, nested in self.fields]
+
+    def parent_query_name(self, name):
+        """The lookup from the rows of the relation name back to this model"""
+        relation = self.model._meta.get_field(name)
+        if relation.concrete:
+            # A many-to-many field of this model
+            return relation.related_query_name()
+        return relation.field.name
+
+    def lookups(self, prefix=''):
+        """The values() lookups serialize needs"""
+        lookups = [f'{prefix}pk']
+        for kind, name, source, nested in self.fields:
+            if kind == COLUMN:
+                lookups.append(f'{prefix}{source}')
+            elif kind == ONE:
+                lookups += nested.lookups(f'{prefix}{source}__')
+        return lookups
+
+    def serialize(self, rows, prefix=''):
+        """The serialized data of rows, dicts from values(*self.lookups(prefix))"""
+        nested_data = {}
+        for kind, name, source, nested in self.fields:
+            if kind == ONE:
+                nested_data[name] = nested.serialize(rows, f'{prefix}{source}__')
+            elif kind == MANY:
+                nested_data[name] = nested.related(rows, prefix, source)
+
+        data = []
+        for index, row in enumerate(rows):
+            item = {}
+            for kind, name, source, nested in self.fields:
+                if kind == COLUMN:
+                    value = row[f'{prefix}{source}']
+                    item[name] = nested(value) if nested is not None and value is not None else value
+                elif kind == ONE:
+                    # A null foreign key leaves every column of the join null
+                    item[name] = None if row[f'{prefix}{source}__pk'] is None else nested_data[name][index]
+                else:
+                    item[name] = nested_data[name].get(row[f'{prefix}pk'], [])
+            data.append(item)
+        return data
+
+    def related(self, rows, prefix, query_name):
+        """{parent pk: serialized list} of the rows of this model related to rows"""
+        parents = {row[f'{prefix}pk'] for row in rows} - {None}
+        if not parents:
+            return {}
+        children = list(
+            self.model._default_manager
+            .annotate(**{PARENT_KEY: F(query_name)})
+            .filter(**{f'{PARENT_KEY}__in': parents})
+            .order_by('pk')
+            .values(PARENT_KEY, *self.lookups())
+        )
+        grouped = defaultdict(list)
+        for child, item in zip(children, self.serialize(children)):
+            grouped[child[PARENT_KEY]].append(item)
+        return grouped
+
+
+class RowListMixin:
+    """
+    list() serializing its page with RowSerializer: the page is read with
+    values() and the nested lists with one query each, and no model
+    instance or serializer field is built per row.
+    """
+
+    def list(self, request, *args, **kwargs):
+        rows = RowSerializer(self.get_serializer(many=True))
+        queryset = self.filter_queryset(self.get_queryset())
+        # The cursor of a page is read from its first and last rows
+        cursor_fields = [field.lstrip('-') for field in getattr(self, 'cursor_ordering', ())]
+        queryset = queryset.prefetch_related(None).values(*dict.fromkeys([*rows.lookups(), *cursor_fields]))
+
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(rows.serialize(page))
+        return Response(rows.serialize(list(queryset)))
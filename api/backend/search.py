@@ -0,0 +1,107 @@
+import re
+from django.contrib.postgres.indexes import GinIndex, OpClass
+from django.contrib.postgres.search import SearchQuery, SearchVector, TrigramWordSimilarity
+from django.db import connections
+from django.db.models import F, Func, Q, TextField, Value
+from django.db.models.functions import Greatest, Lower
+
+# Text search configuration: Portuguese stop words and stemming
+SEARCH_CONFIG = 'portuguese'
+
+# Accented letters and their plain counterparts, removed from both the
+# indexed text and the searched words so "habitacao" finds "habitação".
+# Done with translate() instead of the unaccent extension, so it works on
+# servers where extensions can't be installed.
+ACCENTED = 'áàâãäåçéèêëíìîïñóòôõöúùûüýÿÁÀÂÃÄÅÇÉÈÊËÍÌÎÏÑÓÒÔÕÖÚÙÛÜÝ'
+PLAIN = 'aaaaaaceeeeiiiinooooouuuuyyAAAAAACEEEEIIIINOOOOOUUUUY'
+UNACCENT_TABLE = str.maketrans(ACCENTED, PLAIN)
+
+
+class Unaccent(Func):
+    """SQL counterpart of unaccent()"""
+    function = 'translate'
+    output_field = TextField()
+
+    def __init__(self, expression, **extra):
+        super().__init__(expression, Value(ACCENTED), Value(PLAIN), **extra)
+
+
+def unaccent(text):
+    return text.translate(UNACCENT_TABLE)
+
+
+def search_vector():
+    """Expression for ProjetoLei.search_vector: title, then epigraph, then description"""
+    return (
+        SearchVector(Unaccent(F('title')), weight='A', config=SEARCH_CONFIG)
+        + SearchVector(Unaccent(F('epigraph')), weight='B', config=SEARCH_CONFIG)
+        + SearchVector(Unaccent(F('description')), weight='C', config=SEARCH_CONFIG)
+    )
+
+
+def search_query(text):
+    """
+    Query matching documents that contain all the words of text, each as a
+    prefix (so "habita lei" finds "habitação" and "leis"), or None if text
+    has no words.
+    """
+    words = re.findall(r'[^\W_]+', unaccent(text))
+    if not words:
+        return None
+    return SearchQuery(' & '.join(f'{word}:*' for word in words), search_type='raw', config=SEARCH_CONFIG)
+
+
+def plain_lower(field):
+    """Expression for field without accents, in lower case"""
+    return Lower(Unaccent(F(field)))
+
+
+def trigram_index(field, name):
+    """
+    GIN trigram index on plain_lower(field), for match_names. Not declared
+    in Meta.indexes since it needs pg_trgm, see migration 0025.
+    """
+    return GinIndex(OpClass(plain_lower(field), name='gin_trgm_ops'), name=name)
+
+
+# pg_trgm installed, by database name
+_trigram_databases = {}
+
+
+def trigram_available(using='default'):
+    """Whether the pg_trgm extension is installed in the database (checked once per process)"""
+    connection = connections[using]
+    name = connection.settings_dict['NAME']
+    if name not in _trigram_databases:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+            _trigram_databases[name] = cursor.fetchone() is not None
+    return _trigram_databases[name]
+
+
+def match_names(queryset, fields, text):
+    """
+    Rows where one of fields contains text, ignoring case and accents.
+
+    With pg_trgm, rows where one of fields merely resembles text (typos,
+    "mortagua" for "Mortágua") match too, ordered by the best similarity.
+    """
+    plain = unaccent(text).lower().strip()
+    if not plain:
+        return queryset
+
+    aliases = {f'plain_{field}': plain_lower(field) for field in fields}
+    queryset = queryset.alias(**aliases)
+    condition = Q()
+    for alias in aliases:
+        condition |= Q(**{f'{alias}__contains': plain})
+    if not trigram_available(queryset.db):
+        return queryset.filter(condition)
+
+    for alias in aliases:
+        condition |= Q(**{f'{alias}__trigram_word_similar': plain})
+    similarities = [TrigramWordSimilarity(plain, F(alias)) for alias in aliases]
+    similarity = Greatest(*similarities) if len(similarities) > 1 else similarities[0]
+    return queryset.filter(condition).annotate(
+        similarity=similarity
+    ).order_by('-similarity', *queryset.query.order_by)
@@ -1,4 +1,5 @@
 from rest_framework import serializers
+from .fieldsets import selected_data
 from .models import (
     ProjetoLei, Legislature, Phase, Attachment, Author, Vote, 
     Publication, Commission, CommissionDocument, Rapporteur, 
@@ -171,6 +172,18 @@ class PhaseSerializer(serializers.ModelSerializer):
         fields = ['id', 'name', 'date', 'code', 'observation', 'commissions']
 
 
+# Phases and votes ordered by date are prefetched by the viewset into these
+# attributes (see ProjetoLeiViewSet.with_related); without them they are queried
+def phases_by_date(obj):
+    phases = getattr(obj, 'phases_by_date', None)
+    return phases if phases is not None else obj.phases.all().order_by('date')
+
+
+def votes_by_date(obj):
+    votes = getattr(obj, 'votes_by_date', None)
+    return votes if votes is not None else obj.votes.all().order_by('date')
+
+
 # Basic serializer for summary view
 class ProjetoLeiListSerializer(serializers.ModelSerializer):
     legislature = LegislatureSerializer(read_only=True)
@@ -189,6 +202,13 @@ class ProjetoLeiListSerializer(serializers.ModelSerializer):
         }
 
 
+# Kept for the importers, filters and conditional requests, not API data
+PROJETO_INTERNAL_FIELDS = [
+    'search_vector', 'content_hash', 'current_phase', 'current_phase_name',
+    'current_phase_date', 'entry_date', 'updated_at',
+]
+
+
 # Simplified Phase serializer for medium detail views
 class PhaseBasicSerializer(serializers.ModelSerializer):
     class Meta:
@@ -205,7 +225,9 @@ class ProjetoLeiDetailSerializer(serializers.ModelSerializer):
     
     class Meta:
         model = ProjetoLei
-        fields = '__all__'
+        exclude = PROJETO_INTERNAL_FIELDS
+        # Nested by the get_ methods, for ?expand= (see backend.fieldsets)
+        expandable_fields = ['phases', 'votes']
         lookup_field = 'external_id'
         extra_kwargs = {
             'url': {'lookup_field': 'external_id'}
@@ -213,13 +235,11 @@ class ProjetoLeiDetailSerializer(serializers.ModelSerializer):
     
     def get_phases(self, obj):
         # Return a simplified version of phases for this view
-        phases = obj.phases.all().order_by('date')
-        return PhaseBasicSerializer(phases, many=True).data
+        return selected_data(self, 'phases', PhaseBasicSerializer(phases_by_date(obj), many=True))
     
     def get_votes(self, obj):
         # Return chronologically ordered votes
-        votes = obj.votes.all().order_by('date')
-        return VoteSerializer(votes, many=True).data
+        return selected_data(self, 'votes', VoteSerializer(votes_by_date(obj), many=True))
 
 
 # Full serializer for complete details
@@ -233,7 +253,9 @@ class ProjetoLeiFullSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = ProjetoLei
-        fields = '__all__'
+        exclude = PROJETO_INTERNAL_FIELDS
+        # Nested by the get_ methods, for ?expand= (see backend.fieldsets)
+        expandable_fields = ['votes', 'related_initiatives']
         lookup_field = 'external_id'
         extra_kwargs = {
             'url': {'lookup_field': 'external_id'}
@@ -242,9 +264,8 @@ class ProjetoLeiFullSerializer(serializers.ModelSerializer):
     def get_related_initiatives(self, obj):
         # Get related initiatives through the many-to-many relationship
         related = obj.related_to.all()
-        return ProjetoLeiListSerializer(related, many=True).data
+        return selected_data(self, 'related_initiatives', ProjetoLeiListSerializer(related, many=True))
         
     def get_votes(self, obj):
         # Return chronologically ordered votes
-        votes = obj.votes.all().order_by('date')
-        return VoteSerializer(votes, many=True).data
\ No newline at end of file
+        return selected_data(self, 'votes', VoteSerializer(votes_by_date(obj), many=True))
@@ -0,0 +1,224 @@
+import json
+import logging
+import os
+import shutil
+import tempfile
+from itertools import islice
+import pyarrow as pa
+import pyarrow.ipc as ipc
+import pyarrow.parquet as pq
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+from .caching import GENERATION_ID
+from .models import ImportGeneration, ProjetoLei, VotePosition
+
+logger = logging.getLogger(__name__)
+
+FORMATS = {
+    'arrow': ('.arrow', 'application/vnd.apache.arrow.file'),
+    'parquet': ('.parquet', 'application/vnd.apache.parquet'),
+}
+
+# Points at the newest snapshot of SNAPSHOT_DIR, replaced once it is complete
+MANIFEST = 'latest.json'
+
+# Rows read from the server-side cursor, and written as one record batch, at a time
+CHUNK_SIZE = 5000
+
+# Snapshots kept in SNAPSHOT_DIR, the newest first
+KEEP = 3
+
+# Low-cardinality text (parties, types, phase names...) is dictionary encoded
+NAME = pa.dictionary(pa.int32(), pa.string())
+TIMESTAMP = pa.timestamp('us', tz='UTC')
+
+
+def projeto_rows():
+    return ProjetoLei.objects.order_by('id').values_list(
+        'id', 'external_id', 'title', 'type', 'legislature__number', 'date', 'initiative_number',
+        'current_phase_name', 'current_phase_date', 'entry_date', 'updated_at',
+    ).iterator(chunk_size=CHUNK_SIZE)
+
+
+def phase_rows():
+    return ProjetoLei.phases.through.objects.order_by('projetolei_id', 'phase__date', 'phase_id').values_list(
+        'projetolei_id', 'phase_id', 'phase__name', 'phase__date', 'phase__code',
+    ).iterator(chunk_size=CHUNK_SIZE)
+
+
+def vote_rows():
+    rows = ProjetoLei.votes.through.objects.order_by('projetolei_id', 'vote__date', 'vote_id').values_list(
+        'projetolei_id', 'vote_id', 'vote__vote_id', 'vote__date', 'vote__result', 'vote__unanimous',
+        'vote__meeting', 'vote__meeting_type', 'vote__description', 'vote__absences',
+    ).iterator(chunk_size=CHUNK_SIZE)
+    for *row, absences in rows:
+        yield (*row, None if absences is None else json.dumps(absences, ensure_ascii=False))
+
+
+def vote_position_rows():
+    return VotePosition.objects.order_by('vote_id', 'id').values_list(
+        'vote_id', 'party', 'position',
+    ).iterator(chunk_size=CHUNK_SIZE)
+
+
+# name: (schema, rows)
+TABLES = {
+    'projetos': (pa.schema([
+        ('id', pa.int64()), ('external_id', pa.string()), ('title', pa.string()), ('type', NAME),
+        ('legislature', NAME), ('date', pa.date32()), ('initiative_number', pa.string()),
+        ('current_phase_name', NAME), ('current_phase_date', pa.date32()), ('entry_date', pa.date32()),
+        ('updated_at', TIMESTAMP),
+    ]), projeto_rows),
+    # One row per phase of each initiative
+    'phases': (pa.schema([
+        ('projeto_id', pa.int64()), ('phase_id', pa.int64()), ('name', NAME), ('date', pa.date32()), ('code', NAME),
+    ]), phase_rows),
+    # One row per vote on each initiative; absences as JSON text
+    'votes': (pa.schema([
+        ('projeto_id', pa.int64()), ('vote_id', pa.int64()), ('external_id', pa.string()), ('date', pa.date32()),
+        ('result', NAME), ('unanimous', NAME), ('meeting', pa.string()), ('meeting_type', NAME),
+        ('description', pa.string()), ('absences', pa.string()),
+    ]), vote_rows),
+    'vote_positions': (pa.schema([
+        ('vote_id', pa.int64()), ('party', NAME), ('position', NAME),
+    ]), vote_position_rows),
+}
+
+
+def record_batch(schema, rows, dictionaries):
+    """
+    A record batch of rows (tuples in the order of schema). Dictionaries
+    only grow from batch to batch, so each one extends the previous (a
+    delta in the Arrow IPC file).
+    """
+    arrays = []
+    for field, values in zip(schema, zip(*rows)):
+        if pa.types.is_dictionary(field.type):
+            index = dictionaries.setdefault(field.name, {})
+            indices = [None if value is None else index.setdefault(value, len(index)) for value in values]
+            arrays.append(pa.DictionaryArray.from_arrays(
+                pa.array(indices, field.type.index_type), pa.array(list(index), field.type.value_type)
+            ))
+        else:
+            arrays.append(pa.array(values, field.type))
+    return pa.record_batch(arrays, schema=schema)
+
+
+def open_writer(path, schema, file_format):
+    if file_format == 'parquet':
+        return pq.ParquetWriter(path, schema)
+    return ipc.new_file(path, schema, options=ipc.IpcWriteOptions(emit_dictionary_deltas=True))
+
+
+def write_table(path, schema, rows, file_format):
+    """Write rows to path in chunks, so memory doesn't grow with the table; return the row count"""
+    count = 0
+    dictionaries = {}
+    writer = open_writer(path, schema, file_format)
+    try:
+        while chunk := list(islice(rows, CHUNK_SIZE)):
+            writer.write_batch(record_batch(schema, chunk, dictionaries))
+            count += len(chunk)
+    finally:
+        writer.close()
+    return count
+
+
+def write_snapshot(directory=None, file_format='arrow', keep=KEEP):
+    """
+    Write the tables of TABLES to <directory>/generation-<n>/, n being the
+    current import generation, and point <directory>/latest.json at them.
+    Returns the manifest: {generation, created_at, format, tables: {name:
+    {file, rows}}}, files relative to directory.
+
+    Arrow IPC files can be memory-mapped (pyarrow.memory_map); Parquet
+    files are smaller. Every table is read from the same database
+    snapshot. Only the newest keep snapshots are kept.
+    """
+    directory = directory or settings.SNAPSHOT_DIR
+    extension, _ = FORMATS[file_format]
+    os.makedirs(directory, exist_ok=True)
+    staging = tempfile.mkdtemp(prefix='.generation-', dir=directory)
+    # Readable by the consumers, as mkdtemp makes it private
+    os.chmod(staging, 0o755)
+
+    try:
+        tables = {}
+        in_transaction = connection.in_atomic_block
+        with transaction.atomic():
+            if not in_transaction:
+                with connection.cursor() as cursor:
+                    cursor.execute('SET TRANSACTION ISOLATION LEVEL REPEATABLE READ')
+            state = ImportGeneration.objects.filter(id=GENERATION_ID).values_list('generation', flat=True).first() or 0
+            version = f'generation-{state}'
+            for name, (schema, rows) in TABLES.items():
+                tables[name] = {
+                    'file': f'{version}/{name}{extension}',
+                    'rows': write_table(os.path.join(staging, f'{name}{extension}'), schema, rows(), file_format),
+                }
+
+        manifest = {
+            'generation': state,
+            'created_at': timezone.now().isoformat(),
+            'format': file_format,
+            'tables': tables,
+        }
+        with open(os.path.join(staging, 'manifest.json'), 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, indent=2)
+
+        target = os.path.join(directory, version)
+        if os.path.exists(target):
+            # Written again for the same generation: files already opened stay readable
+            replaced = tempfile.mkdtemp(prefix='.replaced-', dir=directory)
+            os.replace(target, os.path.join(replaced, version))
+            shutil.rmtree(replaced)
+        os.replace(staging, target)
+    except BaseException:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+
+    latest = os.path.join(directory, f'.{MANIFEST}')
+    with open(latest, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(latest, os.path.join(directory, MANIFEST))
+
+    prune_snapshots(directory, keep)
+    return manifest
+
+
+def prune_snapshots(directory, keep):
+    versions = sorted(
+        (int(name.split('-', 1)[1]), name) for name in os.listdir(directory)
+        if name.startswith('generation-') and name.split('-', 1)[1].isdigit()
+    )
+    for _, name in versions[:-keep]:
+        shutil.rmtree(os.path.join(directory, name), ignore_errors=True)
+
+
+def latest_snapshot(directory=None):
+    """The manifest of the newest snapshot (see write_snapshot), or None"""
+    directory = directory or settings.SNAPSHOT_DIR
+    if not directory:
+        return None
+    try:
+        with open(os.path.join(directory, MANIFEST), encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def snapshot_after_import():
+    """
+    Write a snapshot after an import when SNAPSHOT_DIR is set. The import
+    is done by then, so an error is logged instead of raised.
+    """
+    if not settings.SNAPSHOT_DIR:
+        return None
+    try:
+        manifest = write_snapshot()
+    except Exception:
+        logger.exception("Error writing the analytics snapshot")
+        return None
+    logger.info(f"Wrote analytics snapshot of import generation {manifest['generation']}")
+    return manifest
@@ -1,3 +1,1296 @@
-from django.test import TestCase
+import copy
+import csv
+import functools
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+import zlib
+from datetime import date, datetime, timezone
+from unittest import mock
 
-# Create your tests here.
+import pyarrow as pa
+import pyarrow.ipc as ipc
+import pyarrow.parquet as pq
+
+from django.apps import apps
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import DatabaseError, IntegrityError, connection, transaction
+from django.db.models import Count
+from django.db.migrations.executor import MigrationExecutor
+from django.test import SimpleTestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory, APITestCase
+
+from .bulk_import import BulkImporter
+from .caching import acquire, bump_import_generation, get_or_refresh, import_generation, release
+from .dashboard import STATISTICS_ID, get_statistics, refresh_statistics
+from .json_stream import iter_json_array
+from .management.commands.benchmark import synthetic_initiative
+from .management.commands.import_parlamento_data import Command as ImportCommand, skip_to_initiative
+from .fieldsets import FieldSelection, apply_selection, related_lookups
+from .filters import AuthorFilter, ProjetoLeiFilter
+from .import_cache import ImportCache, fetch_legislatures
+from .models import (
+    Author, Commission, CommissionDocument, CommissionVote, DashboardStatistics, Legislature,
+    Phase, ProjetoLei, Publication, Vote, VotePosition,
+)
+from .pagination import CustomPagination, PageNumberOrCursorPagination
+from .rows import RowSerializer
+from .search import _trigram_databases, match_names, trigram_available
+from .snapshots import latest_snapshot, write_snapshot
+from .serializers import PhaseBasicSerializer, PhaseSerializer, ProjetoLeiListSerializer, VoteSerializer
+from .views import PHASE_RELATIONS, VOTE_RELATIONS, with_list_relations
+
+
+def create_projetos(count, start=0):
+    """Create initiatives with authors, phases, commissions and their documents and votes"""
+    legislature, _ = Legislature.objects.get_or_create(number='XVI')
+    party, _ = Author.objects.get_or_create(name='PS', party='PS', author_type='Grupo')
+    projetos = []
+    for index in range(start, start + count):
+        projeto = ProjetoLei.objects.create(
+            title=f"Iniciativa {index}",
+            type='Projeto de Lei',
+            legislature=legislature,
+            date=date(2024, 4, 1),
+            external_id=str(100000 + index),
+            initiative_number=str(index),
+        )
+        deputy = Author.objects.create(name=f"Deputado {index}", party='PS', author_type='Deputado')
+        projeto.authors.add(party, deputy)
+        for phase_index, name in enumerate(['Entrada', 'Admissão']):
+            phase = Phase.objects.create(
+                name=name,
+                date=date(2024, 4, 1 + phase_index),
+                evt_id=f"{index}-{phase_index}",
+                oev_id=f"{index}-{phase_index}",
+            )
+            commission = Commission.objects.create(name='Comissão de Saúde', id_commission='1', phase=phase)
+            CommissionDocument.objects.create(title='Parecer', commission=commission)
+            CommissionVote.objects.create(result='Aprovado', commission=commission)
+            projeto.phases.add(phase)
+        projetos.append(projeto)
+    return projetos
+
+
+def add_votes(projeto, count, start=0):
+    """Give an initiative plenary votes, each with a publication"""
+    for index in range(start, start + count):
+        vote = Vote.objects.create(date=date(2024, 5, 1 + index), result='Aprovado', vote_id=f"{projeto.external_id}-{index}")
+        Publication.objects.create(vote=vote, date=vote.date, url=f"https://example.org/dar/{vote.vote_id}")
+        projeto.votes.add(vote)
+
+
+class ProjetoLeiQueryCountTests(APITestCase):
+    def setUp(self):
+        user = get_user_model().objects.create_user('reader', password='reader')
+        self.client.force_authenticate(user)
+
+    def count_queries(self, url):
+        # Nothing cached from an earlier request, such as the list count
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries), response
+
+    def test_list_query_count_does_not_grow_with_page(self):
+        create_projetos(1)
+        small, response = self.count_queries('/projetoslei/')
+        self.assertEqual(len(response.data['results']), 1)
+
+        create_projetos(9, start=1)
+        full, response = self.count_queries('/projetoslei/')
+        self.assertEqual(len(response.data['results']), 10)
+
+        # table estimate, import generation and count, page, authors, phases,
+        # commissions, documents, commission votes
+        self.assertEqual(small, 9)
+        self.assertEqual(full, small)
+
+    def test_list_serializes_prefetched_relations(self):
+        create_projetos(2)
+        _, response = self.count_queries('/projetoslei/')
+        projeto = response.data['results'][0]
+        self.assertEqual(projeto['legislature']['number'], 'XVI')
+        self.assertEqual(len(projeto['authors']), 2)
+        self.assertEqual(len(projeto['phases']), 2)
+        commission = projeto['phases'][0]['commissions'][0]
+        self.assertEqual(len(commission['documents']), 1)
+        self.assertEqual(len(commission['votes']), 1)
+
+    def test_sparse_fields_skip_unselected_relations(self):
+        create_projetos(3)
+        queries, response = self.count_queries('/projetoslei/?fields=external_id,title,authors.name')
+        projeto = response.data['results'][0]
+        self.assertEqual(list(projeto), ['external_id', 'title', 'authors'])
+        self.assertEqual(list(projeto['authors'][0]), ['name'])
+        # table estimate, import generation and count, page, authors
+        self.assertEqual(queries, 5)
+
+        queries, response = self.count_queries('/projetoslei/?expand=phases')
+        self.assertNotIn('authors', response.data['results'][0])
+        self.assertNotIn('commissions', response.data['results'][0]['phases'][0])
+        self.assertEqual(queries, 5)
+
+    def test_retrieve_query_count_does_not_grow_with_relations(self):
+        projeto, = create_projetos(1)
+        add_votes(projeto, 1)
+        small, _ = self.count_queries(f'/projetoslei/{projeto.external_id}/')
+
+        for phase_index in range(5):
+            projeto.phases.add(Phase.objects.create(name='Anúncio', date=date(2024, 3, 20 + phase_index)))
+        add_votes(projeto, 5, start=1)
+        full, response = self.count_queries(f'/projetoslei/{projeto.external_id}/')
+
+        # updated_at for the ETag, projeto, authors, phases, votes, vote
+        # publications, and the attachment and related initiative ids
+        self.assertEqual(small, 8)
+        self.assertEqual(full, small)
+        phase_dates = [phase['date'] for phase in response.data['phases']]
+        self.assertEqual(phase_dates, sorted(phase_dates))
+        self.assertEqual(len(response.data['votes']), 6)
+        self.assertEqual(len(response.data['votes'][0]['publications']), 1)
+
+    def test_detail_responses_leave_out_internal_fields(self):
+        projeto, = create_projetos(1)
+        ProjetoLei.objects.all().update_phase_fields()
+        fields = [
+            'id', 'legislature', 'authors', 'phases', 'votes', 'title', 'type', 'date', 'link',
+            'description', 'external_id', 'publication_url', 'publication_date', 'initiative_id',
+            'initiative_legislature', 'initiative_number', 'initiative_type_code', 'initiative_selection',
+            'substitute_text', 'substitute_text_field', 'observation', 'epigraph', 'text_link',
+            'european_initiatives', 'origin_initiatives', 'originated_initiatives',
+            'attachments', 'related_initiatives',
+        ]
+        _, response = self.count_queries(f'/projetoslei/{projeto.external_id}/')
+        self.assertEqual(sorted(response.data), sorted(fields))
+        _, response = self.count_queries(f'/projetoslei/{projeto.external_id}/full_details/')
+        self.assertEqual(sorted(response.data), sorted(fields))
+
+    def test_full_details_query_count_does_not_grow_with_relations(self):
+        projeto, related = create_projetos(2)
+        add_votes(projeto, 1)
+        related.related_initiatives.add(projeto)
+        url = f'/projetoslei/{projeto.external_id}/full_details/'
+        small, _ = self.count_queries(url)
+
+        for other in create_projetos(4, start=2):
+            other.related_initiatives.add(projeto)
+        add_votes(projeto, 5, start=1)
+        full, response = self.count_queries(url)
+
+        self.assertEqual(full, small)
+        vote_dates = [vote['date'] for vote in response.data['votes']]
+        self.assertEqual(vote_dates, sorted(vote_dates))
+        self.assertEqual(len(response.data['related_initiatives']), 5)
+        self.assertEqual(len(response.data['related_initiatives'][0]['phases']), 2)
+
+
+class PaginationCountTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        user = get_user_model().objects.create_user('reader', password='reader')
+        self.client.force_authenticate(user)
+
+    def test_exact_count_is_cached_until_next_import(self):
+        create_projetos(2)
+        self.assertEqual(self.client.get('/projetoslei/?count=exact').data['count'], 2)
+
+        create_projetos(1, start=2)
+        response = self.client.get('/projetoslei/?count=exact')
+        self.assertEqual(response.data['count'], 2)
+        self.assertEqual(len(response.data['results']), 3)
+
+        bump_import_generation()
+        self.assertEqual(self.client.get('/projetoslei/?count=exact').data['count'], 3)
+
+    def test_pages_do_not_depend_on_count(self):
+        create_projetos(11)
+        response = self.client.get('/projetoslei/?count=none')
+        self.assertIsNone(response.data['count'])
+        self.assertIsNotNone(response.data['next'])
+
+        response = self.client.get('/projetoslei/?count=none&page=2')
+        self.assertEqual(len(response.data['results']), 1)
+        self.assertIsNone(response.data['next'])
+        self.assertEqual(self.client.get('/projetoslei/?count=none&page=3').status_code, 404)
+        self.assertEqual(self.client.get('/projetoslei/?count=all').status_code, 400)
+
+    def test_total_pages_uses_requested_page_size(self):
+        create_projetos(5)
+        pagination = CustomPagination()
+        request = Request(APIRequestFactory().get('/projetoslei/', {'size': 2}, SERVER_NAME='localhost'))
+        pagination.paginate_queryset(ProjetoLei.objects.order_by('id'), request)
+        response = pagination.get_paginated_response([])
+        self.assertEqual(response.data['count'], 5)
+        self.assertEqual(response.data['totalPages'], 3)
+
+
+class CursorPaginationTests(APITestCase):
+    def setUp(self):
+        user = get_user_model().objects.create_user('reader', password='reader')
+        self.client.force_authenticate(user)
+        # NULL and repeated dates, in no particular order of id
+        dates = [None, date(2024, 4, 1), date(2024, 4, 2), None, date(2024, 4, 1)]
+        for index in range(25):
+            Phase.objects.create(name=f"Fase {index}", date=dates[index * 3 % len(dates)])
+
+    def test_after_follows_postgresql_null_order(self):
+        for ordering in (('-date', '-id'), ('date', 'id'), ('-date', 'id'), ('date', '-id')):
+            rows = list(Phase.objects.order_by(*ordering).values_list('date', 'id'))
+            for index, position in enumerate(rows):
+                after = PageNumberOrCursorPagination.after(Phase, ordering, position)
+                following = Phase.objects.filter(after).order_by(*ordering).values_list('date', 'id')
+                self.assertEqual(list(following), rows[index + 1:], (ordering, position))
+
+    def test_pages_cover_every_row_once_both_ways(self):
+        expected = list(Phase.objects.order_by('-date', '-id').values_list('id', flat=True))
+        self.assertIsNone(Phase.objects.get(pk=expected[0]).date)
+
+        pages = []
+        response = self.client.get('/phases/?paginate=cursor')
+        while True:
+            pages.append([phase['id'] for phase in response.data['results']])
+            if not response.data['next']:
+                break
+            response = self.client.get(response.data['next'])
+        self.assertEqual([len(page) for page in pages], [10, 10, 5])
+        self.assertEqual(sum(pages, []), expected)
+
+        while response.data['previous']:
+            response = self.client.get(response.data['previous'])
+            self.assertEqual([phase['id'] for phase in response.data['results']], pages.pop(-2))
+        self.assertEqual(len(pages), 1)
+
+
+class SearchTests(APITestCase):
+    def setUp(self):
+        user = get_user_model().objects.create_user('reader', password='reader')
+        self.client.force_authenticate(user)
+        legislature = Legislature.objects.create(number='XVI')
+        texts = [
+            ('Habitação condigna', 'Acesso a casa própria', ''),
+            ('Alteração ao código da estrada', 'Programa de habitação a custos controlados', ''),
+            ('Lei das finanças locais', '', ''),
+            ('Regime das rendas', '', 'Alarga o apoio à habitação jovem'),
+        ]
+        # Newest first unless ranked, so the ranking is what puts the title first
+        for index, (title, epigraph, description) in enumerate(texts):
+            ProjetoLei.objects.create(
+                title=title, epigraph=epigraph, description=description, type='Projeto de Lei',
+                legislature=legislature, date=date(2024, 4, 1 + index),
+                external_id=str(100000 + index), initiative_number=str(index),
+            )
+        ProjetoLei.objects.all().update_search_vector()
+
+    def search(self, text):
+        response = self.client.get('/projetoslei/', {'search': text})
+        self.assertEqual(response.status_code, 200)
+        return [projeto['external_id'] for projeto in response.data['results']]
+
+    def test_title_ranks_above_epigraph_above_description(self):
+        self.assertEqual(self.search('habitação'), ['100000', '100001', '100003'])
+
+    def test_accents_and_word_prefixes(self):
+        self.assertEqual(self.search('HABITACAO'), self.search('habitação'))
+        self.assertEqual(self.search('habita'), self.search('habitação'))
+        self.assertEqual(self.search('financas loca'), ['100002'])
+        self.assertEqual(self.search('habitação rendas'), ['100003'])
+
+    def test_external_id_matches_exactly(self):
+        self.assertEqual(self.search('100002'), ['100002'])
+        self.assertEqual(self.search('10000'), [])
+        self.assertEqual(len(self.search('!?')), 4)
+
+
+class NameSearchTests(APITestCase):
+    def setUp(self):
+        user = get_user_model().objects.create_user('reader', password='reader')
+        self.client.force_authenticate(user)
+        legislature = Legislature.objects.create(number='XVI')
+        authors = [
+            ('António Costa', 'PS', 'Deputado'),
+            ('Joana Mortágua', 'BE', 'Deputado'),
+            ('Paula Santos', 'PCP', 'Deputado'),
+            ('PCP', 'PCP', 'Grupo'),
+            ('PSD', 'PSD', 'Grupo'),
+        ]
+        for index, (name, party, author_type) in enumerate(authors):
+            projeto = ProjetoLei.objects.create(
+                title=f"Iniciativa {index}", type='Projeto de Lei', legislature=legislature,
+                external_id=str(100000 + index), initiative_number=str(index),
+            )
+            projeto.authors.add(Author.objects.create(name=name, party=party, author_type=author_type))
+
+    def search(self, text):
+        response = self.client.get('/authors/', {'search': text})
+        self.assertEqual(response.status_code, 200)
+        return sorted(author['name'] for author in response.data['results'])
+
+    def authored(self, author_name):
+        projetos = ProjetoLeiFilter({'author_name': author_name}, queryset=ProjetoLei.objects.all()).qs
+        return sorted(projetos.values_list('external_id', flat=True))
+
+    def assert_accents_and_case_are_ignored(self):
+        self.assertEqual(self.search('Antonio'), ['António Costa'])
+        self.assertEqual(self.search('MORTAGUA'), ['Joana Mortágua'])
+        self.assertEqual(self.search('antónio costa'), ['António Costa'])
+        self.assertEqual(list(AuthorFilter({'name_contains': 'antonio'}).qs.values_list('name', flat=True)), ['António Costa'])
+        self.assertEqual(self.authored('Antonio'), ['100000'])
+
+    def assert_party_abbreviations_match(self):
+        # ?search= looks at the party too; author_name only at names, as party groups are named after it
+        self.assertEqual(self.search('PCP'), ['PCP', 'Paula Santos'])
+        self.assertEqual(self.search('pcp'), ['PCP', 'Paula Santos'])
+        self.assertEqual(self.search('PSD'), ['PSD'])
+        self.assertEqual(self.authored('PCP'), ['100003'])
+        self.assertEqual(self.authored('psd'), ['100004'])
+
+    def test_accents_and_case_are_ignored(self):
+        self.assert_accents_and_case_are_ignored()
+
+    def test_party_abbreviations_match(self):
+        self.assert_party_abbreviations_match()
+
+    @mock.patch('backend.search.trigram_available', return_value=False)
+    def test_without_pg_trgm(self, trigram_available):
+        self.assert_accents_and_case_are_ignored()
+        self.assert_party_abbreviations_match()
+        # Substrings only: no typos, and in the queryset's order
+        self.assertEqual(self.search('Mortagau'), [])
+        self.assertNotIn('similarity', str(match_names(Author.objects.all(), ['name'], 'antonio').query))
+        self.assertTrue(trigram_available.called)
+
+    def test_typos_with_pg_trgm(self):
+        if not trigram_available():
+            self.skipTest('pg_trgm is not installed')
+        self.assertIn('Joana Mortágua', self.search('Mortagau'))
+        response = self.client.get('/authors/', {'search': 'Antnio Costa'})
+        self.assertEqual(response.data['results'][0]['name'], 'António Costa')
+
+    def test_pg_trgm_is_looked_up_once(self):
+        _trigram_databases.clear()
+        with CaptureQueriesContext(connection) as queries:
+            available = trigram_available()
+            self.assertEqual(trigram_available(), available)
+        self.assertEqual(len(queries), 1)
+
+
+class PhaseFieldsTests(APITestCase):
+    def setUp(self):
+        user = get_user_model().objects.create_user('reader', password='reader')
+        self.client.force_authenticate(user)
+
+    def filtered(self, **params):
+        response = self.client.get('/projetoslei/', {**params, 'size': 100})
+        self.assertEqual(response.status_code, 200)
+        return sorted(projeto['external_id'] for projeto in response.data['results'])
+
+    def assert_phase_filter_matches_latest_phase(self):
+        latest = {}
+        for projeto in ProjetoLei.objects.prefetch_related('phases'):
+            phase = max(projeto.phases.all(), key=lambda phase: (phase.date is not None, phase.date or date.min, phase.id))
+            latest[projeto.external_id] = phase.name
+        self.assertEqual(dict(ProjetoLei.objects.values_list('external_id', 'current_phase_name')), latest)
+        for name in set(latest.values()):
+            self.assertEqual(self.filtered(phase=name), sorted(key for key, value in latest.items() if value == name))
+
+    def test_phase_filter_after_import(self):
+        rng = random.Random(7)
+        dump = [synthetic_initiative(index, rng) for index in range(20)]
+        # The first phase in the dump is imported first, so has the lowest id
+        dump[0]['IniEventos'][0]['DataFase'] = '2030-01-01'
+        dump[1]['IniEventos'][0]['DataFase'] = dump[1]['IniEventos'][-1]['DataFase']
+        dump[2]['IniEventos'][-1]['DataFase'] = None
+        ImportCommand().import_initiatives(dump, batch_size=5)
+
+        self.assertEqual(ProjetoLei.objects.get(external_id=dump[0]['IniId']).current_phase_name, dump[0]['IniEventos'][0]['Fase'])
+        self.assertEqual(ProjetoLei.objects.get(external_id=dump[1]['IniId']).current_phase_name, dump[1]['IniEventos'][-1]['Fase'])
+        self.assert_phase_filter_matches_latest_phase()
+
+    def test_phase_filter_after_update_phase_fields(self):
+        older, tied, plain = create_projetos(3)
+        # A later phase with an earlier date, and one on the date of the latest
+        older.phases.add(Phase.objects.create(name='Baixa comissão', date=date(2024, 3, 20)))
+        tied.phases.add(Phase.objects.create(name='Votação na generalidade', date=date(2024, 4, 2)))
+        ProjetoLei.objects.all().update_phase_fields()
+
+        self.assertEqual(self.filtered(phase='Admissão'), [older.external_id, plain.external_id])
+        self.assertEqual(self.filtered(phase='Votação na generalidade'), [tied.external_id])
+        self.assertEqual(self.filtered(phase='Baixa comissão'), [])
+        self.assert_phase_filter_matches_latest_phase()
+
+    def test_phase_filter_after_backfill(self):
+        projetos = create_projetos(5)
+        projetos[1].phases.add(Phase.objects.create(name='Baixa comissão', date=date(2024, 3, 20)))
+        projetos[3].phases.add(Phase.objects.create(name='Votação na generalidade', date=date(2024, 4, 2)))
+        self.assertEqual(self.filtered(phase='Admissão'), [])
+
+        call_command('backfill_phase_fields', batch_size=2)
+        self.assertEqual(len(self.filtered(phase='Admissão')), 4)
+        self.assert_phase_filter_matches_latest_phase()
+
+    def assert_entry_date_is_earliest_entrada(self):
+        entries = {}
+        for projeto in ProjetoLei.objects.prefetch_related('phases'):
+            dates = [phase.date for phase in projeto.phases.all() if phase.name == 'Entrada' and phase.date]
+            entries[projeto.external_id] = min(dates, default=None)
+        self.assertEqual(dict(ProjetoLei.objects.values_list('external_id', 'entry_date')), entries)
+
+    def test_entry_date_after_import(self):
+        rng = random.Random(7)
+        dump = [synthetic_initiative(index, rng) for index in range(10)]
+        # No "Entrada" phase, and a second, earlier one
+        dump[0]['IniEventos'][0]['Fase'] = 'Anúncio'
+        dump[1]['IniEventos'][2].update(Fase='Entrada', DataFase='2020-01-01')
+        ImportCommand().import_initiatives(dump, batch_size=5)
+
+        self.assertIsNone(ProjetoLei.objects.get(external_id=dump[0]['IniId']).entry_date)
+        self.assertEqual(ProjetoLei.objects.get(external_id=dump[1]['IniId']).entry_date, date(2020, 1, 1))
+        self.assert_entry_date_is_earliest_entrada()
+
+    def test_date_filters_on_entry_date(self):
+        earlier, without_entry, plain = create_projetos(3)
+        earlier.phases.add(Phase.objects.create(name='Entrada', date=date(2024, 3, 15)))
+        without_entry.phases.remove(*without_entry.phases.filter(name='Entrada'))
+        call_command('backfill_phase_fields')
+        self.assertEqual(without_entry.phases.count(), 1)
+        self.assert_entry_date_is_earliest_entrada()
+
+        everything = sorted(projeto.external_id for projeto in (earlier, without_entry, plain))
+        self.assertEqual(self.filtered(), everything)
+        self.assertEqual(self.filtered(start_date='01-04-2024'), [plain.external_id])
+        self.assertEqual(self.filtered(end_date='31-03-2024'), [earlier.external_id])
+        self.assertEqual(self.filtered(start_date='15-03-2024', end_date='01-04-2024'), [earlier.external_id, plain.external_id])
+        self.assertEqual(self.filtered(start_date='02-04-2024'), [])
+        # Not a date: ignored
+        self.assertEqual(self.filtered(start_date='2024-04-01'), everything)
+
+
+class AuthorQueryCountTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        user = get_user_model().objects.create_user('reader', password='reader')
+        self.client.force_authenticate(user)
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries), response
+
+    def test_party_groups_is_one_query_cached_until_next_import(self):
+        first = Author.objects.create(name='PSD', party='PSD', author_type='Grupo')
+        Author.objects.create(name='PSD', party=None, author_type='Grupo')
+        Author.objects.create(name='CH', party='CH', author_type='Grupo')
+        Author.objects.create(name='Deputado', party='PSD', author_type='Deputado')
+
+        # import generation, parties
+        queries, response = self.count_queries('/authors/party_groups/')
+        self.assertEqual(queries, 2)
+        self.assertEqual([party['name'] for party in response.data], ['CH', 'PSD'])
+        self.assertEqual(response.data[1]['id'], first.id)
+
+        Author.objects.create(name='BE', party='BE', author_type='Grupo')
+        queries, response = self.count_queries('/authors/party_groups/')
+        self.assertEqual(queries, 0)
+        self.assertEqual(len(response.data), 2)
+
+        bump_import_generation()
+        self.assertEqual([party['name'] for party in self.client.get('/authors/party_groups/').data], ['BE', 'CH', 'PSD'])
+
+    def test_initiatives_query_count_does_not_grow_with_page(self):
+        create_projetos(1)
+        party = Author.objects.get(name='PS', author_type='Grupo')
+        url = f'/authors/{party.pk}/initiatives/'
+        small, response = self.count_queries(url)
+        self.assertEqual(response.data['count'], 1)
+
+        create_projetos(11, start=1)
+        # Nor the count of the first request
+        cache.clear()
+        full, response = self.count_queries(url)
+        self.assertEqual(len(response.data['results']), 10)
+        self.assertEqual(len(response.data['results'][0]['phases'][0]['commissions'][0]['documents']), 1)
+
+        # import generation, author, count, page, authors, phases,
+        # commissions, documents, commission votes
+        self.assertEqual(small, 9)
+        self.assertEqual(full, small)
+
+    def test_initiatives_cursor_pages(self):
+        create_projetos(12)
+        party = Author.objects.get(name='PS', author_type='Grupo')
+        queries, response = self.count_queries(f'/authors/{party.pk}/initiatives/?paginate=cursor')
+        # The same queries, without the count
+        self.assertEqual(queries, 8)
+        self.assertNotIn('count', response.data)
+        external_ids = [projeto['external_id'] for projeto in response.data['results']]
+
+        response = self.client.get(response.data['next'])
+        external_ids += [projeto['external_id'] for projeto in response.data['results']]
+        self.assertIsNone(response.data['next'])
+        self.assertEqual(external_ids, sorted((str(100000 + index) for index in range(12)), reverse=True))
+
+
+class AuthorConstraintTests(APITestCase):
+    def test_authors_without_party_are_unique(self):
+        Author.objects.create(name='Governo', party=None, author_type='Outro')
+        # The importers create authors with ON CONFLICT DO NOTHING
+        Author.objects.bulk_create([Author(name='Governo', party=None, author_type='Outro')], ignore_conflicts=True)
+        self.assertEqual(Author.objects.filter(name='Governo').count(), 1)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Author.objects.create(name='Governo', party=None, author_type='Outro')
+        Author.objects.create(name='Governo', party='', author_type='Outro')
+        Author.objects.create(name='Governo', party=None, author_type='Grupo')
+
+
+class GetOrRefreshTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.computed = []
+
+    def compute(self, blocker=None):
+        if blocker:
+            blocker.wait(5)
+        self.computed.append(len(self.computed) + 1)
+        return self.computed[-1]
+
+    def wait_for(self, condition):
+        for _ in range(100):
+            if condition():
+                return
+            time.sleep(0.05)
+        self.fail('Timed out')
+
+    def test_stale_entry_is_served_while_one_request_refreshes_it(self):
+        # Stale as soon as it is stored
+        self.assertEqual(get_or_refresh('counter', self.compute, fresh_for=0), 1)
+
+        blocker = threading.Event()
+        slow = functools.partial(self.compute, blocker)
+        # Both return the stale value; only the first starts a refresh
+        self.assertEqual(get_or_refresh('counter', slow, fresh_for=60), 1)
+        self.assertEqual(get_or_refresh('counter', slow, fresh_for=60), 1)
+        blocker.set()
+        self.wait_for(lambda: get_or_refresh('counter', self.compute, fresh_for=60) == 2)
+        self.assertEqual(self.computed, [1, 2])
+
+    def test_new_generation_serves_previous_value_while_computing(self):
+        get_or_refresh('counter', self.compute, fresh_for=60)
+        bump_import_generation()
+        # Another request is computing the value of the new generation
+        key = f'counter:{import_generation()}'
+        self.assertTrue(acquire(key))
+        self.assertEqual(get_or_refresh('counter', self.compute, fresh_for=60), 1)
+        self.assertEqual(self.computed, [1])
+
+        release(key)
+        self.assertEqual(get_or_refresh('counter', self.compute, fresh_for=60), 2)
+
+    def test_waits_for_first_value_then_computes_it(self):
+        self.assertTrue(acquire(f'counter:{import_generation()}'))
+        with mock.patch('backend.caching.WAIT_TIMEOUT', 0.2):
+            self.assertEqual(get_or_refresh('counter', self.compute, fresh_for=60), 1)
+
+    def test_failed_background_refresh_releases_the_lock_and_closes_connections(self):
+        get_or_refresh('counter', self.compute, fresh_for=0)
+        closed = threading.Event()
+
+        def fail():
+            raise DatabaseError('failed')
+
+        with mock.patch('backend.caching.connections.close_all', side_effect=closed.set), \
+                self.assertLogs('backend.caching', 'ERROR'):
+            self.assertEqual(get_or_refresh('counter', fail, fresh_for=60), 1)
+            self.assertTrue(closed.wait(5))
+        self.assertTrue(acquire(f'counter:{import_generation()}'))
+
+
+class DashboardTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.client.force_authenticate(get_user_model().objects.create_user('reader', password='reader'))
+
+    def test_periods_are_relative_to_as_of(self):
+        create_projetos(2)
+        with mock.patch('backend.dashboard.timezone.now', return_value=datetime(2024, 4, 20, tzinfo=timezone.utc)):
+            refresh_statistics()
+        # Served as computed at the last import, whatever the date today
+        stats = self.client.get('/dashboard/').data
+        self.assertEqual(stats['as_of'], '2024-04-20')
+        self.assertEqual(stats['proposals_this_year'], 2)
+
+    def test_statistics_without_as_of_are_computed_again(self):
+        create_projetos(2)
+        # Stored before as_of was added, with a party that happens to be named like it
+        DashboardStatistics.objects.create(id=STATISTICS_ID, stats=json.dumps({
+            'total_proposals': 0, 'proposals_by_party': {'as_of': 0},
+        }))
+        stats = get_statistics()
+        self.assertIn('as_of', stats)
+        self.assertEqual(stats['total_proposals'], 2)
+
+        with mock.patch('backend.dashboard.compute_statistics') as compute_statistics:
+            self.assertEqual(get_statistics(), stats)
+        self.assertFalse(compute_statistics.called)
+
+
+class ConditionalGetTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        user = get_user_model().objects.create_user('reader', password='reader')
+        self.client.force_authenticate(user)
+
+    def revalidate(self, url, response):
+        with CaptureQueriesContext(connection) as queries:
+            revalidated = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        return revalidated, len(queries)
+
+    def test_list_is_not_modified_until_next_import(self):
+        create_projetos(2)
+        response = self.client.get('/projetoslei/')
+        revalidated, queries = self.revalidate('/projetoslei/', response)
+        self.assertEqual(revalidated.status_code, 304)
+        self.assertEqual(queries, 0)
+
+        other_page = self.client.get('/projetoslei/?count=none', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(other_page.status_code, 200)
+
+        bump_import_generation()
+        revalidated, _ = self.revalidate('/projetoslei/', response)
+        self.assertEqual(revalidated.status_code, 200)
+
+    def test_detail_is_not_modified_until_it_changes(self):
+        projeto, related = create_projetos(2)
+        related.related_initiatives.add(projeto)
+        url = f'/projetoslei/{projeto.external_id}/full_details/'
+        response = self.client.get(url)
+        revalidated, queries = self.revalidate(url, response)
+        self.assertEqual(revalidated.status_code, 304)
+        # Only the updated_at of the initiative and the related ones
+        self.assertEqual(queries, 1)
+        self.assertEqual(self.client.get(url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified']).status_code, 304)
+
+        ProjetoLei.objects.filter(pk=related.pk).touch()
+        revalidated, _ = self.revalidate(url, response)
+        self.assertEqual(revalidated.status_code, 200)
+        self.assertNotEqual(revalidated['ETag'], response['ETag'])
+
+
+class ExportTests(APITestCase):
+    def setUp(self):
+        user = get_user_model().objects.create_user('reader', password='reader')
+        self.client.force_authenticate(user)
+
+    def export(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return b''.join(response.streaming_content).decode(), response
+
+    def test_ndjson_lines_are_the_list_items(self):
+        create_projetos(3)
+        content, response = self.export('/projetoslei/export/')
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson; charset=utf-8')
+        listed = self.client.get('/projetoslei/').data['results']
+        self.assertEqual([json.loads(line) for line in content.splitlines()], json.loads(json.dumps(listed)))
+
+    def test_csv_honors_filters_and_fields(self):
+        create_projetos(3)
+        ProjetoLei.objects.filter(external_id='100001').update(type='Proposta de Lei')
+        content, response = self.export('/projetoslei/export/?format=csv&type=Projeto de Lei&fields=external_id,title,authors.name')
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="projetoslei.csv"')
+        header, *rows = csv.reader(content.splitlines())
+        self.assertEqual(header, ['external_id', 'title', 'authors'])
+        self.assertEqual([row[0] for row in rows], ['100002', '100000'])
+        self.assertEqual(json.loads(rows[0][2]), [{'name': 'PS'}, {'name': 'Deputado 2'}])
+
+
+class SnapshotTests(APITestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        projetos = create_projetos(3)
+        add_votes(projetos[0], 2)
+        Vote.objects.update(votes={'a_favor': ['PS', 'PSD'], 'contra': ['CH'], 'abstencao': []})
+        Vote.objects.all().sync_positions()
+
+    def read_table(self, manifest, name):
+        path = os.path.join(self.directory, manifest['tables'][name]['file'])
+        if manifest['format'] == 'parquet':
+            return pq.read_table(path)
+        return ipc.open_file(pa.memory_map(path)).read_all()
+
+    @mock.patch('backend.snapshots.CHUNK_SIZE', 2)
+    def test_tables_are_written_in_chunks_with_dictionaries(self):
+        for file_format in ('arrow', 'parquet'):
+            manifest = write_snapshot(self.directory, file_format)
+            self.assertEqual({name: table['rows'] for name, table in manifest['tables'].items()}, {
+                'projetos': 3, 'phases': 6, 'votes': 2, 'vote_positions': 6,
+            })
+            phases = self.read_table(manifest, 'phases')
+            self.assertTrue(pa.types.is_dictionary(phases.schema.field('name').type))
+            self.assertEqual(phases.column('name').to_pylist(), ['Entrada', 'Admissão'] * 3)
+            positions = self.read_table(manifest, 'vote_positions')
+            self.assertEqual(positions.slice(0, 3).to_pylist(), [
+                {'vote_id': positions['vote_id'][0].as_py(), 'party': 'PS', 'position': 'a_favor'},
+                {'vote_id': positions['vote_id'][0].as_py(), 'party': 'PSD', 'position': 'a_favor'},
+                {'vote_id': positions['vote_id'][0].as_py(), 'party': 'CH', 'position': 'contra'},
+            ])
+
+    def test_latest_snapshot_is_served(self):
+        self.client.force_authenticate(get_user_model().objects.create_user('reader', password='reader'))
+        with override_settings(SNAPSHOT_DIR=self.directory):
+            self.assertEqual(self.client.get('/snapshots/').status_code, 404)
+            manifest = write_snapshot()
+            self.assertEqual(self.client.get('/snapshots/').data, manifest)
+            response = self.client.get('/snapshots/projetos/')
+            table = ipc.open_file(pa.BufferReader(b''.join(response.streaming_content))).read_all()
+            self.assertEqual(sorted(table.column('external_id').to_pylist()), ['100000', '100001', '100002'])
+
+    def test_updating_descriptions_writes_a_snapshot(self):
+        command = 'backend.management.commands.update_pdf_description'
+        generation = import_generation()
+        with override_settings(SNAPSHOT_DIR=self.directory), \
+                mock.patch(f'{command}.download_pdf'), \
+                mock.patch(f'{command}.extract_text_from_pdf', return_value='texto'), \
+                mock.patch(f'{command}.generate_summary', return_value='Resumo'):
+            # No PDFs to summarise
+            ProjetoLei.objects.update(link=None)
+            call_command('update_pdf_description')
+            self.assertEqual(import_generation(), generation)
+            self.assertIsNone(latest_snapshot())
+
+            ProjetoLei.objects.update(link='https://app.parlamento.pt/iniciativa.pdf')
+            call_command('update_pdf_description')
+            self.assertEqual(import_generation(), generation + 1)
+            self.assertEqual(latest_snapshot()['generation'], generation + 1)
+        self.assertEqual(set(ProjetoLei.objects.values_list('description', flat=True)), {'Resumo'})
+
+
+class VotePositionTests(APITestCase):
+    def positions(self):
+        return set(VotePosition.objects.values_list('vote__vote_id', 'party', 'position', 'date'))
+
+    def test_positions_follow_votes_json(self):
+        projeto, = create_projetos(1)
+        add_votes(projeto, 2)
+        first, second = Vote.objects.order_by('id')
+        Vote.objects.filter(pk=first.pk).update(votes={'a_favor': ['PS', 'PSD'], 'contra': ['CH'], 'abstencao': []})
+        # A party listed twice keeps its first position
+        Vote.objects.filter(pk=second.pk).update(votes={'a_favor': ['PS'], 'contra': ['PS'], 'abstencao': ['IL']})
+        Vote.objects.all().sync_positions()
+        self.assertEqual(self.positions(), {
+            (first.vote_id, 'PS', 'a_favor', first.date), (first.vote_id, 'PSD', 'a_favor', first.date),
+            (first.vote_id, 'CH', 'contra', first.date),
+            (second.vote_id, 'PS', 'a_favor', second.date), (second.vote_id, 'IL', 'abstencao', second.date),
+        })
+        counts = VotePosition.objects.values_list('party', 'position').annotate(count=Count('id')).order_by('party', 'position')
+        self.assertEqual(list(counts), [
+            ('CH', 'contra', 1), ('IL', 'abstencao', 1), ('PS', 'a_favor', 2), ('PSD', 'a_favor', 1),
+        ])
+
+        unchanged = VotePosition.objects.get(vote=first, party='PS').pk
+        Vote.objects.filter(pk=first.pk).update(votes={'a_favor': ['PS'], 'contra': ['CH', 'PSD']})
+        Vote.objects.filter(pk=second.pk).update(votes={})
+        Vote.objects.all().sync_positions()
+        self.assertEqual(self.positions(), {
+            (first.vote_id, 'PS', 'a_favor', first.date), (first.vote_id, 'CH', 'contra', first.date),
+            (first.vote_id, 'PSD', 'contra', first.date),
+        })
+        self.assertEqual(VotePosition.objects.get(vote=first, party='PS').pk, unchanged)
+
+    def test_update_votes_only_writes_changed_votes(self):
+        projeto, other = create_projetos(2)
+        add_votes(projeto, 2)
+        add_votes(other, 1)
+        Vote.objects.update(details='A Favor: <I>PS</I><BR>Contra: <I>CH</I>')
+        call_command('update_votes', batch_size=2)
+        generation = import_generation()
+        updated_at = dict(ProjetoLei.objects.values_list('pk', 'updated_at'))
+
+        # Nothing to parse again
+        with mock.patch('backend.management.commands.update_votes.snapshot_after_import') as snapshot:
+            call_command('update_votes', batch_size=2)
+        self.assertEqual(import_generation(), generation)
+        self.assertFalse(snapshot.called)
+        self.assertEqual(dict(ProjetoLei.objects.values_list('pk', 'updated_at')), updated_at)
+
+        changed = projeto.votes.order_by('id').first()
+        Vote.objects.filter(pk=changed.pk).update(details='A Favor: <I>IL</I>')
+        with mock.patch('backend.management.commands.update_votes.snapshot_after_import') as snapshot:
+            call_command('update_votes', batch_size=2)
+        self.assertEqual(import_generation(), generation + 1)
+        self.assertTrue(snapshot.called)
+        self.assertNotEqual(ProjetoLei.objects.get(pk=projeto.pk).updated_at, updated_at[projeto.pk])
+        self.assertEqual(ProjetoLei.objects.get(pk=other.pk).updated_at, updated_at[other.pk])
+        self.assertIn((changed.vote_id, 'IL', 'a_favor', changed.date), self.positions())
+
+
+class PartyAgreementTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.client.force_authenticate(get_user_model().objects.create_user('analyst', password='analyst'))
+        projeto, = create_projetos(1)
+        add_votes(projeto, 3)
+        may_first, may_second, june = Vote.objects.order_by('id')
+        Vote.objects.filter(pk=may_first.pk).update(votes={'a_favor': ['PS', 'PSD'], 'contra': ['CH']})
+        Vote.objects.filter(pk=may_second.pk).update(votes={'a_favor': ['PS'], 'contra': ['PSD', 'CH']})
+        Vote.objects.filter(pk=june.pk).update(
+            date=date(2024, 6, 1), votes={'a_favor': ['PSD', 'IL'], 'abstencao': ['PS']}
+        )
+        Vote.objects.all().sync_positions()
+
+    def test_agreement_and_majority_alignment(self):
+        data = self.client.get('/analytics/party-agreement/').data
+        self.assertEqual(data['parties'], ['CH', 'IL', 'PS', 'PSD'])
+        self.assertEqual(data['votes'], 3)
+        self.assertEqual(data['agreement'], [
+            [1.0, None, 0.0, 0.5],
+            [None, 1.0, 0.0, 1.0],
+            [0.0, 0.0, 1.0, 0.3333],
+            [0.5, 1.0, 0.3333, 1.0],
+        ])
+        self.assertEqual(data['shared_votes'], [[2, 0, 2, 2], [0, 1, 1, 1], [2, 1, 3, 3], [2, 1, 3, 3]])
+        # The majority voted for, against, then for
+        self.assertEqual(data['majority_alignment'], {
+            'periods': ['2024-05', '2024-06'],
+            'parties': {'CH': [0.5, None], 'IL': [None, 1.0], 'PS': [0.5, 0.0], 'PSD': [1.0, 1.0]},
+        })
+
+    def test_filters(self):
+        data = self.client.get('/analytics/party-agreement/?start_date=01-06-2024').data
+        self.assertEqual((data['parties'], data['votes']), (['IL', 'PS', 'PSD'], 1))
+        data = self.client.get('/analytics/party-agreement/?legislature=XV').data
+        self.assertEqual((data['parties'], data['votes']), ([], 0))
+        response = self.client.get('/analytics/party-agreement/?end_date=2024-06-01')
+        self.assertEqual(response.status_code, 400)
+
+    def test_cached_until_the_next_import(self):
+        self.assertEqual(self.client.get('/analytics/party-agreement/').data['votes'], 3)
+        Vote.objects.order_by('id').first().delete()
+        self.assertEqual(self.client.get('/analytics/party-agreement/').data['votes'], 3)
+        bump_import_generation()
+        self.assertEqual(self.client.get('/analytics/party-agreement/').data['votes'], 2)
+
+
+class RowSerializerTests(APITestCase):
+    def setUp(self):
+        projetos = create_projetos(3)
+        add_votes(projetos[0], 2)
+        add_votes(projetos[1], 1, start=2)
+        # A phase shared by two initiatives
+        projetos[2].phases.add(projetos[0].phases.first())
+
+    def assertSameRendering(self, serializer_class, queryset, selection=FieldSelection()):
+        serializer = serializer_class(queryset, many=True)
+        apply_selection(serializer, selection)
+        rows = RowSerializer(serializer)
+        with CaptureQueriesContext(connection) as queries:
+            data = rows.serialize(list(queryset.prefetch_related(None).values(*rows.lookups())))
+        self.assertEqual(JSONRenderer().render(data), JSONRenderer().render(serializer.data))
+        return len(queries)
+
+    def test_projetos_render_like_list_serializer(self):
+        queryset = with_list_relations(ProjetoLei.objects.order_by('-external_id'))
+        # page, authors, phases, commissions, documents, commission votes
+        self.assertEqual(self.assertSameRendering(ProjetoLeiListSerializer, queryset), 6)
+        selection = FieldSelection({'title': {}, 'phases': {'name': {}, 'commissions': {}}}, None)
+        self.assertSameRendering(ProjetoLeiListSerializer, with_list_relations(ProjetoLei.objects.order_by('title'), selection), selection)
+
+    def test_votes_and_phases_render_like_their_serializers(self):
+        votes = Vote.objects.order_by('-date', '-id').prefetch_related(*related_lookups(Vote, FieldSelection(), VOTE_RELATIONS))
+        self.assertSameRendering(VoteSerializer, votes)
+        phases = Phase.objects.order_by('-date', '-id')
+        self.assertSameRendering(PhaseBasicSerializer, phases)
+        self.assertSameRendering(PhaseSerializer, phases.prefetch_related(*related_lookups(Phase, FieldSelection(), PHASE_RELATIONS)))
+
+
+class NaturalKeyMigrationTests(TransactionTestCase):
+    before = [('backend', '0018_content_hash')]
+    after = [('backend', '0019_natural_key_constraints')]
+
+    def migrate(self, targets):
+        executor = MigrationExecutor(connection)
+        executor.migrate(targets)
+        return executor.loader.project_state(targets).apps
+
+    def tearDown(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(executor.loader.graph.leaf_nodes())
+
+    def test_duplicates_are_merged_with_their_children(self):
+        apps = self.migrate(self.before)
+        Legislature = apps.get_model('backend', 'Legislature')
+        ProjetoLei = apps.get_model('backend', 'ProjetoLei')
+        Phase = apps.get_model('backend', 'Phase')
+        Vote = apps.get_model('backend', 'Vote')
+        Commission = apps.get_model('backend', 'Commission')
+        legislature = Legislature.objects.create(number='XVI')
+        first, second = (
+            ProjetoLei.objects.create(title=str(index), type='Projeto de Lei', legislature=legislature, external_id=str(index))
+            for index in range(2)
+        )
+        kept, duplicate = (Phase.objects.create(name='Entrada', evt_id='1', oev_id='1') for _ in range(2))
+        first.phases.add(kept)
+        second.phases.add(duplicate)
+        Commission.objects.create(name='Comissão de Saúde', id_commission='1', phase=kept)
+        repeated = Commission.objects.create(name='Comissão de Saúde', id_commission='1', phase=duplicate)
+        apps.get_model('backend', 'CommissionDocument').objects.create(title='Parecer', commission=repeated)
+        apps.get_model('backend', 'Debate').objects.create(date=date(2024, 4, 1), phase='Generalidade', phase_link=duplicate)
+        kept_vote, duplicate_vote = (Vote.objects.create(vote_id='v1', result='Aprovado') for _ in range(2))
+        second.votes.add(duplicate_vote)
+        apps.get_model('backend', 'Publication').objects.create(vote=duplicate_vote, url='https://example.org/dar')
+
+        apps = self.migrate(self.after)
+        Phase = apps.get_model('backend', 'Phase')
+        commission = apps.get_model('backend', 'Commission').objects.get()
+        self.assertEqual(list(Phase.objects.values_list('id', flat=True)), [kept.id])
+        self.assertEqual(
+            set(apps.get_model('backend', 'ProjetoLei').phases.through.objects.values_list('phase_id', flat=True)),
+            {kept.id},
+        )
+        self.assertEqual(commission.phase_id, kept.id)
+        self.assertEqual(
+            list(apps.get_model('backend', 'CommissionDocument').objects.values_list('commission_id', flat=True)),
+            [commission.id],
+        )
+        self.assertEqual(apps.get_model('backend', 'Debate').objects.get().phase_link_id, kept.id)
+        self.assertEqual(apps.get_model('backend', 'Vote').objects.get().id, kept_vote.id)
+        self.assertEqual(apps.get_model('backend', 'Publication').objects.get().vote_id, kept_vote.id)
+        self.assertEqual(apps.get_model('backend', 'ProjetoLei').votes.through.objects.get().vote_id, kept_vote.id)
+
+
+def in_chunks(text, size):
+    return (text[index:index + size] for index in range(0, len(text), size))
+
+
+class JSONStreamTests(SimpleTestCase):
+    def test_elements_across_chunk_boundaries(self):
+        items = [
+            {'IniId': '1', 'IniTitulo': 'Habitação [urgente], "já"', 'IniEventos': [{'EvtId': 1}] * 50},
+            12345, 'x', None, [], {},
+        ]
+        text = '\ufeff \n' + json.dumps(items, ensure_ascii=False) + ' \n'
+        for size in (1, 2, 7, 64, len(text)):
+            self.assertEqual(list(iter_json_array(in_chunks(text, size))), items, size)
+        self.assertEqual(list(iter_json_array(in_chunks('  [ ] ', 1))), [])
+
+    def test_malformed_input_reports_position_in_text(self):
+        cases = {
+            '[1,]': 'Expecting value at position 3',
+            '[,1]': 'Expecting value at position 1',
+            '[1]garbage': 'Unexpected data after the JSON array at position 3',
+            '[] ]': 'Unexpected data after the JSON array at position 3',
+            '[1 2]': "Expected ',' or ']' at position 3",
+            '[12345': 'Unexpected end of JSON array at position 6',
+            '{"a": 1}': 'Expected a JSON array at the top level',
+        }
+        for text, message in cases.items():
+            for size in (1, 3, 100):
+                with self.assertRaisesMessage(ValueError, message):
+                    list(iter_json_array(in_chunks(text, size)))
+
+        # Far into the text, where earlier elements were already dropped from the buffer
+        text = json.dumps([{'IniId': str(index)} for index in range(100)])[:-1] + ', {"IniId": tru}]'
+        position = text.index('tru')
+        for size in (5, 64):
+            with self.assertRaisesMessage(ValueError, f'Expecting value at position {position}'):
+                list(iter_json_array(in_chunks(text, size)))
+
+    def test_skip_to_initiative(self):
+        data = [{'IniId': str(index)} for index in range(5)]
+        self.assertEqual(list(skip_to_initiative(data, '3')), data[3:])
+        self.assertEqual(list(skip_to_initiative(iter(data), '3')), data[3:])
+        with self.assertLogs('backend.management.commands.import_parlamento_data', 'WARNING') as logs:
+            self.assertEqual(list(skip_to_initiative(iter(data), '9')), [])
+        self.assertIn('9 not found', logs.output[0])
+
+
+def table_rows():
+    """
+    Every row of the app's tables (many-to-many tables included) as sorted
+    reprs, with primary keys left out and foreign keys replaced by the
+    referenced row, so imports that wrote the same data compare equal.
+    """
+    referenced = {}
+
+    def values(model, row):
+        items = []
+        for field in model._meta.concrete_fields:
+            if field.primary_key or field.name == 'updated_at':
+                continue
+            value = row[field.attname]
+            if field.is_relation and value is not None:
+                value = reference(field.related_model, value)
+            items.append((field.name, value))
+        return tuple(items)
+
+    def reference(model, pk):
+        if (model, pk) not in referenced:
+            referenced[model, pk] = None
+            referenced[model, pk] = values(model, model.objects.filter(pk=pk).values().get())
+        return referenced[model, pk]
+
+    return {
+        model._meta.label: sorted(repr(values(model, row)) for row in model.objects.values())
+        for model in apps.get_app_config('backend').get_models(include_auto_created=True)
+        if model.__name__ not in ('DashboardStatistics', 'ImportGeneration')
+    }
+
+
+class ImportCacheTests(APITestCase):
+    def setUp(self):
+        Legislature.objects.create(number='XV')
+        self.cache = ImportCache(complete=True)
+        self.cache.preload()
+        self.legislatures = self.cache.legislatures
+
+    def test_rollback_forgets_the_rows_of_the_failed_transaction(self):
+        kept = self.legislatures.get('XV')
+        with self.assertRaises(DatabaseError), transaction.atomic():
+            self.legislatures.set('XVI', Legislature.objects.create(number='XVI'))
+            self.assertIs(self.legislatures.get('XV'), kept)
+            raise DatabaseError('failed')
+        self.cache.rollback()
+
+        # Rows created or read in the transaction are looked up again
+        self.assertIsNone(self.legislatures.get('XVI'))
+        self.assertIsNone(self.legislatures.get('XV'))
+        self.assertEqual(self.legislatures.get_many(['XV', 'XVI'], fetch_legislatures), {'XV': kept})
+        self.assertIsNone(self.legislatures.lookup('XVI', lambda: Legislature.objects.filter(number='XVI').first()))
+
+    def test_commit_keeps_the_rows(self):
+        with transaction.atomic():
+            created = Legislature.objects.create(number='XVI')
+            self.legislatures.set('XVI', created)
+        self.cache.commit()
+        self.cache.rollback()
+        self.assertIs(self.legislatures.get('XVI'), created)
+
+    def test_only_stale_keys_are_fetched_again(self):
+        fetch = mock.Mock(return_value=None)
+        # Preloaded and the only writer: a key that isn't cached doesn't exist
+        self.assertIsNone(self.legislatures.lookup('XVI', fetch))
+        self.assertFalse(fetch.called)
+
+        self.cache.rollback()
+        self.assertIsNone(self.legislatures.lookup('XVI', fetch))
+        self.assertEqual(fetch.call_count, 1)
+        # Fetched once since the rollback
+        self.assertIsNone(self.legislatures.lookup('XVI', fetch))
+        self.assertEqual(fetch.call_count, 1)
+
+        # Unless preloaded, every miss is fetched
+        cache = ImportCache()
+        self.assertEqual(cache.legislatures.lookup('XV', lambda: Legislature.objects.get(number='XV')).number, 'XV')
+        self.assertIsNone(cache.legislatures.lookup('XVI', fetch))
+        self.assertEqual(fetch.call_count, 2)
+
+    def test_stats_count_hits_and_misses(self):
+        self.legislatures.lookup('XV', mock.Mock())
+        self.legislatures.get_many(['XV', 'XVI'], fetch_legislatures)
+        self.cache.authors.lookup(('PS', 'PS', 'Grupo'), mock.Mock())
+        self.assertEqual(self.cache.stats(), {'legislatures': (2, 1), 'authors': (0, 1), 'phases': (0, 0)})
+
+        command = ImportCommand()
+        command.cache = self.cache
+        self.assertEqual(command.cache_stats(), {
+            ('legislatures', 'hits'): 2, ('legislatures', 'misses'): 1,
+            ('authors', 'hits'): 0, ('authors', 'misses'): 1,
+            ('phases', 'hits'): 0, ('phases', 'misses'): 0,
+        })
+
+
+class ImportTests(APITestCase):
+    def setUp(self):
+        rng = random.Random(7)
+        self.dump = [synthetic_initiative(index, rng) for index in range(12)]
+        # A repeated initiative, a phase without ids and a vote shared by two initiatives
+        self.dump.append(copy.deepcopy(self.dump[3]))
+        self.dump[4]['IniEventos'][0].pop('EvtId')
+        shared_vote = next(phase['Votacao'][0] for phase in self.dump[5]['IniEventos'] if 'Votacao' in phase)
+        self.dump[6]['IniEventos'][0]['Votacao'] = [copy.deepcopy(shared_vote)]
+
+        # The dump of a later import: a new title, a phase less, and changed phase children
+        self.changed = copy.deepcopy(self.dump)
+        self.changed[0]['IniTitulo'] = 'Título alterado'
+        self.changed[1]['IniEventos'] = self.changed[1]['IniEventos'][:-1]
+        self.changed[2]['IniEventos'][0]['AnexosFase'] = []
+        commission = self.changed[2]['IniEventos'][2]['Comissao'][0]
+        commission['Documentos'][0]['DataDocumento'] = '2030-01-01'
+        commission['Relatores'].append({'nome': 'Deputado 999', 'GP': 'PS', 'data': '2030-01-02'})
+
+    def run_import(self, data, batch_size):
+        importer = ImportCommand()
+        importer.import_initiatives(copy.deepcopy(data), batch_size=batch_size)
+        return importer.changes
+
+    def import_both_dumps(self, batch_size):
+        """Table rows after importing the dump, and after importing the changed dump over it, rolled back"""
+        with transaction.atomic():
+            self.run_import(self.dump, batch_size)
+            first = table_rows()
+            self.run_import(self.changed, batch_size)
+            second = table_rows()
+            transaction.set_rollback(True)
+        return first, second
+
+    def test_batches_write_what_one_initiative_at_a_time_writes(self):
+        row_by_row = self.import_both_dumps(batch_size=1)
+        self.assertGreater(len(row_by_row[0]['backend.Phase']), 40)
+        for batch_size in (5, 100):
+            bulk = self.import_both_dumps(batch_size)
+            for label in row_by_row[0]:
+                self.assertEqual(bulk[0][label], row_by_row[0][label], (batch_size, label))
+                self.assertEqual(bulk[1][label], row_by_row[1][label], (batch_size, label))
+
+    def test_failed_batch_is_imported_one_initiative_at_a_time(self):
+        row_by_row = self.import_both_dumps(batch_size=1)
+        import_batch = BulkImporter.import_batch
+
+        def fail_batches(importer, initiatives):
+            if len(initiatives) > 1:
+                raise DatabaseError('batch failed')
+            return import_batch(importer, initiatives)
+
+        with mock.patch.object(BulkImporter, 'import_batch', autospec=True, side_effect=fail_batches):
+            self.assertEqual(self.import_both_dumps(batch_size=5), row_by_row)
+
+    def test_unchanged_initiatives_are_skipped(self):
+        self.run_import(self.dump, batch_size=5)
+        with CaptureQueriesContext(connection) as queries:
+            changes = self.run_import(self.dump, batch_size=5)
+        self.assertEqual(changes['unchanged'], len(self.dump))
+        writes = [query['sql'] for query in queries if query['sql'].startswith(('INSERT', 'UPDATE', 'DELETE'))]
+        self.assertEqual(writes, [])
+
+    def test_reimport_reconciles_children(self):
+        self.run_import(self.dump, batch_size=5)
+        first, second, third = (ProjetoLei.objects.get(external_id=data['IniId']) for data in self.dump[:3])
+        phase_ids = list(second.phases.order_by('date', 'id').values_list('id', flat=True))
+        attachment_phase = Phase.objects.get(evt_id=self.dump[2]['IniEventos'][0]['EvtId'])
+        self.assertTrue(attachment_phase.attachments.exists())
+        commission = Commission.objects.get(phase__evt_id=self.dump[2]['IniEventos'][2]['EvtId'])
+        document = commission.documents.get()
+
+        changes = self.run_import(self.changed, batch_size=5)
+
+        self.assertEqual(changes['unchanged'], len(self.dump) - 3)
+        first.refresh_from_db()
+        self.assertEqual(first.title, 'Título alterado')
+        self.assertEqual(list(second.phases.order_by('date', 'id').values_list('id', flat=True)), phase_ids[:-1])
+        self.assertFalse(attachment_phase.attachments.exists())
+        # Matched by natural key: updated in place, not recreated
+        self.assertEqual(Commission.objects.get(phase=commission.phase).pk, commission.pk)
+        self.assertEqual(commission.documents.get().pk, document.pk)
+        self.assertEqual(commission.documents.get().date, date(2030, 1, 1))
+        self.assertEqual(commission.rapporteurs.count(), 2)
+
+    def test_initiatives_sharing_a_changed_phase_or_vote_get_a_new_etag(self):
+        self.client.force_authenticate(get_user_model().objects.create_user('reader', password='reader'))
+        # The first phase of initiative 8 is also a phase of initiative 7
+        self.dump[7]['IniEventos'].append(copy.deepcopy(self.dump[8]['IniEventos'][0]))
+
+        def shared_vote(dump):
+            return next(phase['Votacao'][0] for phase in dump[5]['IniEventos'] if 'Votacao' in phase)
+
+        def change_vote(dump):
+            shared_vote(dump)['reuniao'] = '999'
+
+        def change_vote_publication(dump):
+            shared_vote(dump)['publicacao'][0]['pubNr'] = '99'
+
+        def change_phase(dump):
+            dump[8]['IniEventos'][0]['ObsFase'] = 'Alterada'
+
+        def change_title(dump):
+            dump[5]['IniTitulo'] = 'Título alterado'
+
+        cases = [(change_vote, 6, 200), (change_vote_publication, 6, 200), (change_phase, 7, 200), (change_title, 6, 304)]
+        for change, sharing, status in cases:
+            for batch_size in (1, 5):
+                with self.subTest(change=change.__name__, batch_size=batch_size), transaction.atomic():
+                    self.run_import(self.dump, batch_size)
+                    url = f"/projetoslei/{self.dump[sharing]['IniId']}/"
+                    etag = self.client.get(url)['ETag']
+
+                    changed = copy.deepcopy(self.dump)
+                    change(changed)
+                    self.assertEqual(self.run_import(changed, batch_size)['updated'], 1)
+                    self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, status)
+                    transaction.set_rollback(True)
+
+    def test_generation_is_only_bumped_when_something_was_written(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.json', delete=False) as dump:
+            json.dump(self.dump, dump)
+        self.addCleanup(os.remove, dump.name)
+        command = 'backend.management.commands.import_parlamento_data'
+
+        with mock.patch(f'{command}.snapshot_after_import') as snapshot:
+            call_command('import_parlamento_data', file=dump.name)
+            generation = import_generation()
+            self.assertEqual(snapshot.call_count, 1)
+
+            # Nothing changed since the last import
+            call_command('import_parlamento_data', file=dump.name)
+            # Every initiative failed
+            with mock.patch.object(BulkImporter, 'import_batch', side_effect=DatabaseError('failed')):
+                call_command('import_parlamento_data', file=dump.name, force=True)
+
+        self.assertEqual(import_generation(), generation)
+        self.assertEqual(snapshot.call_count, 1)
+
+
+class ParallelImportTests(TransactionTestCase):
+    def setUp(self):
+        rng = random.Random(11)
+        dump = [synthetic_initiative(index, rng) for index in range(16)]
+        for initiative in dump[::3]:
+            initiative['IniLeg'] = 'XV'
+        # A repeated initiative, and a vote shared by initiatives of both workers
+        dump.append(copy.deepcopy(dump[2]))
+        shards = [zlib.crc32(initiative['IniId'].encode()) % 2 for initiative in dump]
+        self.assertEqual(set(shards), {0, 1})
+        voted = next(initiative for initiative, shard in zip(dump, shards) if shard == 0 and initiative['IniEventos'][-1].get('Votacao'))
+        sharing = next(initiative for initiative, shard in zip(dump, shards) if shard == 1)
+        sharing['IniEventos'][0]['Votacao'] = copy.deepcopy(voted['IniEventos'][-1]['Votacao'])
+
+        changed = copy.deepcopy(dump)
+        changed[0]['IniTitulo'] = 'Título alterado'
+        changed[1]['IniEventos'] = changed[1]['IniEventos'][:-1]
+
+        self.files = []
+        for data in (dump, changed):
+            with tempfile.NamedTemporaryFile('w', suffix='.json', delete=False) as file:
+                json.dump(data, file)
+            self.addCleanup(os.remove, file.name)
+            self.files.append(file.name)
+
+    def import_both_dumps(self, workers):
+        """Table rows after importing the dump, and after importing the changed dump over it"""
+        call_command('flush', interactive=False, verbosity=0)
+        rows = []
+        for file in self.files:
+            call_command('import_parlamento_data', file=file, workers=workers, batch_size=5)
+            rows.append(table_rows())
+        return rows
+
+    def test_workers_write_what_one_process_writes(self):
+        single = self.import_both_dumps(workers=1)
+        self.assertEqual(len(single[0]['backend.Legislature']), 2)
+        self.assertEqual(len(single[0]['backend.ProjetoLei']), 16)
+        parallel = self.import_both_dumps(workers=2)
+        self.assertEqual(Vote.objects.annotate(projetos=Count('projetos_lei')).filter(projetos=2).count(), 1)
+        for label in single[0]:
+            self.assertEqual(parallel[0][label], single[0][label], label)
+            self.assertEqual(parallel[1][label], single[1][label], label)
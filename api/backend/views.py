@@ -3,19 +3,32 @@ from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.viewsets import ReadOnlyModelViewSet
 from rest_framework.permissions import AllowAny, IsAuthenticated, IsAuthenticated
-from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.exceptions import AuthenticationFailed, NotFound, ValidationError
 from rest_framework.decorators import action
 from rest_framework_simplejwt.authentication import JWTAuthentication
 from django_filters.rest_framework import DjangoFilterBackend
-from django.db.models import Subquery, OuterRef, Count, Q, Min
-from datetime import datetime, timedelta
-from django.core.cache import cache
-from django.utils import timezone
-
+from django.conf import settings
+from django.db.models import Count, Max, Prefetch, Q
+from django.http import FileResponse
+from django.utils.dateparse import parse_datetime
+from django.utils.functional import cached_property
+from datetime import datetime
+import os
+
+from .analytics import cached_party_agreement
+from .caching import get_or_refresh
+from .conditional import ConditionalGetMixin
+from .dashboard import get_statistics
+from .export import CSVRenderer, NDJSONRenderer, export_response
+from .fieldsets import FieldSelection, SparseFieldsetViewMixin, only_selected, related_lookups
+from .filters import FullTextSearchFilter, NameSearchFilter
+from .pagination import PageNumberOrCursorPagination
+from .rows import RowListMixin, RowSerializer
 from .models import (
     ProjetoLei, Legislature, Phase, Author, Vote, 
     Publication, Commission, Debate
 )
+from .snapshots import FORMATS, latest_snapshot
 from .serializers import (
     ProjetoLeiListSerializer, ProjetoLeiDetailSerializer, ProjetoLeiFullSerializer,
     LegislatureSerializer, PhaseSerializer, AuthorSerializer, VoteSerializer,
@@ -23,74 +36,87 @@ from .serializers import (
 )
 
 
-class DashboardStatisticsView(APIView):
+# Relations nested by the serializers, prefetched when selected (see backend.fieldsets)
+PHASE_RELATIONS = {'commissions': {'documents': {}, 'votes': {}}}
+VOTE_RELATIONS = {'publications': {}}
+DEBATE_RELATIONS = {'video_links': {}, 'deputies': {}, 'government_members': {}, 'guests': {}}
+PROJETO_LIST_RELATIONS = {'authors': {}, 'phases': PHASE_RELATIONS}
+
+
+def with_list_relations(queryset, selection=FieldSelection()):
+    """Fetch the related rows ProjetoLeiListSerializer nests, in one query per relation"""
+    if selection.includes('legislature', nested=True):
+        queryset = queryset.select_related('legislature')
+    return queryset.prefetch_related(*related_lookups(ProjetoLei, selection, PROJETO_LIST_RELATIONS))
+
+
+def prefetch_phases_by_date():
+    return Prefetch('phases', queryset=Phase.objects.order_by('date'), to_attr='phases_by_date')
+
+
+def prefetch_votes_by_date(selection=FieldSelection()):
+    return Prefetch(
+        'votes',
+        queryset=Vote.objects.order_by('date').prefetch_related(*related_lookups(Vote, selection, VOTE_RELATIONS)),
+        to_attr='votes_by_date'
+    )
+
+
+def get_party_groups():
+    """The first author of each party name (author_type 'Grupo'), by name, in one DISTINCT ON query"""
+    parties = Author.objects.filter(author_type='Grupo').order_by('name', 'pk').distinct('name')
+    return AuthorSerializer(parties, many=True).data
+
+
+class DashboardStatisticsView(ConditionalGetMixin, APIView):
     authentication_classes = [JWTAuthentication]
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
-        # Try to get from cache first (update every 6 hours)
-        cache_key = 'dashboard_statistics'
-        cached_stats = cache.get(cache_key)
-        
-        if cached_stats:
-            return Response(cached_stats)
-        
-        # Calculate statistics from database
-        stats = {}
-        
-        # Total number of proposals
-        stats['total_proposals'] = ProjetoLei.objects.count()
-        
-        # Total number of vote events
-        stats['total_votes'] = Vote.objects.count()
-        
-        # Proposals this year
-        current_year = timezone.now().year
-        stats['proposals_this_year'] = ProjetoLei.objects.filter(
-            date__year=current_year
-        ).count()
-        
-        # Party statistics
-        party_stats = {}
-        for author in Author.objects.filter(author_type='Grupo'):
-            party_stats[author.name] = ProjetoLei.objects.filter(authors__name=author.name).count()
-        
-        stats['proposals_by_party'] = party_stats
-        
-        # Recent votes
-        stats['recent_votes'] = Vote.objects.filter(
-            date__gte=timezone.now().date() - timedelta(days=30)
-        ).count()
-        
-        # Calculate the recent proposals based on the date of the first phase
-        stats['recent_proposals'] = ProjetoLei.objects.annotate(
-            first_phase_date=Min('phases__date')  # Annotate with the date of the first phase
-        ).filter(
-            first_phase_date__gte=timezone.now().date() - timedelta(days=30)  # Filter based on the first phase date
-        ).count()
-        
-        # Most active phases
-        stats['phases_count'] = dict(Phase.objects.values('name').annotate(
-            count=Count('id')).order_by('-count').values_list('name', 'count')[:10])
-        
-        # Cache results for 6 hours
-        cache.set(cache_key, stats, 6 * 60 * 60)
-        
+        # Statistics are computed after each import (see backend.dashboard) and cached
+        # until the next one, re-read in the background every 6 hours
+        stats = get_or_refresh('dashboard_statistics', get_statistics, fresh_for=6 * 60 * 60)
         return Response(stats)
 
 
-class ProjetoLeiViewSet(ReadOnlyModelViewSet):
+class PartyAgreementView(ConditionalGetMixin, APIView):
+    """
+    How often each pair of parties took the same position in plenary votes
+    (agreement, over the votes both took a position in), and each party's
+    majority_alignment by month, the share of its votes in which it took
+    the position most parties took. Optionally for the votes on initiatives
+    of ?legislature=, and between ?start_date= and ?end_date= (dd-mm-YYYY,
+    like the initiatives).
+    """
+    authentication_classes = [JWTAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        dates = {}
+        for param in ('start_date', 'end_date'):
+            value = request.query_params.get(param)
+            if value:
+                try:
+                    dates[param] = datetime.strptime(value, '%d-%m-%Y').date()
+                except ValueError:
+                    raise ValidationError({param: 'Expected a date as dd-mm-YYYY.'})
+        # Computed once per legislature and range for each import (see backend.analytics)
+        return Response(cached_party_agreement(request.query_params.get('legislature'), **dates))
+
+
+class ProjetoLeiViewSet(ConditionalGetMixin, RowListMixin, SparseFieldsetViewMixin, ReadOnlyModelViewSet):
     """
     API endpoint for accessing legislative proposals (Projetos de Lei).
     Uses external_id as the lookup field instead of the default primary key.
     """
     authentication_classes = [JWTAuthentication]
     permission_classes = [IsAuthenticated]
-    queryset = ProjetoLei.objects.all().order_by('-date')
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    queryset = ProjetoLei.objects.defer('search_vector').order_by('-date')
+    filter_backends = [DjangoFilterBackend, FullTextSearchFilter, filters.OrderingFilter]
     filterset_fields = ['type', 'legislature__number', 'initiative_number', 'date']
-    search_fields = ['title', 'external_id', 'initiative_number']
     ordering_fields = ['date', 'initiative_number', 'title']
+    pagination_class = PageNumberOrCursorPagination
+    cursor_ordering = ('-external_id',)
     lookup_field = 'external_id'  
     
     def get_serializer_class(self):
@@ -99,6 +125,26 @@ class ProjetoLeiViewSet(ReadOnlyModelViewSet):
         if self.action == 'full_details':
             return ProjetoLeiFullSerializer
         return ProjetoLeiListSerializer
+
+    def get_validators(self, request):
+        """
+        A single initiative changes with its own updated_at (and, for
+        full_details, with those of the initiatives related to it); lists
+        change with each import.
+        """
+        if self.action not in ('retrieve', 'full_details'):
+            return super().get_validators(request)
+
+        external_id = self.kwargs[self.lookup_field]
+        rows = Q(external_id=external_id)
+        if self.action == 'full_details':
+            rows |= Q(related_initiatives__external_id=external_id)
+        state = ProjetoLei.objects.filter(rows).aggregate(
+            count=Count('pk', distinct=True), updated_at=Max('updated_at')
+        )
+        if not state['count']:
+            return None
+        return f"{state['count']}-{state['updated_at'].timestamp()}", state['updated_at']
     
     @action(detail=True, methods=['get'])
     def full_details(self, request, external_id=None):
@@ -106,11 +152,21 @@ class ProjetoLeiViewSet(ReadOnlyModelViewSet):
         Get complete details for a projeto de lei, including all relationships.
         """
         projeto = self.get_object()
-        serializer = ProjetoLeiFullSerializer(projeto)
+        serializer = self.get_serializer(projeto)
         return Response(serializer.data)
     
+    @action(detail=False, methods=['get'], renderer_classes=[NDJSONRenderer, CSVRenderer])
+    def export(self, request, format=None):
+        """
+        Stream every projeto de lei matching the list's filters, unpaginated,
+        as NDJSON (default) or CSV (?format=csv or Accept: text/csv).
+        """
+        rows = RowSerializer(self.get_serializer(many=True))
+        queryset = self.filter_queryset(self.get_queryset())
+        return export_response(rows, queryset, request.accepted_renderer, filename='projetoslei')
+
     def get_queryset(self):
-        queryset = super().get_queryset()
+        queryset = self.with_related(super().get_queryset())
         
         # Order by external_id only
         queryset = queryset.order_by('-external_id')  # Order by external_id
@@ -131,48 +187,32 @@ class ProjetoLeiViewSet(ReadOnlyModelViewSet):
             author_names = author_param.split(',')  # Support multiple authors
             queryset = queryset.filter(authors__name__in=author_names)  # Exact match for authors
 
-        # Phase filter
+        # Phase filter, on the latest phase stored by the importers
         phase_param = self.request.query_params.get('phase', None)
         if phase_param:
-            phase_ids = Phase.objects.filter(name=phase_param).values_list('id', flat=True)
-            if phase_ids:
-                last_phase_subquery = ProjetoLei.objects.annotate(
-                    last_phase_id=Subquery(
-                        Phase.objects.filter(projetos_lei=OuterRef('id'))
-                        .order_by('-id')
-                        .values('id')[:1]
-                    )
-                ).filter(last_phase_id__in=phase_ids)
-
-                queryset = queryset.filter(id__in=last_phase_subquery.values('id'))
-            else:
-                queryset = queryset.none()
+            queryset = queryset.filter(current_phase_name=phase_param)
 
        
-        # Handle date range filters for phases
+        # Handle date range filters on the date of the "Entrada" phase.
+        # Initiatives without one have a NULL entry_date, which no range
+        # matches: they are left out whenever either filter is given.
         start_date_param = self.request.query_params.get('start_date', None)
         end_date_param = self.request.query_params.get('end_date', None)
 
-        phase_date_filters = Q()
         if start_date_param:
             try:
-                start_date = datetime.strptime(start_date_param, '%d-%m-%Y')
-                phase_date_filters &= Q(phases__date__gte=start_date)
+                start_date = datetime.strptime(start_date_param, '%d-%m-%Y').date()
+                queryset = queryset.filter(entry_date__gte=start_date)
             except ValueError:
                 pass
 
         if end_date_param:
             try:
-                end_date = datetime.strptime(end_date_param, '%d-%m-%Y')
-                phase_date_filters &= Q(phases__date__lte=end_date)
+                end_date = datetime.strptime(end_date_param, '%d-%m-%Y').date()
+                queryset = queryset.filter(entry_date__lte=end_date)
             except ValueError:
                 pass
 
-        if phase_date_filters:
-            # Add the name filter to ensure we're looking at the "Entrada" phase
-            phase_date_filters &= Q(phases__name="Entrada")
-            queryset = queryset.filter(phase_date_filters).distinct()
-
         # Handle id filter
         id_param = self.request.query_params.get('external_id', None)
         if id_param:
@@ -181,8 +221,38 @@ class ProjetoLeiViewSet(ReadOnlyModelViewSet):
 
         return queryset
 
-
-class LegislatureViewSet(viewsets.ReadOnlyModelViewSet):
+    def with_related(self, queryset):
+        """
+        Select/prefetch the related rows nested by the serializer of the
+        current action, so the number of queries doesn't grow with the page,
+        leaving out those ?fields=/?expand= leave out.
+        """
+        selection = self.selection
+        if self.action == 'retrieve':
+            if selection.includes('legislature', nested=True):
+                queryset = queryset.select_related('legislature')
+            queryset = queryset.prefetch_related(*related_lookups(ProjetoLei, selection, {'authors': {}}))
+            if selection.includes('phases', nested=True):
+                queryset = queryset.prefetch_related(prefetch_phases_by_date())
+            if selection.includes('votes', nested=True):
+                queryset = queryset.prefetch_related(prefetch_votes_by_date(selection.child('votes')))
+            return queryset
+        if self.action == 'full_details':
+            queryset = with_list_relations(queryset, selection)
+            queryset = queryset.prefetch_related(*related_lookups(ProjetoLei, selection, {'attachments': {}}))
+            if selection.includes('votes', nested=True):
+                queryset = queryset.prefetch_related(prefetch_votes_by_date(selection.child('votes')))
+            if selection.includes('related_initiatives', nested=True):
+                related = selection.child('related_initiatives')
+                queryset = queryset.prefetch_related(Prefetch(
+                    'related_to',
+                    queryset=only_selected(with_list_relations(ProjetoLei.objects.defer('search_vector'), related), related),
+                ))
+            return queryset
+        return with_list_relations(queryset, selection)
+
+
+class LegislatureViewSet(ConditionalGetMixin, viewsets.ReadOnlyModelViewSet):
     """
     API endpoint for accessing legislatures.
     """
@@ -195,7 +265,7 @@ class LegislatureViewSet(viewsets.ReadOnlyModelViewSet):
     ordering_fields = ['number', 'start_date']
 
 
-class PhaseViewSet(viewsets.ReadOnlyModelViewSet):
+class PhaseViewSet(ConditionalGetMixin, RowListMixin, SparseFieldsetViewMixin, viewsets.ReadOnlyModelViewSet):
     """
     API endpoint for accessing phases of legislative proposals.
     """
@@ -207,9 +277,12 @@ class PhaseViewSet(viewsets.ReadOnlyModelViewSet):
     filterset_fields = ['name', 'code', 'date']
     search_fields = ['name', 'observation']
     ordering_fields = ['date', 'name', 'code']
+    related_fields = PHASE_RELATIONS
+    pagination_class = PageNumberOrCursorPagination
+    cursor_ordering = ('-date', '-id')
 
 
-class AuthorViewSet(viewsets.ReadOnlyModelViewSet):
+class AuthorViewSet(ConditionalGetMixin, viewsets.ReadOnlyModelViewSet):
     """
     API endpoint for accessing authors of legislative proposals.
     """
@@ -217,49 +290,41 @@ class AuthorViewSet(viewsets.ReadOnlyModelViewSet):
     permission_classes = [IsAuthenticated]
     queryset = Author.objects.all().order_by('name')
     serializer_class = AuthorSerializer
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    filter_backends = [DjangoFilterBackend, NameSearchFilter, filters.OrderingFilter]
     filterset_fields = ['party', 'author_type']
     search_fields = ['name', 'party']
     ordering_fields = ['name', 'party']
-    
+    pagination_class = PageNumberOrCursorPagination
+
+    @property
+    def cursor_ordering(self):
+        if self.action == 'initiatives':
+            return ProjetoLeiViewSet.cursor_ordering
+        return ('name', 'id')
+
     @action(detail=True, methods=['get'])
     def initiatives(self, request, pk=None):
         """
-        Get all initiatives by this author.
+        Get the initiatives by this author, paginated like the initiatives
+        list (?paginate=cursor for cursor pages), in the same order.
         """
         author = self.get_object()
-        projetos = author.projetos_lei.all()
-        serializer = ProjetoLeiListSerializer(projetos, many=True)
-        return Response(serializer.data)
-    
+        projetos = with_list_relations(author.projetos_lei.defer('search_vector').order_by('-external_id'))
+        page = self.paginate_queryset(projetos)
+        serializer = ProjetoLeiListSerializer(page, many=True, context=self.get_serializer_context())
+        return self.get_paginated_response(serializer.data)
+
     @action(detail=False, methods=['get'])
     def party_groups(self, request):
         """
         Get only authors with author_type 'Grupo' (political parties),
         ensuring each party name appears only once.
         """
-        # Get distinct party names
-        distinct_names = Author.objects.filter(
-            author_type='Grupo'
-        ).values_list('name', flat=True).distinct()
-        
-        # For each distinct name, get the first (or most recent) record
-        parties = []
-        for name in distinct_names:
-            party = Author.objects.filter(
-                author_type='Grupo',
-                name=name
-            ).first()
-            if party:
-                parties.append(party)
-        
-        # Sort by name
-        parties.sort(key=lambda x: x.name)
-        
-        serializer = self.get_serializer(parties, many=True)
-        return Response(serializer.data)
+        # Parties only change with imports, which start a new cache generation
+        return Response(get_or_refresh('party_groups', get_party_groups, fresh_for=24 * 60 * 60))
+
 
-class VoteViewSet(viewsets.ReadOnlyModelViewSet):
+class VoteViewSet(ConditionalGetMixin, RowListMixin, SparseFieldsetViewMixin, viewsets.ReadOnlyModelViewSet):
     """
     API endpoint for accessing votes on legislative proposals.
     """
@@ -271,9 +336,12 @@ class VoteViewSet(viewsets.ReadOnlyModelViewSet):
     filterset_fields = ['result', 'date', 'unanimous']
     search_fields = ['description', 'details']
     ordering_fields = ['date', 'result']
+    related_fields = VOTE_RELATIONS
+    pagination_class = PageNumberOrCursorPagination
+    cursor_ordering = ('-date', '-id')
 
 
-class PublicationViewSet(viewsets.ReadOnlyModelViewSet):
+class PublicationViewSet(ConditionalGetMixin, viewsets.ReadOnlyModelViewSet):
     """
     API endpoint for accessing publications related to legislative proposals.
     """
@@ -286,7 +354,7 @@ class PublicationViewSet(viewsets.ReadOnlyModelViewSet):
     ordering_fields = ['date', 'publication_type']
 
 
-class CommissionViewSet(viewsets.ReadOnlyModelViewSet):
+class CommissionViewSet(ConditionalGetMixin, viewsets.ReadOnlyModelViewSet):
     """
     API endpoint for accessing commissions that review legislative proposals.
     """
@@ -300,7 +368,7 @@ class CommissionViewSet(viewsets.ReadOnlyModelViewSet):
     ordering_fields = ['name', 'distribution_date']
 
 
-class DebateViewSet(viewsets.ReadOnlyModelViewSet):
+class DebateViewSet(ConditionalGetMixin, SparseFieldsetViewMixin, viewsets.ReadOnlyModelViewSet):
     """
     API endpoint for accessing debates related to legislative proposals.
     """
@@ -312,9 +380,12 @@ class DebateViewSet(viewsets.ReadOnlyModelViewSet):
     filterset_fields = ['date', 'session_phase']
     search_fields = ['summary', 'content']
     ordering_fields = ['date', 'start_time']
+    related_fields = DEBATE_RELATIONS
+    pagination_class = PageNumberOrCursorPagination
+    cursor_ordering = ('-date', '-id')
 
 
-class TypeListView(APIView):
+class TypeListView(ConditionalGetMixin, APIView):
     """
     Returns a list of all unique initiative types.
     """
@@ -326,7 +397,7 @@ class TypeListView(APIView):
         return Response(list(types))
 
 
-class UniquePhaseNamesView(APIView):
+class UniquePhaseNamesView(ConditionalGetMixin, APIView):
     """
     Returns a list of all unique phase names.
     """
@@ -340,3 +411,39 @@ class UniquePhaseNamesView(APIView):
         return Response(phases)
 
 
+class SnapshotView(ConditionalGetMixin, APIView):
+    """
+    The newest columnar snapshot of the data (see backend.snapshots): its
+    manifest, or, given a table name, that table's Arrow IPC or Parquet file.
+    """
+    authentication_classes = [JWTAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    @cached_property
+    def manifest(self):
+        return latest_snapshot()
+
+    def get_validators(self, request):
+        if self.manifest is None:
+            return None
+        created_at = self.manifest['created_at']
+        return f"snapshot-{self.manifest['generation']}-{created_at}", parse_datetime(created_at)
+
+    def perform_content_negotiation(self, request, force=False):
+        # Table files are sent as they are, whatever the Accept header asks for
+        return super().perform_content_negotiation(request, force=True)
+
+    def get(self, request, table=None):
+        if self.manifest is None:
+            raise NotFound('No snapshot has been written yet.')
+        if table is None:
+            return Response(self.manifest)
+        if table not in self.manifest['tables']:
+            raise NotFound(f"No table {table} in the snapshot.")
+
+        path = os.path.join(settings.SNAPSHOT_DIR, self.manifest['tables'][table]['file'])
+        _, content_type = FORMATS[self.manifest['format']]
+        try:
+            return FileResponse(open(path, 'rb'), content_type=content_type, as_attachment=True, filename=os.path.basename(path))
+        except FileNotFoundError:
+            raise NotFound(f"No table {table} in the snapshot.")